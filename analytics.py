@@ -0,0 +1,137 @@
+"""Cohort-level aggregations over a whole parsed report.
+
+The parsed students are flattened once into long course/term frames and
+every statistic is then a grouped pandas/NumPy aggregation over those
+frames, so the cost grows with the number of rows rather than with the
+number of per-student Python loops.
+"""
+import numpy as np
+import pandas as pd
+
+from records import _normalize_acad_level
+
+COURSE_COLUMNS = ["student", "campus_id", "year", "term", "acad_level", "code", "result", "symbol"]
+TERM_COLUMNS = ["student", "campus_id", "year", "term", "acad_level", "program", "standing", "wghtd_gpa", "term_gpa", "cum_gpa"]
+GPA_BINS = np.arange(0, 105, 5)
+
+
+def _level_labels(frame: pd.DataFrame) -> pd.Series:
+    # Same labelling as the level tabs: normalized level, raw level, then calendar year
+    uniques = frame["acad_level"].unique()
+    mapping = {v: _normalize_acad_level(v) or v for v in uniques}
+    labels = frame["acad_level"].map(mapping)
+    fallback = "Year " + frame["year"].astype(str)
+    return labels.where(labels.astype(bool), fallback)
+
+
+def course_frame(students: list[dict]) -> pd.DataFrame:
+    """One row per course attempt with numeric marks and a fail flag."""
+    rows = [
+        (pos, s.get("campus_id", ""), yr.get("year"), yr.get("term", ""), yr.get("acad_level", ""),
+         c.get("code", ""), c.get("result", ""), c.get("symbol", ""))
+        for pos, s in enumerate(students)
+        for yr in s.get("years", [])
+        for c in yr.get("courses", [])
+        if c.get("code")
+    ]
+    df = pd.DataFrame(rows, columns=COURSE_COLUMNS)
+    df["level"] = _level_labels(df)
+    df["mark"] = pd.to_numeric(df["result"].str.strip(), errors="coerce")
+    # Vectorized equivalent of records._is_fail_course
+    df["fail"] = df["symbol"].astype(str).str.contains("F", regex=False) | (df["mark"] < 50)
+    return df
+
+
+def term_frame(students: list[dict]) -> pd.DataFrame:
+    """One row per year/term record with numeric GPA columns."""
+    rows = [
+        (pos, s.get("campus_id", ""), yr.get("year"), yr.get("term", ""), yr.get("acad_level", ""),
+         yr.get("program", ""), yr.get("standing", ""),
+         yr.get("wghtd_gpa", ""), yr.get("term_gpa", ""), yr.get("cum_gpa", ""))
+        for pos, s in enumerate(students)
+        for yr in s.get("years", [])
+    ]
+    df = pd.DataFrame(rows, columns=TERM_COLUMNS)
+    df["level"] = _level_labels(df)
+    for col in ("wghtd_gpa", "term_gpa", "cum_gpa"):
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def course_pass_rates(courses: pd.DataFrame) -> pd.DataFrame:
+    grouped = courses.groupby("code", sort=False)
+    stats = pd.DataFrame({
+        "attempts": grouped.size(),
+        "students": grouped["student"].nunique(),
+        "fails": grouped["fail"].sum().astype(int),
+        "mean_mark": grouped["mark"].mean().round(1),
+    })
+    stats["passes"] = stats["attempts"] - stats["fails"]
+    stats["pass_rate"] = (stats["passes"] / stats["attempts"]).round(3)
+    stats = stats[["attempts", "students", "passes", "fails", "pass_rate", "mean_mark"]]
+    return stats.sort_values(["fails", "attempts"], ascending=False).rename_axis("code").reset_index()
+
+
+def fail_symbol_distribution(courses: pd.DataFrame) -> pd.DataFrame:
+    failed = courses.loc[courses["fail"], ["code", "symbol"]]
+    if failed.empty:
+        return pd.DataFrame(columns=["code"])
+    table = pd.crosstab(failed["code"], failed["symbol"].replace("", "(none)"))
+    table["total"] = table.sum(axis=1)
+    return table.sort_values("total", ascending=False).rename_axis(columns=None).reset_index()
+
+
+def level_term_pass_rates(courses: pd.DataFrame) -> pd.DataFrame:
+    grouped = courses.groupby(["level", "term"], sort=True)["fail"]
+    stats = grouped.agg(attempts="size", fails="sum").reset_index()
+    stats["pass_rate"] = ((stats["attempts"] - stats["fails"]) / stats["attempts"]).round(3)
+    return stats
+
+
+def programme_flows(terms: pd.DataFrame) -> pd.DataFrame:
+    # Consecutive programme changes within a student, same rule as compute_student_insights
+    progs = terms.loc[terms["program"].astype(bool), ["student", "program"]]
+    prev = progs.groupby("student", sort=False)["program"].shift()
+    moved = prev.notna() & (prev != progs["program"])
+    flows = pd.DataFrame({"from": prev[moved], "to": progs.loc[moved, "program"]})
+    if flows.empty:
+        return pd.DataFrame(columns=["from", "to", "students"])
+    return flows.value_counts().rename("students").reset_index()
+
+
+def gpa_histograms(terms: pd.DataFrame) -> pd.DataFrame | None:
+    """Histogram of term GPAs and of each student's latest cumulative GPA.
+
+    Returns None for reports without GPA columns (e.g. CB015 exports that
+    leave them blank).
+    """
+    term_gpa = terms["term_gpa"].to_numpy(dtype=float)
+    term_gpa = term_gpa[~np.isnan(term_gpa)]
+    if not term_gpa.size:
+        return None
+    latest_cum = terms.dropna(subset=["cum_gpa"]).groupby("student", sort=False)["cum_gpa"].last().to_numpy()
+    term_counts, _ = np.histogram(term_gpa, bins=GPA_BINS)
+    cum_counts, _ = np.histogram(latest_cum, bins=GPA_BINS)
+    labels = [f"{lo}-{hi}" for lo, hi in zip(GPA_BINS[:-1], GPA_BINS[1:])]
+    return pd.DataFrame({"gpa": labels, "term_gpa": term_counts, "latest_cum_gpa": cum_counts})
+
+
+def compute_cohort_analytics(students: list[dict]) -> dict:
+    """Aggregate a parsed report into cohort-level tables."""
+    courses = course_frame(students)
+    terms = term_frame(students)
+    attempts = len(courses)
+    fails = int(courses["fail"].sum())
+    return {
+        "overview": {
+            "students": len(students),
+            "attempts": attempts,
+            "fails": fails,
+            "pass_rate": (attempts - fails) / attempts if attempts else None,
+        },
+        "course_stats": course_pass_rates(courses),
+        "fail_symbols": fail_symbol_distribution(courses),
+        "level_term": level_term_pass_rates(courses),
+        "programme_flows": programme_flows(terms),
+        "gpa_histogram": gpa_histograms(terms),
+    }
@@ -0,0 +1,139 @@
+"""Reviewer annotations kept apart from the report they describe.
+
+An annotation is ``{"code", "comment", "timestamp", "author"}`` keyed by
+campus ID. Saving work writes only the annotations, as a small CSV sidecar
+(``SIDECAR_COLUMNS``), instead of re-serializing the whole report; the
+sidecar merges into any version of the report by campus ID, touching only
+the annotated students. The full annotated report CSV is generated from a
+report plus annotations only when asked for.
+"""
+import csv
+import io
+import time
+
+from records import (
+    ANNOTATION_CODE_COL,
+    ANNOTATION_COMMENT_COL,
+    _row_parts,
+    _student_row_shift,
+    _update_layout,
+    new_layout,
+)
+
+SIDECAR_COLUMNS = ("campus_id", "code", "comment", "timestamp", "author")
+SIDECAR_SUFFIX = "_annotations.csv"
+
+
+def annotation(code: str = "", comment: str = "", author: str = "", timestamp: str | None = None) -> dict:
+    """An annotation record; ``timestamp`` defaults to now (UTC, ISO 8601)."""
+    if timestamp is None:
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    return {"code": code, "comment": comment, "timestamp": timestamp, "author": author}
+
+
+def is_annotated(ann: dict | None) -> bool:
+    return bool(ann and (ann.get("code") or ann.get("comment")))
+
+
+def report_annotations(students: list[dict]) -> dict[str, dict]:
+    """Annotations already stored in a parsed report's rows (no timestamp or author)."""
+    out = {}
+    for s in students:
+        code = s.get("annotation_code", "")
+        comment = s.get("annotation_comment", "")
+        campus_id = s.get("campus_id", "")
+        if campus_id and (code or comment):
+            out[campus_id] = annotation(code, comment, timestamp="")
+    return out
+
+
+def merge_annotations(target: dict[str, dict], incoming: dict[str, dict], only_missing: bool = False) -> list[str]:
+    """Merge ``incoming`` into ``target`` by campus ID; returns the IDs that changed.
+
+    An incoming annotation replaces the current one unless the current one
+    is newer (annotations without a timestamp are oldest). With
+    ``only_missing``, it is used only for students ``target`` has no entry for.
+    """
+    changed = []
+    for campus_id, ann in incoming.items():
+        current = target.get(campus_id)
+        if current is None:
+            # A timestamped empty annotation clears a code stored in the report
+            if not (is_annotated(ann) or ann.get("timestamp")):
+                continue
+        elif only_missing or (current.get("timestamp") or "") > (ann.get("timestamp") or ""):
+            continue
+        elif current.get("code") == ann.get("code") and current.get("comment") == ann.get("comment"):
+            continue
+        target[campus_id] = dict(ann)
+        changed.append(campus_id)
+    return changed
+
+
+def write_sidecar(annotations: dict[str, dict]) -> bytes:
+    """Annotations made or changed since the report was loaded, as sidecar CSV.
+
+    Those are the ones with a timestamp; codes read from the report's own
+    rows are already in the report. Cleared annotations are kept, so
+    merging the sidecar also clears a code stored in the report.
+    """
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(SIDECAR_COLUMNS)
+    for campus_id, ann in sorted(annotations.items()):
+        if ann.get("timestamp"):
+            writer.writerow([campus_id, *(ann.get(k, "") for k in SIDECAR_COLUMNS[1:])])
+    return out.getvalue().encode("utf-8")
+
+
+def read_sidecar(data: bytes | str) -> dict[str, dict]:
+    """Annotations from sidecar CSV; rows without a campus ID are skipped."""
+    text = data.decode("utf-8-sig", errors="replace") if isinstance(data, bytes) else data
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [c for c in ("campus_id", "code", "comment") if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Not an annotations file: missing column(s) {', '.join(missing)}")
+    out = {}
+    for row in reader:
+        campus_id = (row.get("campus_id") or "").strip()
+        if not campus_id:
+            continue
+        out[campus_id] = annotation(
+            (row.get("code") or "").strip(),
+            (row.get("comment") or "").strip(),
+            (row.get("author") or "").strip(),
+            (row.get("timestamp") or "").strip(),
+        )
+    return out
+
+
+def annotated_report_csv(lines, annotations: dict[str, dict]) -> bytes:
+    """The report in ``lines`` with annotation codes in column M and comments in column R.
+
+    Student rows are found with the parser's layout rules, so quoted and
+    split names and malformed single-field rows are handled as in parsing.
+    Rows of students without an annotation are written unchanged.
+    """
+    out = io.StringIO()
+    writer = csv.writer(out)
+    layout = new_layout()
+    for row in csv.reader(lines):
+        parts = _row_parts(row)
+        if not annotations or _update_layout(layout, parts):
+            writer.writerow(row)
+            continue
+        shift = _student_row_shift(parts, layout)
+        ann = None
+        if shift is not None:
+            ann = annotations.get(parts[layout["student"]["columns"]["campus_id"] + shift])
+        if ann is None:
+            writer.writerow(row)
+            continue
+        # Malformed rows hold the whole record in their first field
+        cells = parts if len(row) and row[0].startswith(",") and not any(row[1:]) else list(row)
+        while len(cells) <= ANNOTATION_COMMENT_COL:
+            cells.append("")
+        cells[ANNOTATION_CODE_COL] = ann.get("code", "")
+        cells[ANNOTATION_COMMENT_COL] = ann.get("comment", "")
+        writer.writerow(cells)
+    return out.getvalue().encode("utf-8")
@@ -0,0 +1,359 @@
+"""Local read-only JSON API over parsed reports.
+
+Serves the reports in the process-wide report store (report_store), so
+tools such as the timetable clash checker read the same parsed students as
+the app instead of re-implementing the report parsing. Run it on its own
+over report files:
+
+    python api.py CB015.csv "CB024 - December 2024 .csv" --port 8765
+
+or inside the app process (set ``RECORDSORTER_API_PORT``), where it serves
+every report a session has uploaded.
+
+Endpoints (all GET):
+
+    /reports
+    /reports/{key}/students?offset=0&limit=100
+    /reports/{key}/students/{campus_id}
+    /reports/{key}/students/{campus_id}/insights
+    /reports/{key}/students/{campus_id}/outstanding
+    /reports/{key}/students/{campus_id}/annotation
+    /reports/{key}/annotations?offset=0&limit=100
+
+``key`` is the report's content hash. Responses carry an ETag derived from
+it (plus the requirements version or annotation generation where those
+are involved); a request with a matching If-None-Match gets an empty 304.
+Encoded responses are cached per ETag and URL.
+"""
+import argparse
+import json
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from annotations import annotation, merge_annotations, read_sidecar, report_annotations
+from ingest import parse_incremental, report_sources
+from records import ParseDiagnostics, compute_student_insights
+from report_store import default_store
+from requirements_store import requirements_source
+from student_view import outstanding_requirements, requirement_candidates
+from synth_reports import REQUIREMENTS_CSV
+
+DEFAULT_PORT = 8765
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+RESPONSE_CACHE_SIZE = 2048
+STUDENT_FIELDS = ("campus_id", "emplid", "name", "prgm", "plan", "level_start", "level_end", "finalist")
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    # Course entries are records.CourseResult mappings
+    return dict(value) if isinstance(value, Mapping) else str(value)
+
+
+def _page_bounds(query: dict) -> tuple[int, int]:
+    try:
+        offset = int(query.get("offset", ["0"])[0])
+        limit = int(query.get("limit", [str(DEFAULT_LIMIT)])[0])
+    except ValueError:
+        raise ApiError(400, "offset and limit must be integers")
+    if offset < 0 or limit < 1:
+        raise ApiError(400, "offset must be >= 0 and limit >= 1")
+    return offset, min(limit, MAX_LIMIT)
+
+
+def _page(items: list, path: str, offset: int, limit: int, total: int) -> dict:
+    end = min(offset + limit, total)
+    return {
+        "items": items,
+        "offset": offset,
+        "limit": limit,
+        "total": total,
+        "next": f"{path}?offset={end}&limit={limit}" if end < total else None,
+    }
+
+
+class ReportApi:
+    """Routes requests to the reports in ``store``; no HTTP here, so it can be called directly."""
+
+    def __init__(self, store=None, requirements_path: str = REQUIREMENTS_CSV):
+        self.store = store if store is not None else default_store()
+        self.requirements = requirements_source(requirements_path)
+        self._lock = threading.Lock()
+        # Per report key: campus ID -> position, and annotations (report rows plus sidecars);
+        # dropped once the store has evicted the report
+        self._positions: dict[str, dict[str, int]] = {}
+        self._annotations: dict[str, dict[str, dict]] = {}
+        self._annotation_generation = 0
+        self._responses: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.not_modified = 0
+
+    def add_annotations(self, key: str, annotations: dict[str, dict]) -> list[str]:
+        """Merge sidecar annotations into a report's (newer wins)."""
+        handle = self._handle(key)
+        try:
+            with self._lock:
+                changed = merge_annotations(self._report_annotations_locked(key, handle), annotations)
+                if changed:
+                    self._annotation_generation += 1
+                return changed
+        finally:
+            handle.release()
+
+    def _report_annotations_locked(self, key: str, handle) -> dict[str, dict]:
+        # Caller holds self._lock and a handle taken before it, so a miss never re-enters _handle
+        ann = self._annotations.get(key)
+        if ann is None:
+            self._prune_locked()
+            ann = self._annotations[key] = report_annotations(handle.students)
+        return ann
+
+    def _prune_locked(self):
+        # Caller holds self._lock; keeps the per-report maps to the reports still in the store
+        live = set(self.store.keys())
+        for per_report in (self._positions, self._annotations):
+            for key in per_report.keys() - live:
+                del per_report[key]
+
+    def _handle(self, key: str):
+        handle = self.store.get(key)
+        if handle is None:
+            with self._lock:
+                self._positions.pop(key, None)
+                self._annotations.pop(key, None)
+            raise ApiError(404, f"No report {key}")
+        return handle
+
+    def _position(self, key: str, students: list[dict], campus_id: str) -> int:
+        with self._lock:
+            positions = self._positions.get(key)
+            if positions is None:
+                self._prune_locked()
+                positions = self._positions[key] = {s.get("campus_id", ""): i for i, s in enumerate(students)}
+        pos = positions.get(campus_id)
+        if pos is None:
+            raise ApiError(404, f"No student {campus_id} in report {key}")
+        return pos
+
+    def etag(self, key: str, resource: str) -> str:
+        if resource == "outstanding":
+            return f'"{key}-r{self.requirements.get()["version"]}"'
+        if resource == "annotations":
+            return f'"{key}-a{self._annotation_generation}"'
+        return f'"{key}"'
+
+    def handle(self, path: str, query: str = "", if_none_match: str | None = None) -> tuple[int, dict, bytes]:
+        """``(status, headers, body)`` for a GET of ``path``."""
+        try:
+            parts = [unquote(p) for p in path.strip("/").split("/") if p]
+            if parts == ["reports"]:
+                return self._respond(None, path, query, if_none_match, self._reports)
+            if len(parts) < 3 or parts[0] != "reports":
+                raise ApiError(404, f"No route {path}")
+            key, resource, rest = parts[1], parts[2], parts[3:]
+            if resource == "students" and not rest:
+                route, kind = self._students, "students"
+            elif resource == "students" and len(rest) == 1:
+                route, kind = self._student, "students"
+            elif resource == "students" and len(rest) == 2 and rest[1] in ("insights", "outstanding"):
+                route, kind = (self._insights if rest[1] == "insights" else self._outstanding), rest[1]
+            elif resource == "students" and len(rest) == 2 and rest[1] == "annotation":
+                route, kind = self._student_annotation, "annotations"
+            elif resource == "annotations" and not rest:
+                route, kind = self._annotation_page, "annotations"
+            else:
+                raise ApiError(404, f"No route {path}")
+            self._handle(key).release()
+            return self._respond(self.etag(key, kind), path, query, if_none_match,
+                                 lambda: route(key, rest[0] if rest else None, path, parse_qs(query)))
+        except ApiError as e:
+            body = json.dumps({"error": str(e)}).encode("utf-8")
+            return e.status, {"Content-Type": "application/json"}, body
+
+    def _respond(self, etag, path, query, if_none_match, build) -> tuple[int, dict, bytes]:
+        headers = {"Content-Type": "application/json"}
+        if etag is not None:
+            headers["ETag"] = etag
+            headers["Cache-Control"] = "no-cache"
+            if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+                self.not_modified += 1
+                return 304, headers, b""
+        cache_key = (etag, path, query)
+        with self._lock:
+            body = self._responses.get(cache_key) if etag is not None else None
+            if body is not None:
+                self._responses.move_to_end(cache_key)
+                self.hits += 1
+        if body is None:
+            body = json.dumps(build(), default=_json_default, separators=(",", ":")).encode("utf-8")
+            if etag is not None:
+                with self._lock:
+                    self._responses[cache_key] = body
+                    while len(self._responses) > RESPONSE_CACHE_SIZE:
+                        self._responses.popitem(last=False)
+        return 200, headers, body
+
+    def _reports(self) -> dict:
+        items = []
+        for key in self.store.keys():
+            handle = self.store.get(key)
+            if handle is None:
+                continue
+            try:
+                source = handle.source
+                items.append({
+                    "key": key,
+                    "name": source.name if source is not None else "",
+                    "students": len(handle.students),
+                    "url": f"/reports/{quote(key)}/students",
+                })
+            finally:
+                handle.release()
+        return {"items": items}
+
+    def _students(self, key, _, path, query) -> dict:
+        handle = self._handle(key)
+        try:
+            students = handle.students
+            offset, limit = _page_bounds(query)
+            items = [{f: s.get(f, "") for f in STUDENT_FIELDS} for s in students[offset:offset + limit]]
+            return _page(items, path, offset, limit, len(students))
+        finally:
+            handle.release()
+
+    def _student(self, key, campus_id, path, query) -> dict:
+        handle = self._handle(key)
+        try:
+            return handle.students[self._position(key, handle.students, campus_id)]
+        finally:
+            handle.release()
+
+    def _insights(self, key, campus_id, path, query) -> dict:
+        return compute_student_insights(self._student(key, campus_id, path, query))
+
+    def _outstanding(self, key, campus_id, path, query) -> dict:
+        student = self._student(key, campus_id, path, query)
+        index = self.requirements.get()["index"]
+        candidates = requirement_candidates(student, index)
+        return {
+            "campus_id": campus_id,
+            "requirements": candidates[0] if candidates else None,
+            "candidates": candidates,
+            "outstanding": [{"course_code": c, "alternative_course": a} for c, a in outstanding_requirements(student, index)],
+        }
+
+    def _student_annotation(self, key, campus_id, path, query) -> dict:
+        handle = self._handle(key)
+        try:
+            self._position(key, handle.students, campus_id)
+            with self._lock:
+                ann = self._report_annotations_locked(key, handle).get(campus_id)
+        finally:
+            handle.release()
+        return {"campus_id": campus_id, **(ann or annotation(timestamp=""))}
+
+    def _annotation_page(self, key, _, path, query) -> dict:
+        handle = self._handle(key)
+        try:
+            with self._lock:
+                annotations = sorted(self._report_annotations_locked(key, handle).items())
+        finally:
+            handle.release()
+        offset, limit = _page_bounds(query)
+        items = [{"campus_id": c, **a} for c, a in annotations[offset:offset + limit]]
+        return _page(items, path, offset, limit, len(annotations))
+
+
+def make_handler(api: ReportApi):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so clients can reuse a connection; headers and body are
+        # separate writes, which Nagle's algorithm would hold back ~40 ms
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            status, headers, body = api.handle(url.path, url.query, self.headers.get("If-None-Match"))
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def make_server(api: ReportApi, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    return server
+
+
+def start_background(api: ReportApi, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Serve ``api`` from a daemon thread; returns the server (``server_address`` has the port)."""
+    server = make_server(api, host, port)
+    threading.Thread(target=server.serve_forever, name="report-api", daemon=True).start()
+    return server
+
+
+def load_report(filename: str, data: bytes, store=None) -> list:
+    """Parse every report in an uploaded file into the store; returns handles that keep them cached."""
+    store = store if store is not None else default_store()
+    handles = []
+    for source in report_sources(filename, data):
+        def _load(source=source):
+            diagnostics = ParseDiagnostics()
+            students, block_hashes, _ = parse_incremental(source.lines(diagnostics), diagnostics=diagnostics)
+            return {"students": students, "block_hashes": block_hashes, "source": source, "diagnostics": diagnostics}
+        handles.append(store.get_or_load(source.key, _load))
+    return handles
+
+
+def load_report_file(path: str, store=None) -> list:
+    with open(path, "rb") as f:
+        return load_report(os.path.basename(path), f.read(), store)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read-only JSON API over parsed student record reports.")
+    parser.add_argument("reports", nargs="+", metavar="REPORT")
+    parser.add_argument("--annotations", action="append", default=[], metavar="SIDECAR",
+                        help="Annotation sidecar CSV to serve with every report (repeatable)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--requirements", default=REQUIREMENTS_CSV, help="Programme requirements CSV")
+    args = parser.parse_args(argv)
+
+    api = ReportApi(requirements_path=args.requirements)
+    handles = [h for path in args.reports for h in load_report_file(path, api.store)]
+    sidecars = {}
+    for path in args.annotations:
+        with open(path, "rb") as f:
+            merge_annotations(sidecars, read_sidecar(f.read()))
+    for handle in handles:
+        api.add_annotations(handle.key, sidecars)
+        print(f"{handle.source.name}: {len(handle.students)} students at /reports/{quote(handle.key)}/students")
+    server = make_server(api, args.host, args.port)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,729 +1,777 @@
 import os
-import io
-import re
-import csv
-import hashlib
+import uuid
+from contextlib import contextmanager
+from functools import partial
 import streamlit as st
 import pandas as pd
 from importlib import import_module
+import profiling
+from requirements_store import requirements_source
+from analytics import compute_cohort_analytics
+from api import ReportApi, start_background
+from annotations import (
+    SIDECAR_SUFFIX,
+    annotated_report_csv,
+    annotation,
+    merge_annotations,
+    read_sidecar,
+    report_annotations,
+    write_sidecar,
+)
+from columnar import report_tables, tables_zip
+from course_index import SEARCH_KINDS, CourseIndex, find_students, outstanding_index
+from triage import RISK_FEATURES, RISK_WEIGHTS, Triage
+from trajectory import (
+    TRAJECTORY_SORT_KEYS,
+    compute_trajectories,
+    filter_trajectories,
+    has_trajectory_data,
+    trajectory_lines,
+)
+from report_packs import render_document, render_packs, select_students
+from ingest import REPORT_UPLOAD_TYPES, iter_parsed_blocks, report_sources
+from report_store import default_store
+from prefetch import default_cache, neighbour_indices
+from records import ParseDiagnostics
+from parse_jobs import default_jobs
+from longitudinal import make_snapshot, diff_snapshots, carry_annotations, diff_rows
+from student_view import (
+    build_view_model,
+    uses_programmes,
+    insight_lines,
+    summary_rows,
+    level_caption,
+    level_metrics,
+    level_table_frame,
+    style_fail_rows,
+    outstanding_rows,
+)
 
 PAGE_TITLE = "Student Record Browser"
+REQUIREMENTS_CSV = os.path.join(os.path.dirname(__file__), "UCT_Commerce_Programme_Course_Requirements_2024_2025.csv")
+# Small reports parse within this; waiting avoids flashing a progress bar
+PARSE_WAIT_S = 0.5
+TRIAGE_LABEL = "most urgent first"
 
 
-def _parse_from_iter(lines_iter):
-
-    students = []
-    current_student = None
-    current_year = None
-    header_map = None
-    header_row = None
-
-    def is_header_line(line: str) -> bool:
-        s = line.strip()
-        if not s:
-            return True
-        if s.startswith((
-            "TEST",
-            "COURSE RESULTS",
-            "Career",
-            "Degree",
-            "Programme:",
-            "Attributes",
-            "Term,",
-            "Course,",
-        )):
-            return True
-        if set(s) <= set("-= "):
-            return True
-        return False
+@st.cache_resource(show_spinner=False)
+def programme_requirements(path: str):
+    """Shared requirements source for ``path``, reloaded when the file is edited.
+
+    A reload only drops the cached view models of students whose
+    requirement mapping read a changed programme.
+    """
+    source = requirements_source(path)
+    source.subscribe(lambda diff: default_cache().invalidate(lambda key, model: uses_programmes(model, diff)))
+    return source
+
 
-    def parse_course_segment(seg: list[str]):
-        if not seg or not seg[0]:
-            return None
-        code = seg[0]
-        result = seg[1] if len(seg) > 1 else ""
-        symbol = seg[2] if len(seg) > 2 else ""
-        units_attempted = seg[3] if len(seg) > 3 else ""
-        units_earned = seg[4] if len(seg) > 4 else ""
-        title = seg[5] if len(seg) > 5 else ""
+@st.cache_resource(show_spinner=False)
+def report_api(port: int):
+    """The JSON API (api.py) over this process's shared report store, started once per process."""
+    return start_background(ReportApi(requirements_path=REQUIREMENTS_CSV), port=port)
+
+
+def notify_requirements_reload(requirements: dict):
+    # Once per session and reload, say which programmes changed
+    seen = st.session_state.get("requirements_version")
+    st.session_state.requirements_version = requirements["version"]
+    diff = requirements["diff"]
+    if seen is None or seen == requirements["version"] or not diff:
+        return
+    codes = [*diff["changed"], *diff["added"], *diff["removed"]]
+    st.sidebar.caption(
+        f"Programme requirements reloaded: {len(diff['changed'])} changed, {len(diff['added'])} added, "
+        f"{len(diff['removed'])} removed ({', '.join(codes[:5])}{', ...' if len(codes) > 5 else ''})."
+    )
+
+
+def acquire_report(source, previous=None):
+    """Handle to the shared parsed report for ``source``, parsing it on first use.
+
+    ``previous`` is the handle of the report this one replaces; its student
+    blocks are reused so a reissued report only re-parses changed students.
+    Returns ``(handle, reused)``.
+    """
+    reused = 0
+
+    def _load():
+        nonlocal reused
+        profiling.count("cache.parse.misses")
+        cache = dict(zip(previous.block_hashes, previous.students)) if previous is not None else None
+        diagnostics = ParseDiagnostics(previous.diagnostics if previous is not None else None)
+        students, block_hashes = [], []
+        course_index = CourseIndex()
+        # Each student is indexed as soon as it is parsed, as in a background parse
+        for student, h, was_cached in iter_parsed_blocks(source.lines(diagnostics), cache, diagnostics):
+            course_index.add(len(students), student)
+            students.append(student)
+            block_hashes.append(h)
+            reused += was_cached
+        diagnostics.previous = None
         return {
-            "code": code,
-            "result": result,
-            "symbol": symbol,
-            "units_attempted": units_attempted,
-            "units_earned": units_earned,
-            "title": title,
+            "students": students,
+            "block_hashes": block_hashes,
+            "source": source,
+            "course_index": course_index,
+            "diagnostics": diagnostics,
         }
 
-    # Use csv.reader to properly handle quoted fields with embedded commas
-    reader = csv.reader(lines_iter)
-    for row in reader:
-        # Handle malformed rows where entire content is in one field starting with comma
-        if len(row) == 1 and row[0].startswith(','):
-            # Re-parse this single field as CSV
-            parts = list(csv.reader([row[0]]))[0]
-            parts = [p.strip() for p in parts]
-        else:
-            parts = [p.strip() for p in row]
-        line = ",".join(row)
-
-        # Detect header row for student data
-        if not header_map and any(h.lower() in ["campus id", "emplid", "name"] for h in parts):
-            header_row = parts
-            header_map = {h.strip().lower(): i for i, h in enumerate(parts)}
-            continue
-
-        # Skip non-data lines
-        if is_header_line(line):
-            continue
-
-        # Heuristic: detect campus IDs matching 6 letters + 3 digits in first few columns
-        is_new_student = False
-        campus_id_idx = None
-        campus_re = re.compile(r"^[A-Za-z]{6}\d{3}$")
-        # Look for campus id in columns 1..5 (common in CB015 and similar files)
-        for idx in range(1, min(len(parts), 6)):
-            p = parts[idx].upper()
-            if campus_re.match(p):
-                campus_id_idx = idx
-                break
-
-        # If we found a campus id in the row and there's a name-like first column, treat as new student
-        if campus_id_idx is not None and parts[0]:
-            is_new_student = True
-        # Fallback: quoted name in first column with other non-empty columns
-        elif len(parts) > 2 and parts[0].startswith('"') and (parts[1] or parts[2]):
-            is_new_student = True
-
-        if is_new_student:
-            if current_student:
-                students.append(current_student)
-            # Try to extract fields robustly
-            name = parts[0].strip('"') if parts[0] else ""
-            campus_id = ""
-            emplid = ""
-            prgm = ""
-            plan = ""
-            level_start = ""
-            level_end = ""
-            finalist = ""
-            ann_code = ""
-            ann_comment = ""
-            # If we located campus_id index, use it
-            if campus_id_idx is not None:
-                campus_id = parts[campus_id_idx]
-                # emplid often follows campus_id
-                if campus_id_idx + 1 < len(parts) and parts[campus_id_idx + 1].isdigit():
-                    emplid = parts[campus_id_idx + 1]
-            else:
-                # Try to find campus_id and emplid in the next columns with looser rules
-                for p in parts[1:6]:
-                    if campus_re.match(p.upper()):
-                        campus_id = p
-                    elif p.isdigit() and not emplid:
-                        emplid = p
-
-            # Try to fill other fields if present (best-effort by common positions)
-            if len(parts) > 3 and not prgm:
-                prgm = parts[3]
-            if len(parts) > 4 and not plan:
-                plan = parts[4]
-            if len(parts) > 6:
-                level_start = parts[6]
-            if len(parts) > 7:
-                level_end = parts[7]
-            if len(parts) > 8:
-                finalist = parts[8]
-            # Prefer annotation code in column M (index 12), fall back to previous Q (index 16)
-            if len(parts) > 12 and parts[12].strip():
-                ann_code = parts[12]
-            elif len(parts) > 16:
-                ann_code = parts[16]
-            if len(parts) > 17:
-                ann_comment = parts[17]
-
-            current_student = {
-                "name": name,
-                "campus_id": campus_id,
-                "emplid": emplid,
-                "prgm": prgm,
-                "plan": plan,
-                "level_start": level_start,
-                "level_end": level_end,
-                "finalist": finalist,
-                "annotation_code": ann_code,
-                "annotation_comment": ann_comment,
-                "years": [],
-            }
-            current_year = None
-            continue
-
-        if parts and parts[0].isdigit() and len(parts[0]) == 4:
-            year = int(parts[0])
-            term = parts[1] if len(parts) > 1 else ""
-            prog = parts[2] if len(parts) > 2 else ""
-            degree = parts[3] if len(parts) > 3 else ""
-            acad_level = parts[4] if len(parts) > 4 else ""
-            standing = parts[5] if len(parts) > 5 else ""
-            plan_y = parts[6] if len(parts) > 6 else ""
-            # Additional metrics (CB024 format has more columns) - strip semicolons
-            jt = parts[11].rstrip(';') if len(parts) > 11 else ""
-            je = parts[12].rstrip(';') if len(parts) > 12 else ""
-            st = parts[13].rstrip(';') if len(parts) > 13 else ""
-            se = parts[14].rstrip(';') if len(parts) > 14 else ""
-            tt = parts[15].rstrip(';') if len(parts) > 15 else ""
-            te = parts[16].rstrip(';') if len(parts) > 16 else ""
-            ce = parts[17].rstrip(';') if len(parts) > 17 else ""
-            wghtd_gpa = parts[18].rstrip(';') if len(parts) > 18 else ""
-            term_gpa = parts[19].rstrip(';') if len(parts) > 19 else ""
-            cum_gpa = parts[20].rstrip(';') if len(parts) > 20 else ""
-
-            current_year = {
-                "year": year,
-                "term": term,
-                "program": prog,
-                "degree": degree,
-                "acad_level": acad_level,
-                "standing": standing,
-                "plan": plan_y,
-                "jt": jt,
-                "je": je,
-                "st": st,
-                "se": se,
-                "tt": tt,
-                "te": te,
-                "ce": ce,
-                "wghtd_gpa": wghtd_gpa,
-                "term_gpa": term_gpa,
-                "cum_gpa": cum_gpa,
-                "courses": [],
-            }
-            if current_student:
-                current_student["years"].append(current_year)
-            continue
-
-        if current_year and parts and parts[0] == "" and len(parts) >= 2 and parts[1]:
-            # Check if this is a specialization line (non-course, usually contains keywords or ends with semicolon)
-            potential_spec = parts[1].rstrip(';').strip()
-            # Heuristic: if parts[1] has no digits or looks like text (keywords), it's specialization
-            if len(parts) <= 3 or (potential_spec and not any(c.isdigit() for c in potential_spec[:10])):
-                if potential_spec and potential_spec not in ['']:
-                    current_year["specialization"] = potential_spec
-                    # Append specialization to programme if available
-                    if current_year.get("program"):
-                        current_year["program"] = f"{current_year['program']} - {potential_spec}"
-                continue
+    profiling.count("cache.parse.calls")
+    handle = default_store().get_or_load(source.key, _load)
+    return handle, reused
 
-        if current_year and parts and parts[0] == "":
-            seg1 = parts[1:7]
-            c1 = parse_course_segment(seg1)
-            if c1:
-                current_year["courses"].append(c1)
-            sep_index = -1
-            try:
-                sep_index = parts.index("", 7)
-            except ValueError:
-                sep_index = -1
-            if sep_index != -1:
-                seg2 = parts[sep_index + 1: sep_index + 7]
-                c2 = parse_course_segment(seg2)
-                if c2:
-                    current_year["courses"].append(c2)
-            continue
-
-        if line.startswith("Course Counts"):
-            summary = {}
-            labels = parts
-            i = 1
-            last_norm_label = ""
-            while i < len(labels):
-                label_raw = labels[i].strip()
-                label_norm = label_raw.lower().strip(":")
-                val = labels[i + 1].strip() if i + 1 < len(labels) else ""
-                key = None
-                if label_norm == "passed" and last_norm_label != "latest term: attempted":
-                    key = "total_passed"
-                elif label_norm == "for which units earned":
-                    key = "units_earned"
-                elif label_norm == "senior passed":
-                    key = "senior_passed"
-                elif label_norm == "junior passed":
-                    key = "junior_passed"
-                elif label_norm == "latest term: attempted":
-                    key = "latest_term_attempted"
-                elif label_norm == "passed" and last_norm_label == "latest term: attempted":
-                    key = "latest_term_passed"
-                if key and current_student is not None:
-                    summary[key] = val
-                last_norm_label = label_norm
-                i += 2
-
-            if current_student is not None and summary:
-                current_student["summary"] = summary
-            if current_student is not None:
-                students.append(current_student)
-            current_student = None
-            current_year = None
-            continue
-
-    if current_student:
-        students.append(current_student)
-
-    return students
-
-
-def parse_report(file_path: str):
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-        return _parse_from_iter(f)
-
-
-def parse_report_text(text: str):
-    return _parse_from_iter(text.splitlines())
-
-
-def _normalize_year_label(val: str | int | float | None):
-    if val is None:
-        return None
-    text = str(val).strip()
-    if not text:
-        return None
-    m = re.search(r"year\s*(\d+)", text, re.IGNORECASE)
-    if m:
-        return f"Year {int(m.group(1))}"
-    if text.isdigit():
-        return f"Year {int(text)}"
-    return text
-
-
-def _normalize_acad_level(level: str | None):
-    if not level:
-        return None
-    level_text = level.lower()
-    mapping = {
-        "first": "Year 1",
-        "second": "Year 2",
-        "third": "Year 3",
-        "fourth": "Year 4",
-        "fifth": "Year 5",
-        "sixth": "Year 6",
-    }
-    for key, norm in mapping.items():
-        if key in level_text:
-            return norm
-    m = re.search(r"(\d+)", level_text)
-    if m:
-        return f"Year {int(m.group(1))}"
-    return None
 
+def export_report_tables(students: list[dict], annotations: dict) -> bytes:
+    with profiling.phase("export_tables"):
+        return tables_zip(report_tables(students, annotations))
 
-def _clean_code(code: str | None):
-    if code is None:
-        return None
-    text = str(code).strip()
-    if not text:
-        return None
-    if text.lower() in {"nan", "none"}:
-        return None
-    return text.upper()
 
+def report_packs_document(students: list[dict]) -> bytes:
+    # Rendered in-process: forking worker processes from the Streamlit server is not safe
+    with profiling.phase("report_packs"):
+        sections = render_packs(students, REQUIREMENTS_CSV, workers=0)
+        return render_document(sections, "Student report packs").encode("utf-8")
 
-def _is_fail_course(course: dict) -> bool:
-    sym = str(course.get("symbol", ""))
-    if "F" in sym:
-        return True
-    res = str(course.get("result", "")).strip()
-    try:
-        if res:
-            return float(res) < 50
-    except ValueError:
-        pass
-    return False
 
+def choose_source(sources: list, key: str, container=st.sidebar):
+    """The report to use from an upload; archives with several reports get a picker."""
+    if len(sources) == 1:
+        return sources[0]
+    idx = container.selectbox(
+        "Report in archive",
+        options=range(len(sources)),
+        format_func=lambda i: sources[i].name,
+        key=key,
+    )
+    return sources[idx]
 
-@st.cache_data(show_spinner=False)
-def load_programme_requirements(path: str):
-    if not os.path.exists(path):
-        return {}, {}
-    try:
-        df = pd.read_csv(path)
-        # Normalize column names to snake_case for flexible CSV headers
-        def _norm(col: str):
-            return str(col).strip().lower().replace(" ", "_").replace("-", "_")
-        df.columns = [_norm(c) for c in df.columns]
-    except Exception:
-        return {}, {}
-
-    index: dict[str, dict[str, list[dict]]] = {}
-    names: dict[str, str] = {}
-    for _, row in df.iterrows():
-        prog = str(
-            row.get("programme_code")
-            or row.get("program_code")
-            or row.get("programme")
-            or row.get("program")
-            or ""
-        ).strip()
-        if not prog:
-            continue
-        year_label = _normalize_year_label(row.get("year"))
-        course_code = _clean_code(row.get("course_code") or row.get("course"))
-        alt_course = _clean_code(row.get("alternative_course") or row.get("alternative"))
-        if not course_code:
-            continue
-        rec = {
-            "course_code": course_code,
-            "alternative_course": alt_course,
-            "programme_name": str(
-                row.get("programme_name")
-                or row.get("program_name")
-                or row.get("programme")
-                or row.get("program")
-                or ""
-            ).strip(),
-            "year_label": year_label,
-        }
-        index.setdefault(prog, {}).setdefault(year_label, []).append(rec)
-        if prog not in names:
-            names[prog] = rec["programme_name"]
-    return index, names
-
-
-def compute_student_insights(student: dict):
-    """Derive extra summaries: program changes, repeated fails, actual year count, weakest year pass rate."""
-    years = student.get("years", [])
-
-    # Program change tracking
-    program_sequence = []
-    for yr in years:
-        prog = yr.get("program")
-        if prog:
-            program_sequence.append(prog)
-    program_changes = []
-    if program_sequence:
-        last = program_sequence[0]
-        for prog in program_sequence[1:]:
-            if prog != last:
-                program_changes.append(prog)
-            last = prog
-    program_change_count = len(program_changes)
-    # Build display string including initial program if changes exist
-    if program_sequence:
-        first_prog = program_sequence[0]
+
+def start_report_parse(source, previous=None):
+    """Start parsing an upload in the background (or reuse the shared copy)."""
+    pending = st.session_state.pop("parse_job", None)
+    if pending is not None:
+        # Cancels that parse unless another session is waiting for it too
+        pending.release()
+    if previous is None:
+        st.session_state.index = 0
+        st.session_state.position = 1
+    profiling.count("cache.parse.calls")
+    shared = default_store().get(source.key)
+    if shared is not None:
+        install_report(shared)
+        return
+    profiling.count("cache.parse.misses")
+    # Student blocks from the previous upload; a reissued report only re-parses changed blocks
+    cache = dict(zip(previous.block_hashes, previous.students)) if previous is not None else None
+    job = default_jobs().start(source, cache, previous.diagnostics if previous is not None else None)
+    st.session_state.parse_job = job
+    job.wait(PARSE_WAIT_S)
+
+
+def poll_report_parse():
+    """Install the session's finished parse as its report; returns the parse still running, if any."""
+    job = st.session_state.get("parse_job")
+    if job is None or not job.done:
+        return job
+    del st.session_state["parse_job"]
+    progress = job.progress()
+    if progress["error"]:
+        st.sidebar.error(f"Could not parse the report: {progress['error']}")
     else:
-        first_prog = ""
-    program_change_list = [first_prog] + program_changes if program_change_count else [first_prog] if first_prog else []
-
-    # Fail detection helper
-    def is_fail(course: dict):
-        sym = str(course.get("symbol", ""))
-        if "F" in sym:
-            return True
-        res = str(course.get("result", "")).strip()
-        try:
-            if res:
-                return float(res) < 50
-        except ValueError:
-            pass
-        return False
+        install_report(default_store().get_or_load(job.key, job.job.result), progress["reused"])
+    job.release()
+    return None
 
-    # Repeated failed courses
-    fail_attempts = {}
-    for yr in years:
-        for c in yr.get("courses", []):
-            code = c.get("code")
-            if not code:
-                continue
-            if is_fail(c):
-                fail_attempts.setdefault(code, []).append(c)
-    repeated_fails = []
-    for code, attempts in fail_attempts.items():
-        if len(attempts) >= 2:
-            last = attempts[-1]
-            res = str(last.get("result", "")).strip()
-            repeated_fails.append(f"{code} ({res or last.get('symbol','')})")
-
-    # Actual years of study (calendar years with courses)
-    years_with_courses = set()
-    for yr in years:
-        if yr.get("courses"):
-            years_with_courses.add(yr.get("year"))
-    actual_year_number = len(years_with_courses)
-
-    # Weakest year by pass rate (group terms within same calendar year)
-    weakest = None  # (year, passed, attempted, rate)
-    year_stats = {}
-    for yr in years:
-        y = yr.get("year")
-        if y is None:
-            continue
-        for c in yr.get("courses", []):
-            if not c.get("code"):
+
+def install_report(report, reused: int = 0):
+    previous = st.session_state.get("report")
+    if previous is not None:
+        previous.release()
+    st.session_state.report = report
+    students = report.students
+    # Stay on the same student if they are still in the report
+    resume_id = st.session_state.pop("resume_campus_id", None)
+    if resume_id is not None:
+        new_ids = [s.get("campus_id") for s in students]
+        st.session_state.index = new_ids.index(resume_id) if resume_id in new_ids else 0
+    else:
+        st.session_state.index = min(st.session_state.get("index", 0), max(0, len(students) - 1))
+    st.session_state.position = st.session_state.index + 1
+    # Codes already stored in the report's rows; annotations made in this session win
+    annotations = st.session_state.setdefault("annotations", {})
+    mark_annotated(merge_annotations(annotations, report_annotations(students), only_missing=True))
+    profiling.count("parse.blocks_reused", reused)
+    if previous is not None and reused:
+        st.sidebar.caption(f"Updated report: re-parsed {len(students) - reused} changed students, reused {reused}.")
+
+
+def render_parse_diagnostics(diagnostics):
+    """What the parse of the current report lost or read by heuristic, if anything."""
+    if diagnostics is None or not (diagnostics.total or diagnostics.heuristic):
+        return
+    title = f"Parse diagnostics: {diagnostics.total} lost" if diagnostics.total else "Parse diagnostics: nothing lost"
+    with st.sidebar.expander(title, expanded=False):
+        for heading, lost in (("Lost", True), ("Read by heuristic", False)):
+            issues = diagnostics.summary(lost)
+            if not issues:
                 continue
-            stats = year_stats.setdefault(y, {"attempted": 0, "passed": 0})
-            stats["attempted"] += 1
-            if not is_fail(c):
-                stats["passed"] += 1
-    for y, stats in year_stats.items():
-        attempted = stats["attempted"]
-        passed = stats["passed"]
-        if attempted <= 1:
-            continue  # skip trivial years
-        rate = passed / attempted if attempted else 1.0
-        if weakest is None or rate < weakest[3]:
-            weakest = (y, passed, attempted, rate)
-
-    insights = {
-        "program_changes": program_change_count,
-        "program_change_list": program_change_list,
-        "repeated_fails": repeated_fails,
-        "actual_year": actual_year_number,
-        "weakest_year": weakest,
-    }
-    return insights
+            st.caption(heading)
+            for issue in issues:
+                st.markdown(f"**{issue['label']}**: {issue['count']}")
+                if issue["samples"]:
+                    st.dataframe(pd.DataFrame(issue["samples"]), hide_index=True, width='stretch')
+
+
+@st.fragment(run_every=1.0)
+def render_parse_progress(job):
+    progress = job.progress()
+    if progress["done"]:
+        st.rerun()
+    total = progress["total_rows"]
+    if total:
+        st.progress(
+            min(1.0, progress["rows"] / total),
+            text=f"Parsing report: {progress['rows']:,} of {total:,} rows, {progress['students']:,} students found",
+        )
+    else:
+        # Compressed uploads are decompressed as they are parsed, so the row count is unknown
+        st.caption(f"Parsing report: {progress['rows']:,} rows, {progress['students']:,} students found")
 
 
 @st.cache_data(show_spinner=False)
-def load_students_from_text(text: str):
-    return parse_report_text(text)
+def load_cohort_analytics(file_hash: str, _students: list[dict]):
+    # Cached per report hash; the student list itself is not hashed
+    profiling.count("cache.analytics.misses")
+    return compute_cohort_analytics(_students)
+
+
+def render_cohort_analytics(students: list[dict], file_hash: str):
+    st.subheader("Cohort analytics")
+    profiling.count("cache.analytics.calls")
+    with profiling.phase("cohort_analytics"):
+        data = load_cohort_analytics(file_hash, students)
+    overview = data["overview"]
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Students", overview["students"])
+    c2.metric("Course attempts", overview["attempts"])
+    c3.metric("Fails", overview["fails"])
+    rate = overview["pass_rate"]
+    c4.metric("Pass rate", f"{rate:.1%}" if rate is not None else "N/A")
+
+    st.markdown("**Per-course pass/fail rates**")
+    st.dataframe(
+        data["course_stats"],
+        hide_index=True,
+        width='stretch',
+        column_config={"pass_rate": st.column_config.ProgressColumn("pass_rate", min_value=0.0, max_value=1.0, format="percent")},
+    )
+
+    left, right = st.columns(2)
+    with left:
+        st.markdown("**Fail symbols by course**")
+        st.dataframe(data["fail_symbols"], hide_index=True, width='stretch')
+    with right:
+        st.markdown("**Pass rate by academic level and term**")
+        level_term = data["level_term"]
+        if not level_term.empty:
+            pivot = level_term.pivot(index="level", columns="term", values="pass_rate")
+            st.dataframe(pivot, width='stretch')
+
+    st.markdown("**Programme change flows**")
+    flows = data["programme_flows"]
+    if flows.empty:
+        st.caption("No programme changes in this report.")
+    else:
+        st.dataframe(flows, hide_index=True, width='stretch')
+
+    render_trajectories(students, file_hash)
+
+    hist = data["gpa_histogram"]
+    if hist is not None:
+        st.markdown("**GPA distribution**")
+        st.bar_chart(hist, x="gpa", y=["term_gpa", "latest_cum_gpa"], stack=False)
+
+    st.markdown("**Report packs**")
+    with_fails = st.checkbox("Only students with failed courses", key="packs_with_fails")
+    selected = select_students(students, with_fails=with_fails)
+    st.download_button(
+        f"Download report packs for {len(selected)} students (HTML)",
+        data=partial(report_packs_document, selected),
+        file_name="report_packs.html",
+        mime="text/html",
+    )
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_trajectories(file_hash: str, _students: list[dict]):
+    # Shared rather than copied per call: the student page reads one row on every render
+    profiling.count("cache.trajectories.misses")
+    return compute_trajectories(_students)
+
+
+def report_trajectories(students: list[dict], file_hash: str):
+    profiling.count("cache.trajectories.calls")
+    with profiling.phase("trajectories"):
+        return load_trajectories(file_hash, students)
+
+
+def render_trajectories(students: list[dict], file_hash: str):
+    st.markdown("**Academic trajectories**")
+    frame = report_trajectories(students, file_hash)
+    c1, c2, c3, c4 = st.columns(4)
+    min_streak = c1.number_input("Poor terms in a row, at least", min_value=0, value=0, step=1, key="traj_min_streak")
+    max_ratio = c2.number_input("Credit rate vs programme, at most", min_value=0.0, value=None, step=0.05,
+                                placeholder="Any", key="traj_max_ratio")
+    sort_by = c3.selectbox("Sort by", options=list(TRAJECTORY_SORT_KEYS), format_func=TRAJECTORY_SORT_KEYS.get, key="traj_sort")
+    ascending = c4.toggle("Ascending", key="traj_ascending")
+    declining = st.checkbox("Only declining GPA", key="traj_declining")
+    shown = filter_trajectories(frame, min_streak, declining, max_ratio, sort_by, ascending)
+    st.dataframe(
+        shown.drop(columns=["student"]),
+        hide_index=True,
+        width='stretch',
+        column_config={
+            "gpa_series": st.column_config.LineChartColumn("Term GPA", y_min=0, y_max=100),
+            "credit_ratio": st.column_config.NumberColumn("credit_ratio", format="%.2f"),
+        },
+    )
+    if len(shown) and st.button(f"Browse these {len(shown)} students"):
+        set_navigation_order(shown["student"].tolist(), f"trajectory: {TRAJECTORY_SORT_KEYS[sort_by].lower()}")
+        st.success("Switch the View to Student records to step through them.")
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def load_snapshot(file_hash: str, label: str, _students: list[dict]):
+    return make_snapshot(label, _students)
+
+
+def render_snapshot_changes(students: list[dict], file_hash: str, report_name: str):
+    st.subheader("Changes since an earlier snapshot")
+    earlier = st.file_uploader("Earlier report", type=REPORT_UPLOAD_TYPES, key="earlier_snapshot")
+    if earlier is None:
+        st.info("Upload an earlier report of the same cohort to see new fails, new passes and standing changes.")
+        return
+    sources = report_sources(earlier.name, earlier.getvalue())
+    if not sources:
+        st.error("No CSV reports found in this archive.")
+        return
+    source = choose_source(sources, "earlier_member", st)
+    held = st.session_state.get("earlier_report")
+    if held is None or held.key != source.key:
+        handle, _ = acquire_report(source)
+        if held is not None:
+            held.release()
+        st.session_state.earlier_report = held = handle
+    old = load_snapshot(source.key, source.name, held.students)
+    new = load_snapshot(file_hash, report_name, students)
+    diff = diff_snapshots(old, new, st.session_state.setdefault("snapshot_diff_cache", {}))
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Changed", len(diff["changed"]))
+    c2.metric("Unchanged", diff["unchanged"])
+    c3.metric("New in this report", len(diff["added"]))
+    c4.metric("No longer listed", len(diff["removed"]))
+    rows = diff_rows(diff, new["students"])
+    if rows:
+        st.dataframe(pd.DataFrame(rows), hide_index=True, width='stretch')
+    else:
+        st.success("No course, standing or summary changes for students in both reports.")
+
+    carried = carry_annotations([old], st.session_state.annotations)
+    current = st.session_state.annotations
+    missing = {
+        k: annotation(v.get("code", ""), v.get("comment", ""), annotation_author()) for k, v in carried.items()
+        if k in new["students"] and not (current.get(k, {}).get("code") or current.get(k, {}).get("comment"))
+    }
+    if missing and st.button(f"Carry forward {len(missing)} annotations from {source.name}"):
+        st.session_state.annotations.update(missing)
+        mark_annotated(missing)
+        st.success(f"Carried forward {len(missing)} annotations.")
+
+
+def student_view_model(report, index: int, requirements_index: dict, req_code: str | None = None) -> dict:
+    """View model for one student from the shared cache, building it here on a miss."""
+    def _build():
+        profiling.count("cache.view_model.misses")
+        return build_view_model(report.students[index], requirements_index, req_code)
+
+    profiling.count("cache.view_model.calls")
+    return default_cache().get((report.key, index, req_code), _build)
+
+
+def prefetch_neighbours(report, index: int, requirements_index: dict):
+    """Queue view models for the students a reviewer is likely to open next."""
+    owner = st.session_state.setdefault("prefetch_owner", uuid.uuid4().hex)
+    jobs = [
+        ((report.key, j, None), partial(build_view_model, report.students[j], requirements_index))
+        for j in neighbour_indices(index, len(report.students))
+    ]
+    default_cache().prefetch(jobs, owner=owner)
+
+
+def profiling_requested() -> bool:
+    return profiling.env_enabled() or st.query_params.get("debug") == "1"
+
+
+def render_profiling_panel(prof: profiling.Profiler, session_bytes: dict[str, int]):
+    with st.sidebar.expander("Debug: profiling", expanded=False):
+        snap = prof.snapshot()
+        timing_rows = [
+            {"Phase": name, "ms": ms, "Calls": snap["calls"][name]}
+            for name, ms in sorted(snap["timings_ms"].items(), key=lambda kv: kv[1], reverse=True)
+        ]
+        if timing_rows:
+            st.dataframe(pd.DataFrame(timing_rows), hide_index=True, width='stretch')
+        counters = snap["counters"]
+        cache_rows = []
+        for name in sorted({k.split(".")[1] for k in counters if k.startswith("cache.")}):
+            calls = counters.get(f"cache.{name}.calls", 0)
+            misses = counters.get(f"cache.{name}.misses", 0)
+            cache_rows.append({"Cache": name, "Hits": max(0, calls - misses), "Misses": misses})
+        if cache_rows:
+            st.dataframe(pd.DataFrame(cache_rows), hide_index=True, width='stretch')
+        mem_rows = [{"Session object": k, "KiB": round(v / 1024, 1)} for k, v in session_bytes.items()]
+        st.dataframe(pd.DataFrame(mem_rows), hide_index=True, width='stretch')
+        store = default_store().stats()
+        st.caption(
+            f"Shared report store: {store['reports']} reports, "
+            f"{store['bytes'] / 2**20:.1f} of {store['budget_bytes'] / 2**20:.0f} MiB, "
+            f"{store['hits']} hits, {store['misses']} misses, {store['evictions']} evictions"
+        )
+        models = default_cache().stats()
+        st.caption(
+            f"View models: {models['models']} cached, {models['pending']} queued, "
+            f"{models['prefetched']} prefetched, {models['hits']} hits, {models['misses']} misses, "
+            f"{models['invalidated']} invalidated by requirement reloads"
+        )
+
+
+def session_memory_estimate() -> dict[str, int]:
+    sizes = {
+        key: profiling.estimate_size(st.session_state[key])
+        for key in ("annotations", "snapshot_diff_cache")
+        if key in st.session_state
+    }
+    # Parsed reports live in the shared store; count them once, labelled as shared
+    for key in ("report", "earlier_report"):
+        handle = st.session_state.get(key)
+        if handle is not None:
+            sizes[f"{key} (shared)"] = handle.nbytes
+    return sizes
+
+
+@contextmanager
+def fragment_profiling(name: str):
+    """Profile a fragment's own reruns, which run outside main() and its profiler."""
+    if profiling.current().enabled or not profiling_requested():
+        yield
+        return
+    prof = profiling.Profiler(enabled=True)
+    with profiling.activated(prof):
+        with prof.phase("total"):
+            yield
+    profiling.log_run(prof, fragment=name, file_hash=st.session_state.get("file_hash"))
 
 
-def main():
-    st.set_page_config(page_title=PAGE_TITLE, layout="wide")
+def annotated_csv(source, annotations: dict[str, dict]) -> bytes:
+    """The uploaded report with annotation codes in column M and comments in column R."""
+    with profiling.phase("annotate_csv"):
+        return annotated_report_csv(source.lines(), annotations)
+
+
+def annotation_author() -> str:
+    return st.session_state.get("user_email", "")
+
+
+def _import_annotation_sidecar():
+    uploaded = st.session_state.get("annotation_sidecar")
+    if uploaded is None:
+        return
     try:
-        auth = import_module("auth")
-    except Exception as e:
-        st.error("Failed to load authentication module. Ensure dependencies are installed on Streamlit Cloud (see requirements.txt).")
-        st.exception(e)
-        st.stop()
+        incoming = read_sidecar(uploaded.getvalue())
+    except ValueError as e:
+        st.session_state.sidecar_message = ("error", str(e))
+        return
+    with profiling.phase("merge_annotations"):
+        changed = merge_annotations(st.session_state.setdefault("annotations", {}), incoming)
+    for campus_id in changed:
+        # The panel's widgets re-read the merged annotation
+        for prefix in ("code_", "comment_", "radio_"):
+            st.session_state.pop(prefix + campus_id, None)
+    mark_annotated(changed)
+    st.session_state.sidecar_message = ("success", f"Imported {len(changed)} of {len(incoming)} annotations from {uploaded.name}.")
 
-    # Show login page if not authenticated
-    
-    #if not auth.is_authenticated():
-    #    with st.sidebar:
-    #        st.title("Log in with Google to continue")
-    #        if st.button("Authentication"):
-    #            st.login("google")
-    #            st.write(st.user)
-    #            #st.rerun()
-    #st.success("✅ You are logged in.")
 
-    
-    # Main app (only shown when authenticated)
-    st.title(PAGE_TITLE)
+# The student page is split into fragments: interacting with a widget reruns
+# only the fragment it is in, so typing an annotation or switching level tab
+# does not repeat requirement matching or rebuild the other tables.
 
-    req_path = os.path.join(os.path.dirname(__file__), "UCT_Commerce_Programme_Course_Requirements_2024_2025.csv")
-    requirements_index, requirement_names = load_programme_requirements(req_path)
+def navigation_order(students: list[dict]):
+    """Report positions the navigation steps through: a search result, or every student."""
+    order = st.session_state.get("nav_order")
+    return order if order is not None else range(len(students))
 
-    # File upload and state management
-    if "students" not in st.session_state:
-        st.session_state.students = []
-    if "index" not in st.session_state:
-        st.session_state.index = 0
-    uploaded = st.sidebar.file_uploader("Upload report CSV", type=["csv"], accept_multiple_files=False)
-    if uploaded is not None:
-        content_bytes = uploaded.getvalue()
-        file_hash = hashlib.sha256(content_bytes).hexdigest()
-        if st.session_state.get("file_hash") != file_hash:
-            text = content_bytes.decode("utf-8", errors="ignore")
-            st.session_state.students = load_students_from_text(text)
-            st.session_state.index = 0
-            st.session_state.position = 1
-            st.session_state.file_hash = file_hash
-            st.session_state.original_csv_text = text
-            st.session_state.original_csv_name = uploaded.name
-            if "annotations" not in st.session_state:
-                st.session_state.annotations = {}
-            # Import existing annotation codes/comments from uploaded CSV
-            try:
-                csv_reader = csv.reader(io.StringIO(text))
-                campus_re = re.compile(r'^[A-Za-z]{6}\d{3}$')
-                for row in csv_reader:
-                    parts = [p.strip() for p in row]
-                    # find campus id in first 7 columns (common variants)
-                    campus = None
-                    for p in parts[:7]:
-                        if campus_re.match(p):
-                            campus = p
-                            break
-                    # fallback to col 2 if present
-                    if not campus and len(parts) > 2 and parts[2].strip():
-                        campus = parts[2].strip()
-                    if not campus:
-                        continue
-                    code = ""
-                    comment = ""
-                    if len(parts) > 12 and parts[12].strip():
-                        code = parts[12].strip()
-                    elif len(parts) > 16 and parts[16].strip():
-                        code = parts[16].strip()
-                    if len(parts) > 17 and parts[17].strip():
-                        comment = parts[17].strip()
-                    if code or comment:
-                        st.session_state.annotations[campus] = {"code": code, "comment": comment}
-            except Exception:
-                # don't fail upload on parsing of annotations; ignore errors
-                pass
-            st.session_state.original_csv_text = text
-            st.session_state.original_csv_name = uploaded.name
-            if "annotations" not in st.session_state:
-                st.session_state.annotations = {}
 
-    students = st.session_state.students
-    last_idx = max(0, len(students) - 1)
-    # Keep slider position in sync with index (1-based for display)
-    if "position" not in st.session_state:
-        st.session_state.position = (st.session_state.index + 1) if students else 1
-    else:
-        expected_pos = (st.session_state.index + 1) if students else 1
-        if st.session_state.position != expected_pos:
-            st.session_state.position = expected_pos
+def navigation_rank(order, index: int) -> int:
+    try:
+        return order.index(index)
+    except ValueError:
+        return 0
 
-    # Sidebar navigation
-    st.sidebar.subheader("Navigate")
-    with st.sidebar:
+
+def set_navigation_order(order: list[int] | None, label: str = ""):
+    """Navigate ``order`` (``None`` for the whole report) from its first student."""
+    st.session_state.nav_order = order
+    st.session_state.nav_label = label if order is not None else ""
+    if order:
+        st.session_state.index = order[0]
+    st.session_state.position = 1
+
+
+@st.fragment
+def render_navigation(students: list[dict]):
+    with fragment_profiling("navigation"):
+        order = navigation_order(students)
+        rank = navigation_rank(order, st.session_state.index) if students else 0
+        last_rank = max(0, len(order) - 1)
+        st.subheader("Navigate")
         c1, c2, c3, c4 = st.columns(4)
+        target = None
         if c1.button("⏮"):
-            st.session_state.index = 0
-            st.session_state.position = 1
+            target = 0
         if c2.button("◀"):
-            st.session_state.index = max(0, st.session_state.index - 1)
-            st.session_state.position = st.session_state.index + 1
+            target = max(0, rank - 1)
         if c3.button("▶"):
-            st.session_state.index = min(st.session_state.index + 1, last_idx)
-            st.session_state.position = st.session_state.index + 1
+            target = min(rank + 1, last_rank)
         if c4.button("⏭"):
-            st.session_state.index = last_idx
-            st.session_state.position = last_idx + 1
+            target = last_rank
+        if target is not None and order:
+            st.session_state.index = order[target]
+            st.session_state.position = target + 1
         if students:
             def _on_position_change():
-                st.session_state.index = min(max(0, st.session_state.position - 1), last_idx)
-
-            st.slider(
-                "Position",
-                min_value=1,
-                max_value=len(students),
-                key="position",
-                on_change=_on_position_change,
-            )
-            st.caption(f"Student {st.session_state.index + 1} of {len(students)}")
-            
+                st.session_state.index = order[min(max(0, st.session_state.position - 1), last_rank)]
+
+            if len(order) > 1:
+                st.slider(
+                    "Position",
+                    min_value=1,
+                    max_value=len(order),
+                    key="position",
+                    on_change=_on_position_change,
+                )
+            label = st.session_state.get("nav_label")
+            rank = navigation_rank(order, st.session_state.index)
+            st.caption(f"Student {rank + 1} of {len(order)}" + (f" ({label})" if label else ""))
+
             # Student selector dropdown
-            student_options = [f"{s['campus_id']} - {s['name']}" for s in students]
-            current_option = student_options[st.session_state.index] if students else ""
-            
+            student_options = [f"{students[i]['campus_id']} - {students[i]['name']}" for i in order]
+
             def _on_student_select():
                 selected = st.session_state.student_selector
-                selected_idx = student_options.index(selected)
+                selected_idx = order[student_options.index(selected)]
                 st.session_state.index = selected_idx
-            
+
             st.selectbox(
                 "Select by Student Number",
                 options=student_options,
-                index=st.session_state.index,
+                index=rank,
                 key="student_selector",
                 on_change=_on_student_select,
             )
-            # Annotation UI
-            st.subheader("Annotate")
-            current_student_number = students[st.session_state.index].get("campus_id", "")
-            code_key = f"code_{current_student_number}"
-            comment_key = f"comment_{current_student_number}"
-            radio_key = f"radio_{current_student_number}"
-            curr_student = students[st.session_state.index]
-            existing_code = curr_student.get("annotation_code", "")
-            existing_comment = curr_student.get("annotation_comment", "")
-            
-            # Initialize if not present
-            if code_key not in st.session_state:
-                st.session_state[code_key] = existing_code or st.session_state.annotations.get(current_student_number, {}).get("code", "")
-            if comment_key not in st.session_state:
-                st.session_state[comment_key] = existing_comment or st.session_state.annotations.get(current_student_number, {}).get("comment", "")
-            
-            # Check if radio was previously set and apply before creating widgets
-            if radio_key in st.session_state and st.session_state[radio_key]:
-                st.session_state[code_key] = st.session_state[radio_key]
-            
-            st.text_input("Coding", key=code_key, label_visibility="visible")
-            st.markdown("<style>.stRadio > label {margin-top: -1rem;}</style>", unsafe_allow_html=True)
-            st.radio("", options=["CONT", "QUAL", "SUPP", "FECP", "FECR", "FECF"], key=radio_key, horizontal=True, index=None)
-            st.text_area("Comment", key=comment_key, height=120)
-
-            st.session_state.annotations[current_student_number] = {
-                "code": st.session_state.get(code_key, ""),
-                "comment": st.session_state.get(comment_key, ""),
-            }
+    if st.session_state.index != st.session_state.get("rendered_index"):
+        # Another student: everything else on the page changes with it
+        st.rerun()
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_outstanding_index(file_hash: str, requirements_version: int, _students: list[dict], _requirements_index: dict):
+    profiling.count("cache.outstanding_index.misses")
+    return outstanding_index(_students, _requirements_index)
+
+
+@st.fragment
+def render_course_search(report, requirements: dict):
+    with fragment_profiling("course_search"):
+        st.subheader("Find students")
+        if report.course_index is None:
+            st.caption("Course search is available once the report has finished parsing.")
+            return
+        with st.form("course_search", border=False):
+            code = st.text_input("Course code", placeholder="e.g. ACC1006F")
+            kind = st.radio("Students who", options=SEARCH_KINDS, horizontal=True,
+                            format_func=lambda k: {"attempted": "attempted", "failed": "failed", "outstanding": "still need"}[k])
+            submitted = st.form_submit_button("Search")
+        if submitted and code.strip():
+            outstanding = None
+            if kind == "outstanding":
+                profiling.count("cache.outstanding_index.calls")
+                outstanding = load_outstanding_index(report.key, requirements["version"], report.students, requirements["index"])
+            with profiling.phase("course_search"):
+                positions = find_students(report.course_index, code, kind, outstanding)
+            if positions:
+                verb = "still need" if kind == "outstanding" else kind
+                set_navigation_order(positions, f"{verb} {code.strip().upper()}")
+                st.rerun()
+            st.caption(f"No students {'still need' if kind == 'outstanding' else kind} {code.strip().upper()}.")
+        if st.session_state.get("nav_order") is not None:
+            if st.button("Show all students"):
+                set_navigation_order(None)
+                st.rerun()
+
+
+def session_triage(report, requirements: dict) -> Triage:
+    """This session's triage for ``report``, kept up to date with requirement reloads."""
+    held = st.session_state.get("triage")
+    if held is None or held["key"] != report.key:
+        annotated = [k for k, v in st.session_state.get("annotations", {}).items() if v.get("code") or v.get("comment")]
+        with profiling.phase("triage"):
+            triage = Triage(report.students, requirements["index"], annotated)
+        st.session_state.triage = {"key": report.key, "version": requirements["version"], "triage": triage}
+        return triage
+    triage = held["triage"]
+    if held["version"] != requirements["version"]:
+        with profiling.phase("triage"):
+            if requirements["diff"] is not None and held["version"] == requirements["version"] - 1:
+                triage.requirements_changed(report.students, requirements["index"], requirements["diff"])
+            else:
+                # Missed a reload: rescore from scratch, keeping the weights and reviewed students
+                triage = held["triage"] = Triage(report.students, requirements["index"], triage.annotated(), triage.weights)
+        held["version"] = requirements["version"]
+    return triage
 
-            # Download annotated CSV
-            def _annotate_csv_text(original_text: str, annotations: dict[str, dict]):
-                out = io.StringIO()
-                writer = csv.writer(out)
-                reader = csv.reader(io.StringIO(original_text))
-                for row in reader:
-                    parts = [p for p in row]
-                    if len(parts) >= 4 and parts[2].strip() and parts[3].strip().isdigit():
-                        campus_id = parts[2].strip()
-                        ann = annotations.get(campus_id)
-                        if ann:
-                                # Ensure space for column M (index 12) and existing comment column (index 17)
-                                while len(parts) <= 17:
-                                    parts.append("")
-                                parts[12] = ann.get("code", "")  # column M
-                                parts[17] = ann.get("comment", "")
-                    writer.writerow(parts)
-                return out.getvalue().encode("utf-8")
-
-            if st.session_state.get("original_csv_text") and st.session_state.get("original_csv_name"):
-                base_name = st.session_state.original_csv_name.rsplit(".", 1)[0]
-                file_name = f"{base_name}_annotated.csv"
-                data_bytes = _annotate_csv_text(st.session_state.original_csv_text, st.session_state.annotations)
-                st.download_button("Download annotated CSV", data=data_bytes, file_name=file_name, mime="text/csv")
-
-        # Removed user info + logout from sidebar
-            
-    if not students:
-        st.info("Upload a report CSV to begin browsing records.")
-        return
 
-    student = students[st.session_state.index]
-    insights = compute_student_insights(student)
-    prgm_code = student.get("prgm", "")
-    selected_req_code = None
-    # Prefer explicit plan codes if they exist in requirements
-    plan_candidates = []
-    if student.get("plan"):
-        plan_candidates.append(student["plan"].strip())
-    # Most common year-level plan for this student
-    from collections import Counter
-    plan_counter = Counter(y.get("plan") for y in student.get("years", []) if y.get("plan"))
-    if plan_counter:
-        plan_candidates.append(plan_counter.most_common(1)[0][0])
-    for cand in plan_candidates:
-        if cand and cand in requirements_index:
-            selected_req_code = cand
-            break
-
-    # Fallback: match by programme prefix (e.g., CB024*)
-    if not selected_req_code and prgm_code:
-        matching_req_codes = [code for code in requirements_index.keys() if code.startswith(prgm_code)]
-        if matching_req_codes:
-            if len(matching_req_codes) == 1:
-                selected_req_code = matching_req_codes[0]
-            else:
-                def _label(code: str):
-                    name = requirement_names.get(code, "")
-                    return f"{code} — {name}" if name else code
-                selected_req_code = st.selectbox(
-                    "Select programme requirements mapping",
-                    options=matching_req_codes,
-                    format_func=_label,
-                    key=f"req_select_{student.get('campus_id','')}",
+def mark_annotated(campus_ids) -> bool:
+    """Tell the session's triage that these students' annotations changed; True if any became (un)reviewed."""
+    held = st.session_state.get("triage")
+    if held is None:
+        return False
+    annotations = st.session_state.get("annotations", {})
+    changed = False
+    for campus_id in campus_ids:
+        ann = annotations.get(campus_id) or {}
+        changed |= held["triage"].set_annotated(campus_id, bool(ann.get("code") or ann.get("comment")))
+    return changed
+
+
+def _request_triage_order():
+    st.session_state.triage_reorder = True
+
+
+@st.fragment
+def render_triage(report, requirements: dict):
+    with fragment_profiling("triage"):
+        if report.course_index is None:
+            return
+        on = st.toggle("Triage mode", key="triage_mode", on_change=_request_triage_order,
+                       help="Order students by risk and jump to the most urgent unannotated one.")
+        reorder = st.session_state.pop("triage_reorder", False)
+        if not on:
+            if reorder and st.session_state.get("nav_label") == TRIAGE_LABEL:
+                set_navigation_order(None)
+                st.rerun()
+            return
+        triage = session_triage(report, requirements)
+        with st.expander("Risk weights"):
+            weights = {
+                name: st.number_input(name.replace("_", " ").capitalize(), min_value=0.0, step=0.25,
+                                      value=float(RISK_WEIGHTS[name]), key=f"risk_weight_{name}")
+                for name in RISK_FEATURES
+            }
+        if weights != triage.weights:
+            with profiling.phase("triage"):
+                triage.set_weights(weights)
+            reorder = True
+        if reorder:
+            with profiling.phase("triage"):
+                set_navigation_order(triage.ranked(), TRIAGE_LABEL)
+            st.rerun()
+
+        index = st.session_state.index
+        st.caption(f"Risk score {triage.queue.score(index):.2f} · {triage.queue.unreviewed} of {len(report.students)} not yet annotated")
+        nxt = triage.next_urgent(skip=index)
+        if st.button("Next most urgent", disabled=nxt is None):
+            st.session_state.index = nxt
+            st.rerun()
+
+
+@st.fragment
+def render_annotation_panel(students: list[dict], report, partial_report: bool = False):
+    with fragment_profiling("annotation"):
+        st.subheader("Annotate")
+        current_student_number = students[st.session_state.index].get("campus_id", "")
+        code_key = f"code_{current_student_number}"
+        comment_key = f"comment_{current_student_number}"
+        radio_key = f"radio_{current_student_number}"
+        curr_student = students[st.session_state.index]
+        existing_code = curr_student.get("annotation_code", "")
+        existing_comment = curr_student.get("annotation_comment", "")
+
+        # Initialize if not present
+        if code_key not in st.session_state:
+            st.session_state[code_key] = existing_code or st.session_state.annotations.get(current_student_number, {}).get("code", "")
+        if comment_key not in st.session_state:
+            st.session_state[comment_key] = existing_comment or st.session_state.annotations.get(current_student_number, {}).get("comment", "")
+
+        # Check if radio was previously set and apply before creating widgets
+        if radio_key in st.session_state and st.session_state[radio_key]:
+            st.session_state[code_key] = st.session_state[radio_key]
+
+        st.text_input("Coding", key=code_key, label_visibility="visible")
+        st.markdown("<style>.stRadio > label {margin-top: -1rem;}</style>", unsafe_allow_html=True)
+        st.radio("", options=["CONT", "QUAL", "SUPP", "FECP", "FECR", "FECF"], key=radio_key, horizontal=True, index=None)
+        st.text_area("Comment", key=comment_key, height=120)
+
+        code = st.session_state.get(code_key, "")
+        comment = st.session_state.get(comment_key, "")
+        current = st.session_state.annotations.get(current_student_number) or {"code": existing_code, "comment": existing_comment}
+        if code != current.get("code", "") or comment != current.get("comment", ""):
+            # Only edits are recorded, so the sidecar holds just this session's work
+            st.session_state.annotations[current_student_number] = annotation(code, comment, annotation_author())
+            if mark_annotated([current_student_number]) and st.session_state.get("triage_mode"):
+                # The triage caption and queue live in another fragment
+                st.rerun(scope="app")
+
+        if report is not None and report.source is not None:
+            # Named after the report the data comes from, not an upload still parsing
+            base_name = report.source.name.rsplit(".", 1)[0]
+            # Both files are built only when clicked, not on every keystroke
+            st.download_button(
+                "Download annotated CSV",
+                data=partial(annotated_csv, report.source, dict(st.session_state.annotations)),
+                file_name=f"{base_name}_annotated.csv",
+                mime="text/csv",
+            )
+            edited = sum(1 for ann in st.session_state.annotations.values() if ann.get("timestamp"))
+            st.download_button(
+                f"Download annotations only ({edited} edited)",
+                data=partial(write_sidecar, dict(st.session_state.annotations)),
+                file_name=f"{base_name}{SIDECAR_SUFFIX}",
+                mime="text/csv",
+                disabled=not edited,
+            )
+            if not partial_report:
+                st.download_button(
+                    "Download Parquet tables",
+                    data=partial(export_report_tables, students, dict(st.session_state.annotations)),
+                    file_name=f"{base_name}_tables.zip",
+                    mime="application/zip",
                 )
 
-    if selected_req_code:
-        readable = requirement_names.get(selected_req_code) or selected_req_code
-        st.caption(f"Using programme requirements: {readable}")
-    elif prgm_code:
-        st.caption("No handbook programme requirements matched this programme/plan.")
+        st.file_uploader(
+            "Import annotations",
+            type=["csv"],
+            key="annotation_sidecar",
+            on_change=_import_annotation_sidecar,
+            help="An annotations file downloaded earlier, from this or any other version of the report.",
+        )
+        message = st.session_state.pop("sidecar_message", None)
+        if message:
+            getattr(st, message[0])(message[1])
+
+
+def render_student_header(student: dict, model: dict, trajectory: dict | None = None):
     left, right_main = st.columns([2, 2])
     with left:
         st.subheader(student["name"])  # e.g. "Sables, Dylan Victor Mr"
@@ -742,287 +790,243 @@ def main():
 
         with insights_col:
             st.subheader("Progress Insights")
-            prog_changes = insights.get("program_changes", 0)
-            change_list = insights.get("program_change_list", [])
-            prog_text = "N/A"
-            if change_list:
-                cleaned = [p for p in change_list if p]
-                prog_text = f"x{prog_changes} (" + ", ".join(cleaned) + ")" if prog_changes else cleaned[0]
-            st.write(f"Programme changes: {prog_text}")
-
-            repeated = insights.get("repeated_fails", [])
-            rep_text = "; ".join(repeated) if repeated else "None"
-            st.write(f"Repeated failed courses: {rep_text}")
-
-            actual_year = insights.get("actual_year") or "N/A"
-            st.write(f"Actual year of study: {actual_year}")
-
-            weakest = insights.get("weakest_year")
-            if weakest:
-                y, passed, attempted, rate = weakest
-                st.write(f"Weakest year: {y} ({passed}/{attempted} passed)")
-            else:
-                st.write("Weakest year: N/A")
+            for line in insight_lines(model["insights"]):
+                st.write(line)
+            if trajectory is not None:
+                for line in trajectory_lines(trajectory):
+                    st.write(line)
+                if len(trajectory["gpa_series"]) > 1:
+                    st.line_chart(pd.DataFrame({"Term GPA": trajectory["gpa_series"]}), height=90)
 
         with summary_col:
             st.subheader("Summary")
             summary = student.get("summary", {})
             if summary:
-                label_map = {
-                    "total_passed": "Passed",
-                    "units_earned": "Units Earned",
-                    "senior_passed": "Senior Passed",
-                    "junior_passed": "Junior Passed",
-                    "latest_term_attempted": "Latest Term: Attempted",
-                    "latest_term_passed": "Latest Term: Passed",
-                }
-                rows = [{"Metric": label_map.get(k, k), "Value": v} for k, v in summary.items()]
+                rows = summary_rows(summary)
                 if rows:
                     df_sum = pd.DataFrame(rows)
                     st.dataframe(df_sum, hide_index=True, width='stretch')
             else:
                 st.caption("No summary available.")
 
-    # Years and courses (tabs with most recent first)
-    years = student.get("years", [])
-    if years:
-        years_sorted = sorted(years, key=lambda y: y.get("year", 0), reverse=True)
-
-        # Group terms by academic level
-        level_groups = []  # list of (label, [years]) preserving order
-        level_map = {}
-        for yr in years_sorted:
-            level_label = _normalize_acad_level(yr.get("acad_level")) or yr.get("acad_level") or f"Year {yr.get('year','')}"
-            if level_label not in level_map:
-                level_map[level_label] = []
-                level_groups.append((level_label, level_map[level_label]))
-            level_map[level_label].append(yr)
 
+@st.fragment
+def render_level_tables(student: dict, model: dict):
+    with fragment_profiling("level_tables"):
+        level_groups = model["level_groups"]
         labels = [lbl for lbl, _ in level_groups]
         outstanding_label = None
-        has_requirements = bool(selected_req_code and requirements_index.get(selected_req_code, {}))
-        if has_requirements:
+        prog_reqs = model["prog_reqs"]
+        if prog_reqs:
             outstanding_label = "Outstanding"
             labels.append(outstanding_label)
 
-        tabs = st.tabs(labels)
-        main_tabs = tabs if outstanding_label is None else tabs[:-1]
-        outstanding_tab = None if outstanding_label is None else tabs[-1]
-
-        for tab, (level_label, level_years) in zip(main_tabs, level_groups):
-            with tab:
-                st.markdown(f"**{level_label}**")
-                meta_bits = []
-                # Show distinct standing/specialisation/degree/program across the level
-                standings = {y.get("standing") for y in level_years if y.get("standing")}
-                specs = {y.get("specialization") for y in level_years if y.get("specialization") and " - " not in y.get("program", "")}
-                degrees = {y.get("degree") for y in level_years if y.get("degree")}
-                progs = {y.get("program") for y in level_years if y.get("program")}
-                if standings:
-                    meta_bits.append(f"Standing: {', '.join(sorted(standings))}")
-                if specs:
-                    meta_bits.append(f"Specialisation: {', '.join(sorted(specs))}")
-                if degrees:
-                    meta_bits.append(f"Degree: {', '.join(sorted(degrees))}")
-                if progs:
-                    meta_bits.append(f"Program: {', '.join(sorted(progs))}")
-                if meta_bits:
-                    st.caption(" | ".join(meta_bits))
-
-                # Collect metrics across level (latest first)
-                metrics = []
-                latest_year = level_years[0]
-                for label, key in [("JT", "jt"), ("JE", "je"), ("ST", "st"), ("SE", "se"), ("TT", "tt"), ("TE", "te"), ("CE", "ce"), ("Wghtd GPA", "wghtd_gpa"), ("Term GPA", "term_gpa"), ("Cum GPA", "cum_gpa")]:
-                    val = latest_year.get(key)
-                    if val:
-                        metrics.append((label, val))
-                if metrics:
-                    metrics_text = " | ".join([f"**{label}:** {value}" for label, value in metrics])
-                    st.markdown(metrics_text)
-
-                prog_reqs = requirements_index.get(selected_req_code, {}) if selected_req_code else {}
-                level_reqs = prog_reqs.get(level_label, []) if prog_reqs else []
-                # Programme-wide required sets (across all years in the selected plan)
-                prog_req_main = set()
-                prog_req_alt = set()
-                for _yl, _reqs in (prog_reqs or {}).items():
-                    for _r in _reqs:
-                        mc = _clean_code(_r.get("course_code"))
-                        ac = _clean_code(_r.get("alternative_course"))
-                        if mc:
-                            prog_req_main.add(mc)
-                        if ac:
-                            prog_req_alt.add(ac)
-
-                combined_rows = []
-                # Passed anywhere across the student's record (for requirement satisfaction)
-                passed_codes_all = {
-                    _clean_code(c.get("code"))
-                    for yy in student.get("years", [])
-                    for c in yy.get("courses", [])
-                    if _clean_code(c.get("code")) and not _is_fail_course(c)
-                }
-                taken_codes = {
-                    _clean_code(c.get("code"))
-                    for yr in level_years
-                    for c in yr.get("courses", [])
-                    if _clean_code(c.get("code"))
-                }
-
-                # Required sets for this level
-                req_main = {r.get("course_code") for r in level_reqs if r.get("course_code")}
-                req_alt = {r.get("alternative_course") for r in level_reqs if r.get("alternative_course")}
-
-                # Add attempted courses across all terms in this level
-                for yr in level_years:
-                    term_code = yr.get("term", "")
-                    for c in yr.get("courses", []):
-                        code = _clean_code(c.get("code")) or ""
-                        is_required = code in prog_req_main or code in prog_req_alt
-                        passed_anywhere = code in passed_codes_all
-                        if is_required:
-                            status = "Completed" if passed_anywhere else "Outstanding"
-                        else:
-                            status = "Not Required"
-                        combined_rows.append({
-                            "Year": yr.get("year", ""),
-                            "Sem": term_code,
-                            "Course": code,
-                            "%/Grade": c.get("result", ""),
-                            "Symbol": c.get("symbol", ""),
-                            "Units Attempted": c.get("units_attempted", ""),
-                            "Course Name": c.get("title", ""),
-                            "Status": status,
-                        })
-
-                # Add outstanding requirements (not attempted or not passed anywhere)
-                if level_reqs:
-                    for req in level_reqs:
-                        course_code = _clean_code(req.get("course_code"))
-                        alt_course = _clean_code(req.get("alternative_course"))
-                        display = course_code if not alt_course else f"{course_code} (alt: {alt_course})"
-                        satisfied = (course_code in passed_codes_all) or (alt_course and alt_course in passed_codes_all)
-                        if satisfied:
-                            continue
-                        combined_rows.append({
-                            "Year": "",
-                            "Sem": "",
-                            "Course": display,
-                            "%/Grade": "",
-                            "Symbol": "",
-                            "Units Attempted": "",
-                            "Course Name": "",
-                            "Status": "Outstanding",
-                        })
-                elif prog_reqs:
-                    st.caption("No mapped programme requirements for this academic level.")
-
-                if combined_rows:
-                    df = pd.DataFrame(combined_rows)
-
-                    def _highlight_fail(row):
-                        sym = str(row.get('Symbol', ''))
-                        if 'F' in sym:
-                            return ['background-color: #ffe5e5; color: #8b0000'] * len(row)
-                        return [''] * len(row)
-
-                    try:
-                        styled = df.style.apply(_highlight_fail, axis=1)
-                        st.dataframe(styled, hide_index=True, width='stretch')
-                    except Exception:
-                        st.dataframe(df, hide_index=True, width='stretch')
-                else:
-                    st.info("No courses listed for this level.")
-
-        if outstanding_tab is not None:
-            with outstanding_tab:
-                st.subheader("Outstanding courses (programme-wide)")
-                prog_reqs = requirements_index.get(selected_req_code, {}) if selected_req_code else {}
-                taken_all = {
-                    _clean_code(c.get("code"))
-                    for yr in years_sorted
-                    for c in yr.get("courses", [])
-                    if _clean_code(c.get("code"))
-                }
-                passed_all = {
-                    _clean_code(c.get("code"))
-                    for yr in years_sorted
-                    for c in yr.get("courses", [])
-                    if _clean_code(c.get("code")) and not _is_fail_course(c)
-                }
-                # Build pass details per course for sorting (recency and grade)
-                term_order = {"R": 1, "W": 2, "S": 3}
-                passed_details: dict[str, list[dict]] = {}
-                for yr in years_sorted:
-                    yv = yr.get("year")
-                    tv = (yr.get("term") or "").strip().upper()[:1]
-                    t_ord = term_order.get(tv, 0)
-                    for c in yr.get("courses", []):
-                        code = _clean_code(c.get("code"))
-                        if not code or _is_fail_course(c):
-                            continue
-                        res = c.get("result", "")
-                        try:
-                            grade = float(res) if str(res).strip() != "" else None
-                        except Exception:
-                            grade = None
-                        passed_details.setdefault(code, []).append({
-                            "year": int(yv) if isinstance(yv, (int, float)) else yv,
-                            "term_order": t_ord,
-                            "grade": grade,
-                        })
-
-                sort_mode = st.radio(
-                    "Similar sort by",
-                    options=["Most recent", "Highest grade"],
-                    horizontal=True,
-                    key=f"similar_sort_mode_{student.get('campus_id','')}",
-                )
-                outstanding_rows = []
-                for year_label, reqs in prog_reqs.items():
-                    for req in reqs:
-                        course_code = _clean_code(req.get("course_code"))
-                        alt_course = _clean_code(req.get("alternative_course"))
-                        completed = course_code in taken_all or (alt_course and alt_course in taken_all)
-                        if completed:
-                            continue
-                        display = course_code if not alt_course else f"{course_code} (alt: {alt_course})"
-                        # Similar courses: same subject and year level passed anywhere (e.g., ECO3xxx for ECO3020F)
-                        base_code = course_code or alt_course or ""
-                        similar_list = []
-                        if base_code:
-                            m = re.match(r"^([A-Z]+)(\d)", base_code)
-                            if m:
-                                subj = m.group(1)
-                                year_level = m.group(2)
-                                prefix = subj + year_level
-                                # candidates: same subject + year level
-                                candidates = [c for c in passed_all if c and c.startswith(prefix)]
-                                def most_recent_key(code: str):
-                                    dets = passed_details.get(code, [])
-                                    if not dets:
-                                        return (-1, -1)
-                                    latest = max(dets, key=lambda d: (d.get("year") or -1, d.get("term_order") or -1))
-                                    return (latest.get("year") or -1, latest.get("term_order") or -1)
-                                def best_grade_key(code: str):
-                                    dets = passed_details.get(code, [])
-                                    if not dets:
-                                        return -1.0
-                                    grades = [d.get("grade") for d in dets if d.get("grade") is not None]
-                                    return max(grades) if grades else -1.0
-                                if sort_mode == "Most recent":
-                                    similar_list = sorted(candidates, key=lambda c: (most_recent_key(c)[0], most_recent_key(c)[1], best_grade_key(c)), reverse=True)
-                                else:
-                                    similar_list = sorted(candidates, key=lambda c: (best_grade_key(c), most_recent_key(c)[0], most_recent_key(c)[1]), reverse=True)
-                        similar_str = ", ".join(similar_list)
-                        outstanding_rows.append({
-                            "Year": year_label or "",
-                            "Required Course": display,
-                            "Similar courses completed": similar_str,
-                        })
-                if outstanding_rows:
-                    st.dataframe(pd.DataFrame(outstanding_rows), hide_index=True, width='stretch')
-                else:
-                    st.success("All mapped programme requirements are completed.")
+        # Only the selected level is materialized; st.tabs would build every table on each rerun
+        active = st.radio(
+            "Academic level",
+            options=labels,
+            horizontal=True,
+            key=f"level_view_{student.get('campus_id','')}",
+            label_visibility="collapsed",
+        )
+
+        if active == outstanding_label:
+            render_outstanding(student, model)
+            return
+        level_years = dict(level_groups)[active]
+        st.markdown(f"**{active}**")
+        caption = level_caption(level_years)
+        if caption:
+            st.caption(caption)
+
+        # Metrics from the latest term in the level
+        metrics = level_metrics(level_years[0])
+        if metrics:
+            st.markdown(" | ".join([f"**{label}:** {value}" for label, value in metrics]))
+
+        level_reqs = prog_reqs.get(active, [])
+        if prog_reqs and not level_reqs:
+            st.caption("No mapped programme requirements for this academic level.")
+        cols = model["levels"][active]
+        if cols["Course"]:
+            with profiling.phase("table_styling"):
+                df = level_table_frame(cols)
+                st.dataframe(style_fail_rows(df), hide_index=True, width='stretch')
+        else:
+            st.info("No courses listed for this level.")
+
+
+@st.fragment
+def render_outstanding(student: dict, model: dict):
+    with fragment_profiling("outstanding"):
+        st.subheader("Outstanding courses (programme-wide)")
+        sort_mode = st.radio(
+            "Similar sort by",
+            options=["Most recent", "Highest grade"],
+            horizontal=True,
+            key=f"similar_sort_mode_{student.get('campus_id','')}",
+        )
+        rows = model["outstanding"].get(sort_mode)
+        if rows is None:
+            with profiling.phase("requirement_matching"):
+                rows = model["outstanding"][sort_mode] = outstanding_rows(model["prog_reqs"], model["years_sorted"], sort_mode)
+        if rows:
+            st.dataframe(pd.DataFrame(rows), hide_index=True, width='stretch')
+        else:
+            st.success("All mapped programme requirements are completed.")
+
+
+def main():
+    st.set_page_config(page_title=PAGE_TITLE, layout="wide")
+    prof = profiling.Profiler(enabled=profiling_requested())
+    with profiling.activated(prof):
+        with prof.phase("total"):
+            render_page()
+        if prof.enabled:
+            session_bytes = session_memory_estimate()
+            render_profiling_panel(prof, session_bytes)
+            profiling.log_run(prof, session_bytes=session_bytes, file_hash=st.session_state.get("file_hash"))
+
+
+def render_page():
+    try:
+        auth = import_module("auth")
+    except Exception as e:
+        st.error("Failed to load authentication module. Ensure dependencies are installed on Streamlit Cloud (see requirements.txt).")
+        st.exception(e)
+        st.stop()
+
+    # Show login page if not authenticated
+    
+    #if not auth.is_authenticated():
+    #    with st.sidebar:
+    #        st.title("Log in with Google to continue")
+    #        if st.button("Authentication"):
+    #            st.login("google")
+    #            st.write(st.user)
+    #            #st.rerun()
+    #st.success("✅ You are logged in.")
+
+    
+    # Main app (only shown when authenticated)
+    st.title(PAGE_TITLE)
+
+    profiling.count("cache.requirements.calls")
+    with profiling.phase("load_programme_requirements"):
+        requirements = programme_requirements(REQUIREMENTS_CSV).get()
+    requirements_index, requirement_names = requirements["index"], requirements["names"]
+    notify_requirements_reload(requirements)
+
+    api_port = os.environ.get("RECORDSORTER_API_PORT")
+    if api_port:
+        # Other tools read uploaded reports from here by content hash
+        report_api(int(api_port))
+
+    # File upload and state management; the parsed report itself is shared across sessions
+    if "index" not in st.session_state:
+        st.session_state.index = 0
+    uploaded = st.sidebar.file_uploader("Upload report (CSV, .csv.gz, .bz2 or .zip)", type=REPORT_UPLOAD_TYPES, accept_multiple_files=False)
+    sources = report_sources(uploaded.name, uploaded.getvalue()) if uploaded is not None else []
+    if uploaded is not None and not sources:
+        st.sidebar.error("No CSV reports found in this archive.")
+    if sources:
+        source = choose_source(sources, "upload_member")
+        if st.session_state.get("file_hash") != source.key:
+            previous = st.session_state.get("report")
+            if previous is not None and previous.students:
+                st.session_state.resume_campus_id = previous.students[min(st.session_state.index, len(previous.students) - 1)].get("campus_id")
+            # Search results refer to positions in the previous report
+            set_navigation_order(None)
+            # Triage mode re-ranks the new report once it has parsed
+            st.session_state.triage_reorder = True
+            with profiling.phase("parse"):
+                start_report_parse(source, previous)
+            st.session_state.file_hash = source.key
+            if "annotations" not in st.session_state:
+                st.session_state.annotations = {}
+
+    parsing = poll_report_parse()
+    report = st.session_state.get("report")
+    if parsing is not None:
+        with st.sidebar:
+            render_parse_progress(parsing)
+        if report is None:
+            # Browse the students parsed so far
+            report = parsing
+    students = report.students if report is not None else []
+    if report is not None and report is not parsing:
+        render_parse_diagnostics(report.diagnostics)
+    view = st.sidebar.radio("View", options=["Student records", "Cohort analytics", "Snapshot changes"], horizontal=True)
+    if view != "Student records":
+        if not students:
+            st.info("Upload a report CSV to begin.")
+        elif report is parsing:
+            st.info("Cohort views are available once the report has finished parsing.")
+        elif view == "Cohort analytics":
+            render_cohort_analytics(students, report.key)
+        else:
+            render_snapshot_changes(students, report.key, report.source.name if report.source is not None else "current")
+        return
+
+    # Keep slider position in sync with index (1-based rank in the navigation order)
+    expected_pos = (navigation_rank(navigation_order(students), st.session_state.index) + 1) if students else 1
+    if st.session_state.get("position") != expected_pos:
+        st.session_state.position = expected_pos
+    # The student the rest of the page shows; navigation reruns the page when it moves
+    st.session_state.rendered_index = st.session_state.index
+
+    with st.sidebar:
+        if students:
+            render_course_search(report, requirements)
+            render_triage(report, requirements)
+        render_navigation(students)
+        if students:
+            render_annotation_panel(students, report, partial_report=report is parsing)
+
+    if not students:
+        st.info("Upload a report CSV to begin browsing records.")
+        return
+
+    student = students[st.session_state.index]
+    with profiling.phase("view_model"):
+        model = student_view_model(report, st.session_state.index, requirements_index)
+    # Build the next/previous students' models while this page renders
+    prefetch_neighbours(report, st.session_state.index, requirements_index)
+    prgm_code = student.get("prgm", "")
+    selected_req_code = None
+    matching_req_codes = model["candidates"]
+    if len(matching_req_codes) == 1:
+        selected_req_code = matching_req_codes[0]
+    elif matching_req_codes:
+        def _label(code: str):
+            name = requirement_names.get(code, "")
+            return f"{code} — {name}" if name else code
+        selected_req_code = st.selectbox(
+            "Select programme requirements mapping",
+            options=matching_req_codes,
+            format_func=_label,
+            key=f"req_select_{student.get('campus_id','')}",
+        )
+
+    if selected_req_code != model["req_code"]:
+        with profiling.phase("view_model"):
+            model = student_view_model(report, st.session_state.index, requirements_index, selected_req_code)
+
+    if selected_req_code:
+        readable = requirement_names.get(selected_req_code) or selected_req_code
+        st.caption(f"Using programme requirements: {readable}")
+    elif prgm_code:
+        st.caption("No handbook programme requirements matched this programme/plan.")
+    trajectory = None
+    if report is not parsing:
+        # Programme norms need the whole cohort, so wait until it has parsed
+        trajectories = report_trajectories(students, report.key)
+        if has_trajectory_data(trajectories):
+            trajectory = trajectories.iloc[st.session_state.index].to_dict()
+    render_student_header(student, model, trajectory)
+
+    # Years and courses (level selector with most recent first)
+    if student.get("years", []):
+        render_level_tables(student, model)
 
 main()
@@ -1,20 +1,121 @@
 import os
+import re
+import threading
+import time
+import requests
 import streamlit as st
+from authlib.common.security import generate_token
 from authlib.integrations.requests_client import OAuth2Session
+from authlib.jose import JsonWebKey, JsonWebToken
+from authlib.oidc.core import CodeIDToken
 
 SCOPES = ['openid', 'email', 'profile']
 
-def get_google_oauth_config():
-    """Get Google OAuth configuration from secrets or environment."""
+# Google OpenID Connect endpoints. Any of them can be overridden under
+# [google_oauth]; setting `issuer` to another provider (e.g. a local OIDC
+# stand-in) reads the rest from its discovery document.
+GOOGLE_ENDPOINTS = {
+    "issuer": "https://accounts.google.com",
+    "authorization_endpoint": "https://accounts.google.com/o/oauth2/v2/auth",
+    "token_endpoint": "https://oauth2.googleapis.com/token",
+    "userinfo_endpoint": "https://openidconnect.googleapis.com/v1/userinfo",
+    "jwks_uri": "https://www.googleapis.com/oauth2/v3/certs",
+}
+# Google signs ID tokens with either form of its issuer
+GOOGLE_ISSUERS = ["https://accounts.google.com", "accounts.google.com"]
+
+CONFIG_TTL_S = 300
+HTTP_TIMEOUT_S = 10
+JWKS_DEFAULT_MAX_AGE_S = 3600
+# Unknown key IDs trigger a JWKS refresh at most this often
+JWKS_MIN_REFRESH_S = 60
+ID_TOKEN_LEEWAY_S = 60
+# How long a sign-in started with the button can be completed
+LOGIN_TTL_S = 600
+
+id_token_jwt = JsonWebToken(["RS256", "ES256"])
+
+class AuthorizedUsers:
+    """Authorized emails and domains, checked with set lookups.
+
+    Entries are exact emails, ``@domain`` or ``*@domain`` for everyone in a
+    domain, or ``*@*.domain`` for a domain and all of its subdomains.
+    Matching is case-insensitive.
+    """
+
+    def __init__(self, entries=()):
+        self.emails = set()
+        self.domains = set()
+        self.domain_suffixes = set()
+        for raw in entries or ():
+            entry = str(raw).strip().lower()
+            if not entry:
+                continue
+            local, sep, domain = entry.rpartition("@")
+            if sep and local in ("", "*"):
+                if domain.startswith("*."):
+                    self.domain_suffixes.add(domain[2:])
+                else:
+                    self.domains.add(domain)
+            else:
+                self.emails.add(entry)
+
+    def __bool__(self):
+        return bool(self.emails or self.domains or self.domain_suffixes)
+
+    def __contains__(self, email):
+        email = (email or "").strip().lower()
+        local, sep, domain = email.rpartition("@")
+        if not sep or not local or not domain:
+            return False
+        if email in self.emails or domain in self.domains:
+            return True
+        labels = domain.split(".")
+        return any(".".join(labels[i:]) in self.domain_suffixes for i in range(len(labels)))
+
+@st.cache_resource(show_spinner=False)
+def http_session():
+    """Shared HTTP session so discovery, JWKS and userinfo calls reuse connections."""
+    return requests.Session()
+
+def resolve_endpoints(cfg):
+    """OIDC endpoints: Google's, or discovered from a configured issuer, then explicit overrides."""
+    endpoints = dict(GOOGLE_ENDPOINTS)
+    issuer = (cfg.get("issuer") or "").rstrip("/")
+    if issuer and issuer != GOOGLE_ENDPOINTS["issuer"]:
+        resp = http_session().get(f"{issuer}/.well-known/openid-configuration", timeout=HTTP_TIMEOUT_S)
+        resp.raise_for_status()
+        discovered = resp.json()
+        endpoints = {key: discovered.get(key) for key in GOOGLE_ENDPOINTS}
+    endpoints.update({key: cfg[key] for key in GOOGLE_ENDPOINTS if cfg.get(key)})
+    return endpoints
+
+@st.cache_resource(ttl=CONFIG_TTL_S, show_spinner=False)
+def load_oauth_settings():
+    """Parsed [google_oauth] settings, re-read from secrets at most every CONFIG_TTL_S seconds."""
+    cfg = dict(st.secrets.get("google_oauth", {}))
+    endpoints = resolve_endpoints(cfg)
+    authorized_users = list(cfg.get("authorized_users", []))
+    return {
+        "client_id": cfg["client_id"],
+        "client_secret": cfg["client_secret"],
+        "authorized_users": authorized_users,
+        "authorized": AuthorizedUsers(authorized_users),
+        "endpoints": endpoints,
+        "issuers": GOOGLE_ISSUERS if endpoints["issuer"] == GOOGLE_ENDPOINTS["issuer"] else [endpoints["issuer"]],
+    }
+
+def get_oauth_settings():
     try:
-        cfg = st.secrets.get("google_oauth", {})
-        client_id = cfg["client_id"]
-        client_secret = cfg["client_secret"]
-        authorized_users = cfg.get("authorized_users", [])
+        return load_oauth_settings()
     except Exception:
         st.error("Google OAuth credentials not configured. Please set up .streamlit/secrets.toml")
         st.stop()
-    return client_id, client_secret, authorized_users
+
+def get_google_oauth_config():
+    """Get Google OAuth configuration from secrets or environment."""
+    settings = get_oauth_settings()
+    return settings["client_id"], settings["client_secret"], settings["authorized_users"]
 
 def get_redirect_uri():
     """Get the redirect URI based on environment."""
@@ -40,31 +141,146 @@ def get_redirect_uri():
     # Default
     return "http://localhost:8501"
 
-def create_oauth_session():
-    """Create Authlib OAuth2 session for Google."""
-    client_id, client_secret, _ = get_google_oauth_config()
-    redirect_uri = get_redirect_uri()
+def oauth_client(client_id, client_secret, redirect_uri):
+    """A new OAuth client for one sign-in step.
+
+    Authlib keeps the fetched token on the client, so clients are never
+    shared between sessions; only the connection pool of http_session() is.
+    """
     client = OAuth2Session(
         client_id=client_id,
         client_secret=client_secret,
         scope=" ".join(SCOPES),
         redirect_uri=redirect_uri,
+        code_challenge_method="S256",
+    )
+    for prefix, adapter in http_session().adapters.items():
+        client.mount(prefix, adapter)
+    return client
+
+def create_oauth_session():
+    """A per-call Authlib OAuth2 client and the provider's endpoints."""
+    settings = get_oauth_settings()
+    client = oauth_client(settings["client_id"], settings["client_secret"], get_redirect_uri())
+    endpoints = settings["endpoints"]
+    return client, endpoints["authorization_endpoint"], endpoints["token_endpoint"], endpoints["userinfo_endpoint"]
+
+class PendingLogins:
+    """PKCE verifier and nonce of each sign-in in progress, by OAuth state.
+
+    Kept outside session state so a callback that lands in a new session
+    (another tab or host name) can still complete; each entry is used once.
+    """
+
+    def __init__(self, ttl_s=LOGIN_TTL_S):
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._logins = {}
+
+    def add(self, state, code_verifier, nonce):
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, (_, _, expires) in self._logins.items() if expires <= now]:
+                del self._logins[key]
+            self._logins[state] = (code_verifier, nonce, now + self.ttl_s)
+
+    def pop(self, state):
+        """``(code_verifier, nonce)`` for ``state``, or None if it is unknown or expired."""
+        with self._lock:
+            login = self._logins.pop(state, None)
+        if login is None or login[2] <= time.monotonic():
+            return None
+        return login[0], login[1]
+
+@st.cache_resource(show_spinner=False)
+def pending_logins():
+    return PendingLogins()
+
+def _max_age(cache_control):
+    m = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(m.group(1)) if m else JWKS_DEFAULT_MAX_AGE_S
+
+class JWKSCache:
+    """Provider signing keys, refetched when they expire or an unknown key ID appears."""
+
+    def __init__(self, uri, session, min_refresh_s=JWKS_MIN_REFRESH_S):
+        self.uri = uri
+        self.session = session
+        self.min_refresh_s = min_refresh_s
+        self._lock = threading.Lock()
+        self._keys = None
+        self._fetched_at = 0.0
+        self._expires_at = 0.0
+        self.fetches = 0
+
+    def _fetch(self):
+        resp = self.session.get(self.uri, timeout=HTTP_TIMEOUT_S)
+        resp.raise_for_status()
+        self._keys = JsonWebKey.import_key_set(resp.json())
+        self._fetched_at = time.monotonic()
+        # Honour the provider's Cache-Control so rotated keys are picked up
+        self._expires_at = self._fetched_at + _max_age(resp.headers.get("Cache-Control"))
+        self.fetches += 1
+
+    def _find(self, kid):
+        if kid is None and len(self._keys.keys) == 1:
+            return self._keys.keys[0]
+        try:
+            return self._keys.find_by_kid(kid)
+        except ValueError:
+            return None
+
+    def get_key(self, kid):
+        with self._lock:
+            if self._keys is None or time.monotonic() >= self._expires_at:
+                self._fetch()
+            key = self._find(kid)
+            if key is None and time.monotonic() - self._fetched_at >= self.min_refresh_s:
+                # Keys were rotated since the last fetch
+                self._fetch()
+                key = self._find(kid)
+        if key is None:
+            raise ValueError(f"No signing key with kid {kid!r} at {self.uri}")
+        return key
+
+@st.cache_resource(show_spinner=False)
+def jwks_cache(uri):
+    return JWKSCache(uri, http_session())
+
+def validate_id_token(id_token, settings, nonce=None, access_token=None):
+    """Verify an ID token's signature and claims locally; returns the claims."""
+    keys = jwks_cache(settings["endpoints"]["jwks_uri"])
+    claims = id_token_jwt.decode(
+        id_token,
+        lambda header, payload: keys.get_key(header.get("kid")),
+        claims_cls=CodeIDToken,
+        claims_options={
+            "iss": {"essential": True, "values": settings["issuers"]},
+            "aud": {"essential": True, "values": [settings["client_id"]]},
+        },
+        claims_params={"nonce": nonce, "client_id": settings["client_id"], "access_token": access_token},
+    )
+    claims.validate(leeway=ID_TOKEN_LEEWAY_S)
+    return dict(claims)
+
+def fetch_userinfo(userinfo_endpoint, access_token):
+    resp = http_session().get(
+        userinfo_endpoint,
+        headers={"Authorization": f"Bearer {access_token}"},
+        timeout=HTTP_TIMEOUT_S,
     )
-    # Google OpenID Connect endpoints
-    auth_endpoint = "https://accounts.google.com/o/oauth2/v2/auth"
-    token_endpoint = "https://oauth2.googleapis.com/token"
-    userinfo_endpoint = "https://openidconnect.googleapis.com/v1/userinfo"
-    return client, auth_endpoint, token_endpoint, userinfo_endpoint
+    resp.raise_for_status()
+    return resp.json() if resp.content else {}
 
 def is_user_authorized(email):
     """Check if user email is authorized."""
-    _, _, authorized_users = get_google_oauth_config()
-    
+    authorized = get_oauth_settings()["authorized"]
+
     # If no authorized users specified, allow all
-    if not authorized_users:
+    if not authorized:
         return True
-    
-    return email in authorized_users
+
+    return email in authorized
 
 def show_login_page():
     """Display login page."""
@@ -89,15 +305,18 @@ def show_login_page():
         
         if st.button("🔑 Sign in with Google", use_container_width=True, type="primary"):
             client, auth_endpoint, _, _ = create_oauth_session()
+            code_verifier = generate_token(48)
+            nonce = generate_token(24)
             authorization_url, state = client.create_authorization_url(
                 auth_endpoint,
-                code_challenge_method="S256",
+                code_verifier=code_verifier,
+                nonce=nonce,
                 prompt='select_account',
                 access_type='offline',
                 include_granted_scopes='true',
             )
             st.session_state.oauth_state = state
-            st.session_state.oauth_code_verifier = getattr(client, "code_verifier", None)
+            pending_logins().add(state, code_verifier, nonce)
             st.markdown(f'<meta http-equiv="refresh" content="0;url={authorization_url}">', unsafe_allow_html=True)
             st.markdown(f"[Click here if not redirected automatically]({authorization_url})")
 
@@ -114,34 +333,45 @@ def handle_oauth_callback():
     state = _first(query_params.get("state"))
 
     if code and state:
+        # Verify state; a session that lost its state (e.g. new browser tab/host)
+        # relies on the state being one this server issued
         expected_state = st.session_state.get("oauth_state")
-        # If session state was lost (e.g., new browser tab/host), accept this state once and persist it.
-        if not expected_state:
-            st.session_state.oauth_state = state
-            expected_state = state
-
-        # Verify state
-        if state != expected_state:
+        if expected_state and state != expected_state:
             st.error("Invalid state parameter. Please try logging in again.")
             return False
+        login = pending_logins().pop(state)
+        if login is None:
+            st.error("This sign-in has expired or was already used. Please sign in again.")
+            st.query_params.clear()
+            return False
+        code_verifier, nonce = login
         
         try:
             client, _, token_endpoint, userinfo_endpoint = create_oauth_session()
             token = client.fetch_token(
                 token_endpoint,
                 code=code,
-                code_verifier=st.session_state.get("oauth_code_verifier"),
+                code_verifier=code_verifier,
             )
 
-            # Fetch user info via OIDC userinfo endpoint
-            resp = client.get(userinfo_endpoint)
-            data = resp.json() if resp and resp.content else {}
+            # Identity comes from the ID token, verified locally against the cached JWKS
+            data = {}
+            if token.get("id_token"):
+                data = validate_id_token(
+                    token["id_token"],
+                    get_oauth_settings(),
+                    nonce=nonce,
+                    access_token=token.get("access_token"),
+                )
+            if not data.get("email"):
+                # Provider left the profile out of the ID token; fall back to userinfo
+                data = {**data, **fetch_userinfo(userinfo_endpoint, token["access_token"])}
             email = data.get('email')
             name = data.get('name') or data.get('given_name')
             picture = data.get('picture')
             
             # Check if user is authorized
-            if not is_user_authorized(email):
+            if data.get("email_verified") is False or not is_user_authorized(email):
                 st.error(f"Access denied. The email {email} is not authorized to use this application.")
                 if st.button("Try another account"):
                     logout()
@@ -0,0 +1,134 @@
+"""Throughput benchmark for the local JSON API (api.py).
+
+Starts the API on a free local port over one report (a file, or a
+synthetic report of ``--students`` students), then drives it from client
+threads with keep-alive connections. Each run reports requests per second
+and p50/p95 latency for a paginated walk of the student list, random
+student records, insights and outstanding requirements, and the same
+record requests revalidated with If-None-Match (304s).
+
+    python bench_api.py --students 5000 --clients 4 --requests 2000
+    python bench_api.py CB015.csv
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from urllib.parse import quote
+
+from api import ReportApi, load_report, load_report_file, start_background
+from synth_reports import report_text
+
+SCENARIOS = ("page", "student", "insights", "outstanding", "revalidate")
+
+
+def _client(port: int, paths: list[str], etags: dict, scenario: str, count: int, seed: int, out: list):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    latencies = []
+    statuses = {}
+    for i in range(count):
+        path = paths[i % len(paths)] if scenario == "page" else rng.choice(paths)
+        headers = {"If-None-Match": etags[path]} if scenario == "revalidate" else {}
+        start = time.perf_counter()
+        conn.request("GET", path, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        latencies.append(time.perf_counter() - start)
+        statuses[resp.status] = statuses.get(resp.status, 0) + 1
+    conn.close()
+    out.append((latencies, statuses))
+
+
+def run_scenario(port: int, paths: list[str], etags: dict, scenario: str, clients: int, requests: int) -> dict:
+    results = []
+    per_client = max(1, requests // clients)
+    threads = [
+        threading.Thread(target=_client, args=(port, paths, etags, scenario, per_client, seed, results))
+        for seed in range(clients)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies = sorted(x for lat, _ in results for x in lat)
+    statuses = {}
+    for _, st in results:
+        for code, n in st.items():
+            statuses[code] = statuses.get(code, 0) + n
+    return {
+        "scenario": scenario,
+        "requests": len(latencies),
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+        "statuses": statuses,
+    }
+
+
+def _get(port: int, path: str) -> tuple[dict, str]:
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.request("GET", path)
+    resp = conn.getresponse()
+    body = json.loads(resp.read())
+    conn.close()
+    return body, resp.getheader("ETag")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput of the local JSON API.")
+    parser.add_argument("report", nargs="?", help="Report file (default: a synthetic report)")
+    parser.add_argument("--students", type=int, default=5000, help="Size of the synthetic report")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    args = parser.parse_args(argv)
+
+    api = ReportApi()
+    if args.report:
+        handles = load_report_file(args.report, api.store)
+        label = os.path.basename(args.report)
+    else:
+        handles = load_report("synthetic.csv", report_text(args.students).encode("utf-8"), api.store)
+        label = f"synthetic ({args.students} students)"
+    handle = handles[0]
+    server = start_background(api, port=0)
+    port = server.server_address[1]
+
+    base = f"/reports/{quote(handle.key)}"
+    n = len(handle.students)
+    ids = [quote(s["campus_id"]) for s in handle.students if s.get("campus_id")]
+    page_paths = [f"{base}/students?offset={o}&limit={args.page_size}" for o in range(0, n, args.page_size)]
+    record_paths = [f"{base}/students/{c}" for c in ids]
+    paths = {
+        "page": page_paths,
+        "student": record_paths,
+        "insights": [p + "/insights" for p in record_paths],
+        "outstanding": [p + "/outstanding" for p in record_paths],
+        "revalidate": record_paths,
+    }
+    # Every record of a report shares the report's ETag
+    _, etag = _get(port, record_paths[0])
+    etags = dict.fromkeys(record_paths, etag)
+
+    if not args.json:
+        print(f"{label}: {n} students, {args.clients} clients, {args.requests} requests per scenario")
+        print(f"{'scenario':<12} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8}  statuses")
+    for scenario in SCENARIOS:
+        r = run_scenario(port, paths[scenario], etags, scenario, args.clients, args.requests)
+        if args.json:
+            print(json.dumps({"report": label, **r}))
+        else:
+            print(f"{r['scenario']:<12} {r['req_per_s']:>9} {r['p50_ms']:>8} {r['p95_ms']:>8}  {r['statuses']}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Memory benchmark for parsed reports.
+
+Compares the memory a parsed report holds with the parser's compact
+representation (interned strings, course titles in the shared catalogue)
+against the same students expanded into plain dicts with a string copy
+per row, which is what the parser used to build.
+
+    python bench_memory.py CB015.csv
+"""
+import argparse
+import gc
+import tracemalloc
+
+from records import COURSE_FIELDS, parse_report
+
+
+def _copy(value):
+    # A fresh string object, as csv.reader returns for every row
+    return value.encode("utf-8").decode("utf-8") if isinstance(value, str) else value
+
+
+def expanded(students: list[dict]) -> list[dict]:
+    """Plain-dict copy of ``students`` sharing no strings between rows."""
+    out = []
+    for s in students:
+        copy = {k: _copy(v) for k, v in s.items() if k not in ("years", "summary")}
+        if "summary" in s:
+            copy["summary"] = {k: _copy(v) for k, v in s["summary"].items()}
+        copy["years"] = [
+            {
+                **{k: _copy(v) for k, v in yr.items() if k != "courses"},
+                "courses": [{f: _copy(c[f]) for f in COURSE_FIELDS} for c in yr["courses"]],
+            }
+            for yr in s.get("years", [])
+        ]
+        out.append(copy)
+    return out
+
+
+def _retained(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def bench_file(path: str) -> dict:
+    students, compact = _retained(lambda: parse_report(path))
+    plain, plain_bytes = _retained(lambda: expanded(students))
+    courses = sum(len(yr["courses"]) for s in students for yr in s.get("years", []))
+    return {
+        "file": path,
+        "students": len(students),
+        "courses": courses,
+        "plain_mib": round(plain_bytes / 2**20, 2),
+        "compact_mib": round(compact / 2**20, 2),
+        "reduction_pct": round(100 * (1 - compact / plain_bytes), 1) if plain_bytes else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory held by a parsed report, compact vs plain dicts.")
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args(argv)
+
+    print(f"{'students':>9} {'courses':>8} {'plain MiB':>10} {'compact MiB':>12} {'saved':>6}  file")
+    for path in args.paths:
+        r = bench_file(path)
+        print(f"{r['students']:>9} {r['courses']:>8} {r['plain_mib']:>10} {r['compact_mib']:>12} {r['reduction_pct']:>5}%  {r['file']}")
+
+
+if __name__ == "__main__":
+    main()
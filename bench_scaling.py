@@ -0,0 +1,79 @@
+"""Scaling benchmark for parsing, insights and requirement checks.
+
+Generates synthetic reports (see synth_reports.py) at each requested size
+and records parse throughput, peak parse memory and the per-student cost
+of building everything the student page shows.
+
+    python bench_scaling.py --sizes 1000 10000 100000 --format CB024
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+from records import parse_report_text, read_programme_requirements
+from student_view import build_view_model
+from synth_reports import REQUIREMENTS_CSV, report_text
+
+
+def bench_size(n_students: int, fmt: str, requirements_index: dict, seed: int = 0, model_sample: int = 2000) -> dict:
+    text = report_text(n_students, fmt=fmt, seed=seed)
+    rows = text.count("\n")
+
+    start = time.perf_counter()
+    students = parse_report_text(text)
+    parse_s = time.perf_counter() - start
+
+    # Peak memory is measured on a separate run; tracemalloc slows parsing down
+    tracemalloc.start()
+    parse_report_text(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    step = max(1, len(students) // model_sample)
+    sample = students[::step]
+    start = time.perf_counter()
+    for s in sample:
+        build_view_model(s, requirements_index)
+    model_s = time.perf_counter() - start
+
+    return {
+        "students": n_students,
+        "format": fmt,
+        "rows": rows,
+        "parsed_students": len(students),
+        "parse_s": round(parse_s, 3),
+        "rows_per_s": round(rows / parse_s) if parse_s else None,
+        "peak_parse_mib": round(peak / 2**20, 1),
+        "text_mib": round(len(text) / 2**20, 1),
+        "render_model_ms_per_student": round(model_s / len(sample) * 1000, 3) if sample else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure parse and render-model scaling on synthetic reports.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--format", choices=["CB015", "CB024"], default="CB015")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    requirements_index = {}
+    if os.path.exists(REQUIREMENTS_CSV):
+        requirements_index, _ = read_programme_requirements(REQUIREMENTS_CSV)
+
+    results = []
+    header = f"{'students':>9} {'rows':>9} {'parse s':>8} {'rows/s':>9} {'peak MiB':>9} {'model ms/stu':>13}"
+    print(header)
+    for n in args.sizes:
+        r = bench_size(n, args.format, requirements_index, seed=args.seed)
+        results.append(r)
+        print(f"{r['students']:>9} {r['rows']:>9} {r['parse_s']:>8} {r['rows_per_s']:>9} {r['peak_parse_mib']:>9} {r['render_model_ms_per_student']:>13}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
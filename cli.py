@@ -0,0 +1,202 @@
+"""Command-line access to report parsing outside the Streamlit app.
+
+    python cli.py diff "CB015 - December 2024.csv" CB015.csv
+    python cli.py diff exports-2024.zip exports-2025.csv.gz
+    python cli.py export CB015.csv --out exports/ --format parquet
+    python cli.py packs CB015.csv --out packs/ --with-fails --combined
+    python cli.py annotate CB015.csv CB015_annotations.csv --out CB015_annotated.csv
+    python cli.py handbook com-ug-handbook-6a-2025.pdf --out requirements.csv --pages 33-133
+    python cli.py check CB015.csv --samples 10
+
+Reports may be plain CSV, .csv.gz, .csv.bz2 or zip archives; every CSV
+in an archive is read as its own report, decompressed as it is parsed.
+Rows the parser dropped or read by heuristic are summarised on stderr;
+``check`` lists them with samples.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from annotations import annotated_report_csv, merge_annotations, read_sidecar
+from columnar import EXPORT_FORMATS, report_tables, write_tables
+from handbook import DEFAULT_CACHE_DIR, extract_requirements, write_requirements_csv
+from ingest import report_sources, parse_source
+from longitudinal import make_snapshot, merge_snapshots, diff_rows
+from records import SAMPLE_LIMIT, ParseDiagnostics
+from report_packs import render_packs, select_students, write_packs
+from synth_reports import REQUIREMENTS_CSV
+
+
+def parse_reports(paths, sample_limit: int = SAMPLE_LIMIT):
+    """``(label, students, diagnostics)`` for every report in the given files, in order."""
+    for path in paths:
+        filename = os.path.basename(path)
+        for source in report_sources(filename, path=path):
+            label = f"{filename}:{source.member}" if source.member else filename
+            diagnostics = ParseDiagnostics(sample_limit=sample_limit)
+            yield label, parse_source(source, diagnostics), diagnostics
+
+
+def load_reports(paths):
+    """``(label, students)`` for every report in the given files, in order; parse issues go to stderr."""
+    for label, students, diagnostics in parse_reports(paths):
+        if diagnostics.total:
+            lost = ", ".join(f"{i['count']} {i['label'].lower()}" for i in diagnostics.summary(lost=True))
+            print(f"{label}: lost in parsing: {lost} (see `cli.py check`)", file=sys.stderr)
+        yield label, students
+
+
+def cmd_diff(args):
+    snapshots = [make_snapshot(label, students) for label, students in load_reports(args.reports)]
+    if len(snapshots) < 2:
+        print("diff needs at least two reports", file=sys.stderr)
+        return 2
+    merged = merge_snapshots(snapshots)
+    if args.json:
+        json.dump(merged["diffs"], sys.stdout, indent=2, default=str)
+        print()
+        return 0
+    for diff in merged["diffs"]:
+        print(f"{diff['from']} -> {diff['to']}: {len(diff['changed'])} changed, {diff['unchanged']} unchanged, "
+              f"{len(diff['added'])} added, {len(diff['removed'])} removed")
+        for row in diff_rows(diff, merged["students"]):
+            details = "; ".join(f"{k}: {v}" for k, v in row.items() if k not in ("Campus ID", "Name") and v)
+            print(f"  {row['Campus ID']} {row['Name']}: {details}")
+    return 0
+
+
+def cmd_export(args):
+    for label, students in load_reports(args.reports):
+        out_dir = os.path.join(args.out, re.sub(r"[^\w.-]+", "_", label))
+        paths = write_tables(report_tables(students), out_dir, args.format)
+        print(f"{label}: {len(students)} students -> {out_dir} ({len(paths)} tables)")
+    return 0
+
+
+def cmd_packs(args):
+    for label, students in load_reports(args.reports):
+        selected = select_students(students, args.campus_id, args.programme, args.with_fails)
+        start = time.perf_counter()
+        sections = render_packs(selected, args.requirements, workers=args.workers)
+        out_dir = os.path.join(args.out, re.sub(r"[^\w.-]+", "_", label))
+        paths = write_packs(selected, sections, out_dir, combined=args.combined, title=f"{label} report packs")
+        print(f"{label}: {len(selected)} of {len(students)} students -> {len(paths)} files in {out_dir} "
+              f"({time.perf_counter() - start:.1f}s)")
+    return 0
+
+
+def cmd_annotate(args):
+    annotations = {}
+    for path in args.annotations:
+        with open(path, "rb") as f:
+            merge_annotations(annotations, read_sidecar(f.read()))
+    filename = os.path.basename(args.report)
+    sources = report_sources(filename, path=args.report)
+    if len(sources) != 1:
+        print(f"{filename}: expected one report, found {len(sources)}", file=sys.stderr)
+        return 2
+    data = annotated_report_csv(sources[0].lines(), annotations)
+    with open(args.out, "wb") as f:
+        f.write(data)
+    print(f"{filename}: {len(annotations)} annotations -> {args.out}")
+    return 0
+
+
+def cmd_check(args):
+    reports = []
+    for label, students, diagnostics in parse_reports(args.reports, args.samples):
+        reports.append({"report": label, "students": len(students), "lost": diagnostics.total,
+                        "heuristic": diagnostics.heuristic, "issues": diagnostics.summary()})
+    if args.json:
+        json.dump(reports, sys.stdout, indent=2)
+        print()
+        return 0
+    for report in reports:
+        print(f"{report['report']}: {report['students']} students, {report['lost']} lost, "
+              f"{report['heuristic']} read by heuristic")
+        for issue in report["issues"]:
+            print(f"  {issue['label']}{'' if issue['lost'] else ' (heuristic)'}: {issue['count']}")
+            for sample in issue["samples"]:
+                print(f"    {sample['campus_id'] or '-':<10} {sample['row']}")
+    return 0
+
+
+def cmd_handbook(args):
+    start = time.perf_counter()
+    try:
+        rows, stats = extract_requirements(args.pdf, args.pages, None if args.no_cache else args.cache, workers=args.workers)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 2
+    write_requirements_csv(rows, args.out)
+    print(f"{os.path.basename(args.pdf)}: {stats['pages']} pages ({stats['cached']} cached, {stats['parsed']} parsed), "
+          f"{stats['programmes']} programmes, {stats['rows']} rows ({stats['choose_groups']} choose groups) "
+          f"-> {args.out} ({time.perf_counter() - start:.1f}s)")
+    skipped = stats["skipped_option_blocks"]
+    if skipped:
+        print(f"{len(skipped)} OR-joined option blocks left out (add them to the CSV by hand):", file=sys.stderr)
+        for s in skipped:
+            blocks = " OR ".join("(" + ", ".join(block) + ")" for block in s["blocks"])
+            print(f"  {s['programme_code']} Year {s['year']}: {blocks}", file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Student record report tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("diff", help="Diff successive snapshots of the same cohort (oldest first)")
+    p.add_argument("reports", nargs="+", metavar="REPORT")
+    p.add_argument("--json", action="store_true", help="Print the raw diffs as JSON")
+    p.set_defaults(func=cmd_diff)
+
+    p = sub.add_parser("export", help="Export parsed reports as normalized Parquet/Arrow tables")
+    p.add_argument("reports", nargs="+", metavar="REPORT")
+    p.add_argument("--out", required=True, help="Output directory; one subdirectory per report")
+    p.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="parquet")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("packs", help="Render printable per-student HTML report packs")
+    p.add_argument("reports", nargs="+", metavar="REPORT")
+    p.add_argument("--out", required=True, help="Output directory; one subdirectory per report")
+    p.add_argument("--combined", action="store_true", help="Write one document per report instead of one file per student")
+    p.add_argument("--campus-id", action="append", help="Only this student (repeatable)")
+    p.add_argument("--programme", help="Only students whose programme or plan starts with this code")
+    p.add_argument("--with-fails", action="store_true", help="Only students with at least one failed course")
+    p.add_argument("--workers", type=int, help="Worker processes (default: CPU count; 0 renders in-process)")
+    p.add_argument("--requirements", default=REQUIREMENTS_CSV, help="Programme requirements CSV")
+    p.set_defaults(func=cmd_packs)
+
+    p = sub.add_parser("annotate", help="Write a report with the annotations from sidecar files filled in")
+    p.add_argument("report", metavar="REPORT")
+    p.add_argument("annotations", nargs="+", metavar="ANNOTATIONS", help="Annotation sidecar CSVs; newer annotations win")
+    p.add_argument("--out", required=True, help="Annotated report CSV to write")
+    p.set_defaults(func=cmd_annotate)
+
+    p = sub.add_parser("check", help="List the rows the parser dropped or read by heuristic, with samples")
+    p.add_argument("reports", nargs="+", metavar="REPORT")
+    p.add_argument("--samples", type=int, default=SAMPLE_LIMIT, help="Sample rows kept per kind of issue")
+    p.add_argument("--json", action="store_true", help="Print the counts and samples as JSON")
+    p.set_defaults(func=cmd_check)
+
+    p = sub.add_parser("handbook", help="Extract programme requirements from the Commerce handbook PDF")
+    p.add_argument("pdf", metavar="PDF")
+    p.add_argument("--out", required=True, help="Requirements CSV to write")
+    p.add_argument("--pages", help="1-based pages to read, e.g. 33-133 (default: all)")
+    p.add_argument("--cache", default=DEFAULT_CACHE_DIR, help="Per-page cache directory")
+    p.add_argument("--no-cache", action="store_true", help="Re-extract every page and cache nothing")
+    p.add_argument("--workers", type=int, help="Worker processes (default: CPU count; 0 parses in-process)")
+    p.set_defaults(func=cmd_handbook)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""Normalized columnar tables of a parsed report for Parquet/Arrow export.
+
+A report becomes six tables linked by ``student_id`` (the student's
+position in the report): students, terms, course_results, summaries,
+annotations and insights. Marks, units and GPAs are numeric columns, and
+low-cardinality strings (course codes, symbols, terms, programmes) are
+dictionary-encoded, so downstream jobs can load a term's data without
+re-running the report heuristics.
+"""
+import io
+import os
+import zipfile
+
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from records import _clean_code, _is_fail_course, compute_student_insights
+
+TABLES = ("students", "terms", "course_results", "summaries", "annotations", "insights")
+TERM_METRICS = ("jt", "je", "st", "se", "tt", "te", "ce", "wghtd_gpa", "term_gpa", "cum_gpa")
+EXPORT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def _number(value):
+    # Report numbers carry stray semicolons ("1.00;") and blanks
+    try:
+        return float(str(value).strip().rstrip(";"))
+    except ValueError:
+        return None
+
+
+def _dict(values) -> pa.Array:
+    return pa.array(values, type=pa.string()).dictionary_encode()
+
+
+def students_table(students: list[dict]) -> pa.Table:
+    return pa.table({
+        "student_id": pa.array(range(len(students)), type=pa.int32()),
+        "campus_id": [s.get("campus_id", "") for s in students],
+        "emplid": [s.get("emplid", "") for s in students],
+        "name": [s.get("name", "") for s in students],
+        "prgm": _dict([s.get("prgm", "") for s in students]),
+        "plan": _dict([s.get("plan", "") for s in students]),
+        "level_start": _dict([s.get("level_start", "") for s in students]),
+        "level_end": _dict([s.get("level_end", "") for s in students]),
+        "finalist": _dict([s.get("finalist", "") for s in students]),
+    })
+
+
+def terms_table(students: list[dict]) -> pa.Table:
+    cols = {name: [] for name in ("student_id", "year", "term", "program", "degree", "acad_level", "standing", "plan", "specialization")}
+    metrics = {name: [] for name in TERM_METRICS}
+    for pos, s in enumerate(students):
+        for yr in s.get("years", []):
+            cols["student_id"].append(pos)
+            cols["year"].append(yr.get("year"))
+            for name in ("term", "program", "degree", "acad_level", "standing", "plan", "specialization"):
+                cols[name].append(yr.get(name, ""))
+            for name in TERM_METRICS:
+                metrics[name].append(_number(yr.get(name, "")))
+    return pa.table({
+        "student_id": pa.array(cols["student_id"], type=pa.int32()),
+        "year": pa.array(cols["year"], type=pa.int16()),
+        **{name: _dict(cols[name]) for name in ("term", "program", "degree", "acad_level", "standing", "plan", "specialization")},
+        **{name: pa.array(values, type=pa.float64()) for name, values in metrics.items()},
+    })
+
+
+def course_results_table(students: list[dict]) -> pa.Table:
+    names = ("student_id", "year", "term", "code", "title", "result", "mark", "symbol", "units_attempted", "units_earned", "fail")
+    cols = {name: [] for name in names}
+    for pos, s in enumerate(students):
+        for yr in s.get("years", []):
+            for c in yr.get("courses", []):
+                code = _clean_code(c.get("code"))
+                if not code:
+                    continue
+                cols["student_id"].append(pos)
+                cols["year"].append(yr.get("year"))
+                cols["term"].append(yr.get("term", ""))
+                cols["code"].append(code)
+                cols["title"].append((c.get("title") or "").rstrip(";"))
+                cols["result"].append(c.get("result", ""))
+                cols["mark"].append(_number(c.get("result", "")))
+                cols["symbol"].append(c.get("symbol", ""))
+                cols["units_attempted"].append(_number(c.get("units_attempted", "")))
+                cols["units_earned"].append(_number(c.get("units_earned", "")))
+                cols["fail"].append(_is_fail_course(c))
+    return pa.table({
+        "student_id": pa.array(cols["student_id"], type=pa.int32()),
+        "year": pa.array(cols["year"], type=pa.int16()),
+        "term": _dict(cols["term"]),
+        "code": _dict(cols["code"]),
+        "title": _dict(cols["title"]),
+        "result": _dict(cols["result"]),
+        "mark": pa.array(cols["mark"], type=pa.float64()),
+        "symbol": _dict(cols["symbol"]),
+        "units_attempted": pa.array(cols["units_attempted"], type=pa.float64()),
+        "units_earned": pa.array(cols["units_earned"], type=pa.float64()),
+        "fail": pa.array(cols["fail"], type=pa.bool_()),
+    })
+
+
+def summaries_table(students: list[dict]) -> pa.Table:
+    keys = []
+    for s in students:
+        for k in (s.get("summary") or {}):
+            if k not in keys:
+                keys.append(k)
+    return pa.table({
+        "student_id": pa.array(range(len(students)), type=pa.int32()),
+        **{
+            k: pa.array([_number((s.get("summary") or {}).get(k, "")) for s in students], type=pa.float64())
+            for k in keys
+        },
+    })
+
+
+def annotations_table(students: list[dict], annotations: dict | None = None) -> pa.Table:
+    """Codes/comments from the report, overridden by ``annotations`` (campus ID -> code/comment)."""
+    annotations = annotations or {}
+    ids, campus_ids, codes, comments = [], [], [], []
+    for pos, s in enumerate(students):
+        campus_id = s.get("campus_id", "")
+        ann = annotations.get(campus_id) or {}
+        code = ann.get("code") or s.get("annotation_code", "")
+        comment = ann.get("comment") or s.get("annotation_comment", "")
+        if code or comment:
+            ids.append(pos)
+            campus_ids.append(campus_id)
+            codes.append(code)
+            comments.append(comment)
+    return pa.table({
+        "student_id": pa.array(ids, type=pa.int32()),
+        "campus_id": pa.array(campus_ids, type=pa.string()),
+        "code": _dict(codes),
+        "comment": pa.array(comments, type=pa.string()),
+    })
+
+
+def insights_table(students: list[dict]) -> pa.Table:
+    insights = [compute_student_insights(s) for s in students]
+    weakest = [i.get("weakest_year") or (None, None, None, None) for i in insights]
+    return pa.table({
+        "student_id": pa.array(range(len(students)), type=pa.int32()),
+        "program_changes": pa.array([i.get("program_changes", 0) for i in insights], type=pa.int16()),
+        "program_change_list": pa.array([i.get("program_change_list", []) for i in insights], type=pa.list_(pa.string())),
+        "repeated_fails": pa.array([i.get("repeated_fails", []) for i in insights], type=pa.list_(pa.string())),
+        "actual_year": pa.array([i.get("actual_year") for i in insights], type=pa.int16()),
+        "weakest_year": pa.array([w[0] for w in weakest], type=pa.int16()),
+        "weakest_year_passed": pa.array([w[1] for w in weakest], type=pa.int16()),
+        "weakest_year_attempted": pa.array([w[2] for w in weakest], type=pa.int16()),
+        "weakest_year_pass_rate": pa.array([w[3] for w in weakest], type=pa.float64()),
+    })
+
+
+def report_tables(students: list[dict], annotations: dict | None = None) -> dict[str, pa.Table]:
+    return {
+        "students": students_table(students),
+        "terms": terms_table(students),
+        "course_results": course_results_table(students),
+        "summaries": summaries_table(students),
+        "annotations": annotations_table(students, annotations),
+        "insights": insights_table(students),
+    }
+
+
+def _write_table(table: pa.Table, sink, fmt: str):
+    if fmt == "parquet":
+        pq.write_table(table, sink, compression="zstd")
+    else:
+        feather.write_feather(table, sink, compression="zstd")
+
+
+def write_tables(tables: dict[str, pa.Table], out_dir: str, fmt: str = "parquet") -> list[str]:
+    """Write one file per table into ``out_dir``; returns the paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, table in tables.items():
+        path = os.path.join(out_dir, name + EXPORT_FORMATS[fmt])
+        _write_table(table, path, fmt)
+        paths.append(path)
+    return paths
+
+
+def tables_zip(tables: dict[str, pa.Table], fmt: str = "parquet") -> bytes:
+    """All tables as one zip of Parquet (or Arrow IPC) files, for download."""
+    out = io.BytesIO()
+    # The files are already compressed, so they are stored as-is
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as zf:
+        for name, table in tables.items():
+            buf = io.BytesIO()
+            _write_table(table, buf, fmt)
+            zf.writestr(name + EXPORT_FORMATS[fmt], buf.getvalue())
+    return out.getvalue()
@@ -0,0 +1,126 @@
+"""Inverted indexes from course codes to the students of a report.
+
+``CourseIndex`` maps each course code to its postings: one per attempt,
+with the student's position in the report, the year, term, result, symbol
+and whether it was failed. It is filled as students are parsed, and stores
+postings column-wise per code (arrays for the numbers, shared references
+for the interned strings), so answering "who attempted/failed ACC1006F" is
+a dict lookup rather than a pass over the cohort.
+
+``outstanding_index`` maps requirement codes to the students who have not
+passed them under their default requirement mapping; it depends on the
+programme requirements and is built separately.
+"""
+import sys
+from array import array
+
+from records import _clean_code, _is_fail_course
+from student_view import outstanding_requirements
+
+SEARCH_KINDS = ("attempted", "failed", "outstanding")
+
+
+class _Postings:
+    __slots__ = ("positions", "years", "terms", "results", "symbols", "fails", "students", "failed_students")
+
+    def __init__(self):
+        self.positions = array("i")
+        self.years = array("h")
+        self.terms = []
+        self.results = []
+        self.symbols = []
+        self.fails = bytearray()
+        # Distinct student positions, in report order
+        self.students = array("i")
+        self.failed_students = array("i")
+
+
+class CourseIndex:
+    def __init__(self):
+        self._codes: dict[str, _Postings] = {}
+        self.students = 0
+        self.postings = 0
+
+    def add(self, pos: int, student: dict):
+        """Index the attempts of the student at report position ``pos`` (positions must increase)."""
+        for yr in student.get("years", []):
+            year = yr.get("year") or 0
+            term = yr.get("term", "")
+            for c in yr.get("courses", []):
+                code = _clean_code(c.get("code"))
+                if not code:
+                    continue
+                p = self._codes.get(code)
+                if p is None:
+                    p = self._codes[sys.intern(code)] = _Postings()
+                failed = _is_fail_course(c)
+                p.positions.append(pos)
+                p.years.append(year)
+                p.terms.append(term)
+                p.results.append(c.get("result", ""))
+                p.symbols.append(c.get("symbol", ""))
+                p.fails.append(failed)
+                if not p.students or p.students[-1] != pos:
+                    p.students.append(pos)
+                if failed and (not p.failed_students or p.failed_students[-1] != pos):
+                    p.failed_students.append(pos)
+                self.postings += 1
+        self.students = max(self.students, pos + 1)
+
+    def codes(self) -> list[str]:
+        return sorted(self._codes)
+
+    def postings_for(self, code: str) -> list[tuple]:
+        """``(position, year, term, result, symbol, failed)`` for every attempt at ``code``."""
+        p = self._codes.get(_clean_code(code) or "")
+        if p is None:
+            return []
+        return list(zip(p.positions, p.years, p.terms, p.results, p.symbols, map(bool, p.fails)))
+
+    def students_for(self, code: str, failed: bool = False) -> list[int]:
+        """Positions of the students who attempted (or failed) ``code``, in report order."""
+        p = self._codes.get(_clean_code(code) or "")
+        if p is None:
+            return []
+        return (p.failed_students if failed else p.students).tolist()
+
+    @property
+    def nbytes(self) -> int:
+        total = sys.getsizeof(self._codes)
+        for p in self._codes.values():
+            total += sum(sys.getsizeof(getattr(p, name)) for name in _Postings.__slots__)
+        return total
+
+
+def build_course_index(students: list[dict]) -> CourseIndex:
+    index = CourseIndex()
+    for pos, s in enumerate(students):
+        index.add(pos, s)
+    return index
+
+
+def outstanding_index(students: list[dict], requirements_index: dict) -> dict[str, list[int]]:
+    """Requirement code -> positions of students who have not passed it.
+
+    Uses each student's default requirement mapping, as the student page
+    does. A requirement with an alternative is outstanding only if neither
+    course was passed, and is listed under both codes.
+    """
+    out: dict[str, list[int]] = {}
+    for pos, s in enumerate(students):
+        seen = set()
+        for code, alt in outstanding_requirements(s, requirements_index):
+            # Choose-k groups list their remaining options as "A/B"
+            for c in (code, *(alt.split("/") if alt else ())):
+                if c and c not in seen:
+                    seen.add(c)
+                    out.setdefault(c, []).append(pos)
+    return out
+
+
+def find_students(course_index: CourseIndex, code: str, kind: str = "attempted",
+                  outstanding: dict[str, list[int]] | None = None) -> list[int]:
+    """Positions of the students matching a course search (see ``SEARCH_KINDS``)."""
+    if kind == "outstanding":
+        return list((outstanding or {}).get(_clean_code(code) or "", []))
+    return course_index.students_for(code, failed=kind == "failed")
@@ -0,0 +1,425 @@
+"""Programme requirements extracted from the Commerce undergraduate handbook PDF.
+
+    python cli.py handbook com-ug-handbook-6a-2025.pdf --out requirements.csv
+
+Each page is reduced to a list of context-free events (programme
+headings, year sections, course lines, OR lines, option blocks, elective
+blocks and "choose k from" notes) on a process pool. Page events are
+cached on disk under a hash of the page's content stream and resources,
+so a new edition of the handbook only re-extracts the pages that changed.
+The events are then replayed in page order, which carries a programme or
+year section across page breaks, into rows of the requirements CSV read
+by ``records.read_programme_requirements``:
+
+- ``X OR Y`` becomes one row with ``Y`` as the alternative (``X/S``
+  course codes likewise), and a longer OR chain a choose-1 group
+- "take two options" elective blocks become choose-k groups over their
+  courses, and option blocks of one course each joined by OR a choose-1
+  group; the format cannot say "all of block A or all of block B", so
+  longer OR-joined option blocks are left out and reported instead
+- "choose 2 courses from A, B or C" notes become a choose-k group that
+  replaces the programme's own rows for those courses
+
+Reading the PDF needs pypdf (``pip install pypdf``); nothing else in the
+app does.
+"""
+import bisect
+import csv
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# Bump when page parsing changes, so cached page events are not reused
+PARSER_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".handbook_cache")
+DEFAULT_CHUNK = 8
+REQUIREMENT_COLUMNS = ("programme_code", "programme_name", "year", "course_code", "alternative_course", "choose", "options")
+
+YEAR_WORDS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6}
+NAME_CONNECTORS = {"and", "with", "for", "of", "in"}
+COUNT_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6}
+CODE = r"[A-Z]{3}\d{4}[A-Z]"
+PROGRAMME_RE = re.compile(r"\[(CB\d{2,3}[A-Z]{3}\d{2})\]\s*$")
+YEAR_RE = re.compile(r"^\s*(first|second|third|fourth|fifth|sixth)\s+year\s+(?:core\s+)?modules", re.IGNORECASE)
+COURSE_RE = re.compile(r"^\s*([A-Z]{3}\d{4})([A-Z])(?:/([A-Z]))?(?![A-Za-z0-9])(.*)$")
+OR_RE = re.compile(r"^\s*OR\b(.*)$")
+TRAILING_OR_RE = re.compile(r"\bOR\b[\s.\d]*$")
+OPTION_RE = re.compile(r"\boption:", re.IGNORECASE)
+ELECTIVES_RE = re.compile(r"^\s*elective courses:", re.IGNORECASE)
+TAKE_RE = re.compile(r"take\s+(\w+)\s+(?:options?|electives?|courses?)", re.IGNORECASE)
+TOTAL_RE = re.compile(r"^\s*total credits", re.IGNORECASE)
+CHOOSE_RE = re.compile(
+    rf"choose\s+(\w+)\s+(?:courses?|options?|electives?)?\s*from\s+((?:{CODE}[\s,]*(?:or\s+|and\s+)?)+)",
+    re.IGNORECASE,
+)
+
+
+def _count(word: str) -> int | None:
+    word = word.lower()
+    return int(word) if word.isdigit() else COUNT_WORDS.get(word)
+
+
+def _programme_name(lines: list[str]) -> str:
+    """The heading lines above a programme code, from the nearest "Bachelor ..." line."""
+    picked = []
+    for line in reversed(lines[-3:]):
+        if not line.strip():
+            break
+        picked.insert(0, line.strip())
+        if line.strip().startswith("Bachelor"):
+            break
+    words = " ".join(picked).replace("*", "").split()
+    return " ".join(_heading_word(w) for w in words)
+
+
+def _heading_word(word: str) -> str:
+    # Headings shout the specialisation ("in ECONOMICS AND FINANCE"); short
+    # acronyms ("AD") and bracketed ones ("(PPE)") stay
+    letters = word.rstrip(":,;")
+    if not (letters.isalpha() and letters.isupper()) or len(letters) < 3:
+        return word
+    if letters.lower() in NAME_CONNECTORS:
+        return word.lower()
+    return word.capitalize()
+
+
+def parse_page(text: str) -> list[list]:
+    """The requirement events on one page of handbook text, independent of other pages."""
+    events = []
+    lines = text.splitlines()
+    starts = []  # events.append position at each line, for placing notes
+    for i, line in enumerate(lines):
+        starts.append(len(events))
+        m = PROGRAMME_RE.search(line)
+        if m and "..." not in line:
+            code = m.group(1)
+            if len(code) == 9:
+                # "CB25BUS09" in places
+                code = code[:2] + "0" + code[2:]
+            before = line[:m.start()].strip()
+            events.append(["programme", code, _programme_name(lines[:i] + ([before] if before else []))])
+            continue
+        m = YEAR_RE.match(line)
+        if m:
+            events.append(["year", YEAR_WORDS[m.group(1).lower()]])
+            continue
+        if TOTAL_RE.match(line):
+            events.append(["end"])
+            continue
+        if ELECTIVES_RE.match(line):
+            m = TAKE_RE.search(" ".join(lines[i:i + 3]))
+            events.append(["electives", _count(m.group(1)) if m else None])
+            continue
+        m = COURSE_RE.match(line)
+        if m:
+            code = m.group(1) + m.group(2)
+            alt = m.group(1) + m.group(3) if m.group(3) else None
+            events.append(["course", code, alt])
+            if TRAILING_OR_RE.search(m.group(4)):
+                events.append(["or"])
+            continue
+        m = OR_RE.match(line)
+        if m:
+            events.append(["or"])
+            if OPTION_RE.search(m.group(1)):
+                events.append(["option"])
+            continue
+        if OPTION_RE.search(line):
+            events.append(["option"])
+    # Notes wrap across lines, so they are matched on the page text as a
+    # whole, then placed after the events of the line they start on: a
+    # footnote belongs to the programme above it, not the next heading
+    joined, offsets = "", []
+    for line in lines:
+        offsets.append(len(joined))
+        joined += " ".join(line.split()) + " "
+    notes = []
+    for m in CHOOSE_RE.finditer(joined):
+        k = _count(m.group(1))
+        codes = list(dict.fromkeys(c.upper() for c in re.findall(CODE, m.group(2), re.IGNORECASE)))
+        if k and len(codes) > k:
+            line = bisect.bisect_right(offsets, m.start()) - 1
+            notes.append((starts[line + 1] if line + 1 < len(starts) else len(events), ["choose", k, codes]))
+    for position, event in reversed(notes):
+        events.insert(position, event)
+    return events
+
+
+class _Programme:
+    """Rows of one programme while its events are replayed."""
+
+    def __init__(self, code: str, name: str):
+        self.code = code
+        self.name = name
+        self.rows: list[dict] = []
+
+    def add(self, year: int, code: str, alt: str | None = None) -> dict:
+        row = {"year": year, "course_code": code, "alternative_course": alt, "choose": None, "options": None}
+        self.rows.append(row)
+        return row
+
+    def add_group(self, year: int, k: int, options: list[str]) -> dict | None:
+        options = list(dict.fromkeys(options))
+        if len(options) <= k:
+            # Every option is required
+            for code in options:
+                self.add(year, code)
+            return None
+        row = self.add(year, options[0])
+        row["choose"], row["options"] = k, options
+        return row
+
+    def apply_choose(self, k: int, options: list[str], default_year: int | None):
+        """Replace the listed rows for ``options`` with one choose-k group."""
+        listed = [r for r in self.rows if r["course_code"] in options and not r["alternative_course"] and not r["options"]]
+        year = listed[0]["year"] if listed else default_year
+        if year is None:
+            return
+        self.rows = [r for r in self.rows if not any(r is x for x in listed)]
+        self.add_group(year, k, options)
+
+
+def assemble_requirements(page_events: list[list[list]], skipped: list | None = None) -> list[dict]:
+    """Requirement rows (``REQUIREMENT_COLUMNS``) from the events of every page, in page order.
+
+    OR-joined option blocks that no row can express are appended to
+    ``skipped`` as ``{"programme_code", "year", "blocks"}``.
+    """
+    programmes: dict[str, _Programme] = {}
+    prog = None
+    year = None
+    last = None  # the row an OR line extends
+    pending_or = False
+    blocks = None  # option blocks: [[code, ...], ...]
+    electives = None  # [k, [code, ...]]
+
+    def close_section():
+        nonlocal year, last, pending_or, blocks, electives
+        if prog is not None and year is not None:
+            if blocks and len(blocks) > 1 and all(len(block) == 1 for block in blocks):
+                prog.add_group(year, 1, [block[0] for block in blocks])
+            elif blocks and len(blocks) > 1:
+                # A choose-k row over every block's courses would count a mix of blocks as met
+                if skipped is not None:
+                    skipped.append({"programme_code": prog.code, "year": year, "blocks": blocks})
+            elif blocks:
+                for code in blocks[0]:
+                    prog.add(year, code)
+            if electives and electives[0] and electives[1]:
+                prog.add_group(year, electives[0], electives[1])
+        year, last, pending_or, blocks, electives = None, None, False, None, None
+
+    for events in page_events:
+        for event in events:
+            kind = event[0]
+            if kind == "programme":
+                close_section()
+                prog = programmes.setdefault(event[1], _Programme(event[1], event[2]))
+            elif kind == "year":
+                close_section()
+                year = event[1] if prog is not None else None
+            elif kind == "end":
+                close_section()
+            elif kind == "choose":
+                if prog is not None:
+                    prog.apply_choose(event[1], event[2], year)
+            elif year is None:
+                continue
+            elif kind == "or":
+                pending_or = True
+            elif kind == "option":
+                if blocks is None or pending_or:
+                    blocks = (blocks or []) + [[]]
+                else:
+                    # A new option block without OR: the previous blocks were required outright
+                    for code in (c for block in blocks for c in block):
+                        prog.add(year, code)
+                    blocks = [[]]
+                pending_or = False
+            elif kind == "electives":
+                electives = [event[1], []]
+            elif kind == "course":
+                code, alt = event[1], event[2]
+                if electives is not None:
+                    electives[1].extend(c for c in (code, alt) if c)
+                elif blocks is not None:
+                    blocks[-1].extend(c for c in (code, alt) if c)
+                elif pending_or and last is not None:
+                    if last["options"] or last["alternative_course"]:
+                        # A third course in an OR chain: any one of them
+                        options = last["options"] or [last["course_code"], last["alternative_course"]]
+                        last["alternative_course"] = None
+                        last["choose"], last["options"] = 1, list(dict.fromkeys(options + [c for c in (code, alt) if c]))
+                    else:
+                        last["alternative_course"] = code
+                else:
+                    last = prog.add(year, code, alt)
+                pending_or = False
+    close_section()
+
+    rows = []
+    for prog in programmes.values():
+        seen = set()
+        for r in prog.rows:
+            key = (r["year"], r["course_code"], r["alternative_course"], tuple(r["options"] or ()))
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append({
+                "programme_code": prog.code,
+                "programme_name": prog.name,
+                "year": f"Year {r['year']}",
+                "course_code": r["course_code"],
+                "alternative_course": r["alternative_course"] or "",
+                "choose": r["choose"] or "",
+                "options": " ".join(r["options"] or ()),
+            })
+    return rows
+
+
+def _pdf_reader(path: str):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("Reading the handbook PDF needs pypdf (pip install pypdf)") from None
+    return PdfReader(path)
+
+
+def _object_digest(obj, memo: dict) -> bytes:
+    """Digest of a PDF object with every indirect reference resolved (memoised in ``memo``)."""
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref not in memo:
+            memo[ref] = b"cycle"
+            memo[ref] = _object_digest(obj.get_object(), memo)
+        return memo[ref]
+    h = hashlib.sha256()
+    if isinstance(obj, DictionaryObject):
+        for key in sorted(obj):
+            if key != "/Parent":
+                h.update(key.encode("utf-8", "replace") + _object_digest(obj.raw_get(key), memo))
+        if isinstance(obj, StreamObject):
+            h.update(obj.get_data())
+    elif isinstance(obj, ArrayObject):
+        for item in obj:
+            h.update(_object_digest(item, memo))
+    else:
+        h.update(repr(obj).encode("utf-8", "replace"))
+    return h.digest()
+
+
+def page_hash(page, memo: dict | None = None) -> str:
+    """Hash of what a page's text is extracted from, and of the parser version.
+
+    That is the page's content stream and its resources: fonts and their
+    encodings decide the extracted text, and form XObjects carry content of
+    their own. ``memo`` shares resolved objects (fonts, mostly) across pages.
+    """
+    memo = {} if memo is None else memo
+    contents = page.get_contents()
+    h = hashlib.sha256(f"v{PARSER_VERSION}:".encode("ascii"))
+    h.update(contents.get_data() if contents is not None else b"")
+    h.update(_object_digest(page.get("/Resources"), memo))
+    return h.hexdigest()
+
+
+def _init_worker(pdf_path: str):
+    global _reader
+    _reader = _pdf_reader(pdf_path)
+
+
+def _parse_pages(numbers: list[int]) -> list[tuple[int, list]]:
+    return [(n, parse_page(_reader.pages[n].extract_text() or "")) for n in numbers]
+
+
+def _cache_path(cache_dir: str, digest: str) -> str:
+    return os.path.join(cache_dir, digest[:2], digest + ".json")
+
+
+def _read_cached(cache_dir: str | None, digest: str) -> list | None:
+    if not cache_dir:
+        return None
+    try:
+        with open(_cache_path(cache_dir, digest), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cached(cache_dir: str, digest: str, events: list):
+    path = _cache_path(cache_dir, digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(events, f)
+    os.replace(tmp, path)
+
+
+def parse_page_range(spec: str | None, n_pages: int) -> list[int]:
+    """0-based page indexes for a 1-based spec such as ``"33-133"`` or ``"5,9-12"`` (``None``: every page)."""
+    if not spec:
+        return list(range(n_pages))
+    out = []
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        lo = max(1, int(first))
+        hi = min(n_pages, int(last) if last else lo)
+        out.extend(range(lo - 1, hi))
+    return sorted(set(out))
+
+
+def extract_requirements(pdf_path: str, pages: str | None = None, cache_dir: str | None = DEFAULT_CACHE_DIR,
+                         workers: int | None = None, chunk_size: int = DEFAULT_CHUNK) -> tuple[list[dict], dict]:
+    """``(rows, stats)`` for the handbook at ``pdf_path``.
+
+    Pages whose content hash is in ``cache_dir`` are not extracted again;
+    the rest are parsed on a process pool of ``workers`` (default: CPU
+    count; ``0`` parses in this process).
+    """
+    reader = _pdf_reader(pdf_path)
+    numbers = parse_page_range(pages, len(reader.pages))
+    memo = {}
+    digests = {n: page_hash(reader.pages[n], memo) for n in numbers}
+    events = {}
+    for n, digest in digests.items():
+        cached = _read_cached(cache_dir, digest)
+        if cached is not None:
+            events[n] = cached
+    missing = [n for n in numbers if n not in events]
+    chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+    if not chunks:
+        parsed = []
+    elif workers == 0 or len(chunks) <= 1:
+        _init_worker(pdf_path)
+        parsed = [result for chunk in chunks for result in _parse_pages(chunk)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pdf_path,)) as pool:
+            parsed = [result for results in pool.map(_parse_pages, chunks) for result in results]
+    for n, page_events in parsed:
+        events[n] = page_events
+        if cache_dir:
+            _write_cached(cache_dir, digests[n], page_events)
+
+    skipped = []
+    rows = assemble_requirements([events[n] for n in numbers], skipped)
+    stats = {
+        "pages": len(numbers),
+        "cached": len(numbers) - len(missing),
+        "parsed": len(missing),
+        "programmes": len({r["programme_code"] for r in rows}),
+        "rows": len(rows),
+        "choose_groups": sum(1 for r in rows if r["options"]),
+        "skipped_option_blocks": skipped,
+    }
+    return rows, stats
+
+
+def write_requirements_csv(rows: list[dict], path: str):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=REQUIREMENT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,220 @@
+"""Report ingestion: split a report into per-student blocks and parse incrementally.
+
+A student block runs from the name/campus-ID row through its
+``Course Counts`` row (or up to the next student row). Each block is
+fingerprinted from its raw CSV rows, so when the registrar reissues a
+report with a few corrections only the blocks whose fingerprint changed
+are parsed again; every other student is reused from the previous parse.
+Rows outside any block (page headers, the column header) are ignored by
+the parser as well, so parsing block by block gives the same students as
+parsing the whole file. The column-header rows do set the layout each
+block is parsed with, and the layout is part of the block fingerprint.
+"""
+import bz2
+import csv
+import gzip
+import hashlib
+import io
+import zipfile
+from contextlib import ExitStack, contextmanager
+
+from records import (
+    DECODE_ERRORS,
+    _is_header_line,
+    _is_report_furniture,
+    _parse_rows,
+    _row_parts,
+    _student_row_shift,
+    _update_layout,
+    counting_decode_errors,
+    layout_fingerprint,
+    new_layout,
+)
+
+# Upload types accepted by the app: plain reports, .csv.gz/.csv.bz2, and zip archives of reports
+REPORT_UPLOAD_TYPES = ["csv", "gz", "bz2", "zip"]
+
+
+def iter_student_blocks(rows_iter, diagnostics=None):
+    """Yield ``(rows, layout)`` for each student block, in file order.
+
+    ``rows`` are the block's raw CSV rows and ``layout`` the column layout
+    (see ``records.new_layout``) in effect where the block starts, as set by
+    the column-header rows read so far. Data rows outside any block are
+    counted in ``diagnostics`` (a ``records.ParseDiagnostics``).
+    """
+    block = None
+    block_layout = None
+    header_seen = False
+    layout = new_layout()
+    for row in rows_iter:
+        if header_seen and (not row or not row[0].strip()):
+            # Course and specialisation rows start with an empty field; they can
+            # never open or close a block
+            if block is not None:
+                block.append(row)
+            elif diagnostics is not None and not _is_report_furniture(row):
+                diagnostics.record("outside_student", row)
+            continue
+        parts = _row_parts(row)
+        line = ",".join(row)
+        # Mirror the parser's order of checks so block boundaries match it exactly
+        if _update_layout(layout, parts):
+            header_seen = True
+            if block is not None:
+                block.append(row)
+            continue
+        if _is_header_line(line):
+            if block is not None:
+                block.append(row)
+            continue
+        if _student_row_shift(parts, layout) is not None:
+            if block:
+                yield block, block_layout
+            block = [row]
+            block_layout = dict(layout)
+            continue
+        if block is None:
+            if diagnostics is not None and not _is_report_furniture(parts):
+                diagnostics.record("outside_student", line)
+            continue
+        block.append(row)
+        if line.startswith("Course Counts"):
+            yield block, block_layout
+            block = None
+    if block:
+        yield block, block_layout
+
+
+def block_hash(rows: list[list[str]], layout: dict | None = None) -> str:
+    """Fingerprint of a block's rows, and of the layout they are read with."""
+    h = hashlib.blake2b(digest_size=16)
+    if layout is not None:
+        h.update(layout_fingerprint(layout).encode("utf-8"))
+        h.update(b"\x1d")
+    for row in rows:
+        h.update("\x1f".join(row).encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+def iter_parsed_blocks(lines_iter, cache: dict | None = None, diagnostics=None):
+    """Yield ``(student, fingerprint, reused)`` for each student block, in file order.
+
+    Parse issues go to ``diagnostics``; a reused block's come from
+    ``diagnostics.previous``, the diagnostics of the parse ``cache`` is from.
+    """
+    cache = cache or {}
+    for rows, layout in iter_student_blocks(csv.reader(lines_iter), diagnostics):
+        h = block_hash(rows, layout)
+        student = cache.get(h)
+        if student is not None:
+            if diagnostics is not None:
+                diagnostics.reuse(h)
+            yield student, h, True
+            continue
+        if diagnostics is not None:
+            diagnostics.block = h
+        parsed = _parse_rows(rows, layout, diagnostics)
+        if diagnostics is not None:
+            diagnostics.block = None
+        if parsed:
+            yield parsed[0], h, False
+
+
+def parse_incremental(lines_iter, cache: dict | None = None, diagnostics=None):
+    """Parse a report block by block, reusing students whose block is in ``cache``.
+
+    ``cache`` maps block fingerprints to parsed students (e.g. from the
+    previous version of the report). Returns ``(students, hashes, reused)``
+    where ``hashes[i]`` is the fingerprint of ``students[i]``'s block.
+    """
+    students, hashes = [], []
+    reused = 0
+    for student, h, was_cached in iter_parsed_blocks(lines_iter, cache, diagnostics):
+        students.append(student)
+        hashes.append(h)
+        reused += was_cached
+    return students, hashes, reused
+
+
+def _compression(filename: str) -> str | None:
+    lower = filename.lower()
+    for suffix, kind in ((".gz", "gz"), (".bz2", "bz2"), (".zip", "zip")):
+        if lower.endswith(suffix):
+            return kind
+    return None
+
+
+class ReportSource:
+    """One report in an upload (``data``) or on disk (``path``), read as a stream of lines.
+
+    Only the file as uploaded is kept; each ``lines()`` call decompresses it
+    afresh straight into the CSV reader, so the decompressed text is never
+    held in memory as a whole. Members of a zip archive are separate sources.
+    """
+
+    def __init__(self, name: str, key: str = "", data: bytes | None = None, path: str | None = None,
+                 compression: str | None = None, member: str | None = None):
+        self.name = name
+        self.key = key
+        self.data = data
+        self.path = path
+        self.compression = compression
+        self.member = member
+
+    @contextmanager
+    def open(self):
+        """Decoded text stream of the report."""
+        with ExitStack() as stack:
+            raw = io.BytesIO(self.data) if self.data is not None else stack.enter_context(open(self.path, "rb"))
+            if self.compression == "zip":
+                raw = stack.enter_context(stack.enter_context(zipfile.ZipFile(raw)).open(self.member))
+            elif self.compression == "gz":
+                raw = stack.enter_context(gzip.GzipFile(fileobj=raw))
+            elif self.compression == "bz2":
+                raw = stack.enter_context(bz2.BZ2File(raw))
+            yield stack.enter_context(io.TextIOWrapper(raw, encoding="utf-8", errors=DECODE_ERRORS, newline=""))
+
+    def lines(self, diagnostics=None):
+        """The report's lines; bytes that are not UTF-8 are dropped and counted in ``diagnostics``."""
+        with self.open() as f, counting_decode_errors(diagnostics):
+            yield from f
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) if self.data is not None else 0
+
+    @property
+    def total_rows(self) -> int | None:
+        """Line count when it is known without decompressing."""
+        if self.data is None or self.compression:
+            return None
+        return self.data.count(b"\n") + (0 if self.data.endswith(b"\n") else 1)
+
+
+def report_sources(filename: str, data: bytes | None = None, path: str | None = None) -> list[ReportSource]:
+    """The reports in an uploaded or on-disk file: one per CSV member of a zip, else one.
+
+    Sources from uploaded ``data`` are keyed by its SHA-256 (plus the member
+    name for archive members).
+    """
+    digest = hashlib.sha256(data).hexdigest() if data is not None else ""
+    kind = _compression(filename)
+    if kind != "zip":
+        name = filename[: filename.lower().rfind(f".{kind}")] if kind else filename
+        return [ReportSource(name, digest, data, path, kind)]
+    with zipfile.ZipFile(io.BytesIO(data) if data is not None else path) as zf:
+        members = [
+            info.filename for info in zf.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(".csv") and not info.filename.startswith("__MACOSX/")
+        ]
+    return [
+        ReportSource(member.rsplit("/", 1)[-1], f"{digest}:{member}" if digest else "", data, path, "zip", member)
+        for member in members
+    ]
+
+
+def parse_source(source: ReportSource, diagnostics=None) -> list[dict]:
+    students, _, _ = parse_incremental(source.lines(diagnostics), diagnostics=diagnostics)
+    return students
@@ -0,0 +1,348 @@
+"""Concurrent-reviewer load test for the Streamlit app.
+
+Each simulated reviewer is an AppTest session of app.py in this process,
+driven from its own thread: it uploads one of the bundled reports, then
+repeats a mix of interactions (◀/▶ navigation, switching the academic
+level, switching to the cohort view and back, typing an annotation code
+and comment), timing every rerun. Sessions share the process-wide caches
+and report store as they do under ``streamlit run``.
+
+    python loadtest.py --sessions 8 --steps 30
+    python loadtest.py --sessions 4 --reports CB015.csv --json load.json
+
+Reported: p50/p95 rerun latency overall and per interaction, time to the
+first fully parsed page, process CPU time and utilisation, and memory:
+resident-set growth per session (after the shared reports are counted
+once) and the session state each session holds.
+
+AppTest reruns the whole script for every interaction, including those
+that only rerun a fragment in the browser, so the latencies are an upper
+bound for navigation and annotation. AppTest has no file upload either;
+``install_upload_stub`` replaces the sidebar report uploader with one that
+returns the report chosen for the session.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+from profiling import estimate_size
+from report_store import default_store
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUNDLED_REPORTS = ("CB015.csv", "CB024 - December 2024 .csv", "CB015 - December 2024.csv")
+ACTIONS = ("next", "prev", "level", "view", "annotate")
+# Relative frequency of each interaction in a reviewer's session
+ACTION_WEIGHTS = (5, 2, 3, 1, 2)
+ANNOTATION_CODES = ("CONT", "QUAL", "SUPP", "FECP", "FECR", "FECF")
+# Session state that points into the shared report store rather than owning memory
+SHARED_STATE = ("report", "earlier_report", "parse_job", "_loadtest_report", "_loadtest_app")
+
+
+class _Upload:
+    """Stands in for the UploadedFile of a report chosen by path."""
+
+    def __init__(self, path: str):
+        self.name = os.path.basename(path)
+        self._path = path
+
+    def getvalue(self) -> bytes:
+        with open(self._path, "rb") as f:
+            return f.read()
+
+
+def install_upload_stub():
+    """Make the sidebar report uploader return each session's ``_loadtest_report``."""
+    import streamlit as st
+
+    sidebar = st.sidebar
+    if "_loadtest_uploader" in vars(sidebar):
+        return
+    original = sidebar.file_uploader
+
+    def _file_uploader(label, *args, **kwargs):
+        # Only the report uploader (the one without a key) is replaced; the path
+        # is looked up per call, in the session whose script is running
+        if kwargs.get("key") is None:
+            path = st.session_state.get("_loadtest_report")
+            return _Upload(path) if path else None
+        return original(label, *args, **kwargs)
+
+    sidebar.file_uploader = _file_uploader
+    sidebar._loadtest_uploader = original
+
+
+@contextmanager
+def shared_test_runtime():
+    """Let AppTest sessions run concurrently.
+
+    Every AppTest run installs a stand-in Runtime singleton and turns on
+    the ``global.appTest`` option, and undoes both when it finishes, which
+    breaks runs still going in other threads. Inside this block every
+    session sees one shared stand-in, as the sessions of a real server
+    share one runtime, and the option stays on.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1.util import patch_config_options
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    saved = Runtime.__dict__["instance"], Runtime.__dict__["exists"]
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    try:
+        with patch_config_options({"global.appTest": True}):
+            yield runtime
+    finally:
+        Runtime.instance, Runtime.exists = saved
+
+
+def _session_script():
+    # Runs as the AppTest script, so it must be self-contained
+    import runpy
+
+    import streamlit as st
+
+    runpy.run_path(st.session_state["_loadtest_app"], run_name="__main__")
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Peak rather than current, where /proc is unavailable (ru_maxrss is KiB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _summary(latencies: list[float]) -> dict:
+    if not latencies:
+        return {"reruns": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+    return {
+        "reruns": len(latencies),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+def session_state_bytes(at) -> int:
+    """Approximate memory a session owns in its state (shared reports excluded)."""
+    state = at.session_state.filtered_state
+    return sum(estimate_size(v) for k, v in state.items() if k not in SHARED_STATE)
+
+
+class Reviewer:
+    """One simulated reviewer: an AppTest session and the latency of each rerun."""
+
+    def __init__(self, report_path: str | None, seed: int, timeout: float):
+        from streamlit.testing.v1 import AppTest
+
+        self.report_path = report_path
+        self.rng = random.Random(seed)
+        self.at = AppTest.from_function(_session_script, default_timeout=timeout)
+        self.at.session_state["_loadtest_app"] = os.path.join(HERE, "app.py")
+        self.latencies: dict[str, list[float]] = {a: [] for a in ACTIONS}
+        self.load_seconds = None
+        self.errors: list[str] = []
+
+    def _run(self, action: str | None = None):
+        start = time.perf_counter()
+        self.at.run()
+        elapsed = time.perf_counter() - start
+        if action is not None:
+            self.latencies[action].append(elapsed)
+        if self.at.exception:
+            self.errors.append(f"{action or 'load'}: {self.at.exception[0].value}")
+        return elapsed
+
+    def load(self):
+        """Upload the report and rerun until it has finished parsing."""
+        self.at.session_state["_loadtest_report"] = self.report_path
+        start = time.perf_counter()
+        self._run()
+        while "parse_job" in self.at.session_state:
+            time.sleep(0.05)
+            self._run()
+        self.load_seconds = time.perf_counter() - start
+
+    def _button(self, label: str):
+        return next(b for b in self.at.sidebar.button if b.label == label)
+
+    def step(self):
+        at = self.at
+        action = self.rng.choices(ACTIONS, ACTION_WEIGHTS)[0]
+        if action == "next":
+            self._button("▶").click()
+        elif action == "prev":
+            self._button("◀").click()
+        elif action == "level":
+            level = next((r for r in at.radio if (r.key or "").startswith("level_view_")), None)
+            if level is None or len(level.options) < 2:
+                action = "next"
+                self._button("▶").click()
+            else:
+                level.set_value(self.rng.choice([o for o in level.options if o != level.value]))
+        elif action == "view":
+            view = next(r for r in at.sidebar.radio if r.label == "View")
+            view.set_value(self.rng.choice(["Cohort analytics", "Snapshot changes"]))
+            self._run(action)
+            view = next(r for r in at.sidebar.radio if r.label == "View")
+            view.set_value("Student records")
+        else:
+            code = next(t for t in at.sidebar.text_input if (t.key or "").startswith("code_"))
+            code.input(self.rng.choice(ANNOTATION_CODES))
+            self._run(action)
+            comment = next(t for t in at.sidebar.text_area if (t.key or "").startswith("comment_"))
+            comment.input(f"Reviewed in load test ({self.rng.randrange(1000)})")
+        self._run(action)
+
+
+def _quiet_streamlit():
+    from streamlit import config
+    from streamlit import logger as streamlit_logger
+
+    # Reading a session's state between reruns warns about the missing script
+    # context; parse the config first, or parsing it resets the level
+    config.get_option("logger.level")
+    config.set_option("logger.level", "error")
+    streamlit_logger.set_log_level("error")
+
+
+def run_load_test(sessions: int, steps: int, reports: list[str], think: float = 0.0,
+                  timeout: float = 300.0, seed: int = 0) -> dict:
+    """Drive ``sessions`` reviewers concurrently for ``steps`` interactions each.
+
+    Memory is measured as growth of this process, so run each load test in
+    a fresh process (as ``main`` does) for comparable figures.
+    """
+    _quiet_streamlit()
+    install_upload_stub()
+    with shared_test_runtime():
+        # A session without a report first, so module imports and the
+        # requirements load are not counted against the sessions under test
+        Reviewer(None, seed, timeout)._run()
+        reviewers = [Reviewer(reports[i % len(reports)], seed + i, timeout) for i in range(sessions)]
+        rss_start = _rss_bytes()
+        shared_start = default_store().stats()["bytes"]
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        barrier = threading.Barrier(sessions)
+
+        def _drive(reviewer: Reviewer):
+            try:
+                barrier.wait()
+                reviewer.load()
+                # Interactions start once every session has its report
+                barrier.wait()
+                for _ in range(steps):
+                    reviewer.step()
+                    if think:
+                        time.sleep(reviewer.rng.uniform(0, 2 * think))
+            except Exception as e:
+                barrier.abort()
+                reviewer.errors.append(f"{type(e).__name__}: {e}")
+
+        threads = [threading.Thread(target=_drive, args=(r,), name=f"reviewer-{i}") for i, r in enumerate(reviewers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    rss_end = _rss_bytes()
+
+    shared_bytes = default_store().stats()["bytes"]
+    all_latencies = [x for r in reviewers for lat in r.latencies.values() for x in lat]
+    loads = [r.load_seconds for r in reviewers if r.load_seconds is not None]
+    return {
+        "sessions": sessions,
+        "steps": steps,
+        "reports": [os.path.basename(p) for p in reports],
+        "wall_s": round(wall, 2),
+        "cpu_s": round(cpu, 2),
+        # Share of one core used over the run
+        "cpu_util_pct": round(100 * cpu / wall, 1) if wall else None,
+        "reruns_per_s": round(len(all_latencies) / wall, 2) if wall else None,
+        "rerun": _summary(all_latencies),
+        "actions": {a: _summary([x for r in reviewers for x in r.latencies[a]]) for a in ACTIONS},
+        "first_page_s": {
+            "p50": round(statistics.median(loads), 2) if loads else None,
+            "max": round(max(loads), 2) if loads else None,
+        },
+        "shared_reports_mib": round(shared_bytes / 2**20, 2),
+        "rss_start_mib": round(rss_start / 2**20, 1),
+        "rss_end_mib": round(rss_end / 2**20, 1),
+        # Growth over the run, less the reports the sessions share
+        "rss_per_session_mib": round(max(0, rss_end - rss_start - (shared_bytes - shared_start)) / sessions / 2**20, 2),
+        "session_state_kib": round(statistics.mean(session_state_bytes(r.at) for r in reviewers) / 1024, 1),
+        "errors": [e for r in reviewers for e in r.errors],
+    }
+
+
+def _print_result(r: dict):
+    print(f"{r['sessions']} sessions x {r['steps']} interactions over {', '.join(r['reports'])}")
+    print(f"  wall {r['wall_s']} s, CPU {r['cpu_s']} s ({r['cpu_util_pct']}% of one core), {r['reruns_per_s']} reruns/s")
+    print(f"  first page: p50 {r['first_page_s']['p50']} s, max {r['first_page_s']['max']} s")
+    print(f"  {'interaction':<12} {'reruns':>7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for name, s in [("all", r["rerun"]), *r["actions"].items()]:
+        print(f"  {name:<12} {s['reruns']:>7} {s['p50_ms']!s:>8} {s['p95_ms']!s:>8} {s['max_ms']!s:>8}")
+    print(f"  memory: {r['shared_reports_mib']} MiB shared reports, {r['rss_per_session_mib']} MiB RSS "
+          f"and {r['session_state_kib']} KiB session state per session "
+          f"(RSS {r['rss_start_mib']} -> {r['rss_end_mib']} MiB)")
+    for e in r["errors"][:10]:
+        print(f"  error: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent reviewers against the app.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[4],
+                        help="Concurrent sessions (several values run one load test each)")
+    parser.add_argument("--steps", type=int, default=20, help="Interactions per session after the upload")
+    parser.add_argument("--reports", nargs="+", default=None, metavar="REPORT",
+                        help="Reports to upload, assigned to sessions in turn (default: the bundled reports)")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean pause between interactions, seconds")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-rerun timeout, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    reports = args.reports or [os.path.join(HERE, name) for name in BUNDLED_REPORTS if os.path.exists(os.path.join(HERE, name))]
+    if not reports:
+        parser.error("no reports to upload")
+    results = []
+    # A fresh process per load test, so memory freed by one run doesn't hide the next one's growth
+    ctx = multiprocessing.get_context("spawn")
+    for n in args.sessions:
+        with ctx.Pool(1) as pool:
+            r = pool.apply(run_load_test, (n, args.steps, reports, args.think, args.timeout, args.seed))
+        _print_result(r)
+        results.append(r)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
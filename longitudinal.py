@@ -0,0 +1,210 @@
+"""Merge and diff successive snapshots of the same cohort.
+
+Each student is keyed by campus ID (falling back to EmplID) and
+fingerprinted from a canonical dump of their years, courses and summary.
+Students whose fingerprint did not change between two snapshots are
+skipped outright, and diffs are memoized on the (old, new) fingerprint
+pair, so a run over several years of snapshots only does work for the
+students that actually changed.
+"""
+import hashlib
+import json
+from collections.abc import Mapping
+
+from records import _clean_code, _is_fail_course
+
+FINGERPRINT_FIELDS = ("prgm", "plan", "level_start", "level_end", "finalist", "years", "summary")
+
+
+def student_key(student: dict) -> str:
+    return (student.get("campus_id") or student.get("emplid") or "").strip().upper()
+
+
+def _json_default(value):
+    # Course entries are records.CourseResult mappings
+    return dict(value) if isinstance(value, Mapping) else str(value)
+
+
+def student_fingerprint(student: dict) -> str:
+    payload = {k: student.get(k) for k in FINGERPRINT_FIELDS}
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=_json_default)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def make_snapshot(label: str, students: list[dict]) -> dict:
+    """Index one parsed report by student key with per-student fingerprints."""
+    by_key = {}
+    for s in students:
+        key = student_key(s)
+        if key:
+            by_key[key] = s
+    return {
+        "label": label,
+        "students": by_key,
+        "hashes": {key: student_fingerprint(s) for key, s in by_key.items()},
+    }
+
+
+def _attempts(student: dict) -> dict[tuple, dict]:
+    # One entry per (year, term, code); later duplicates in the same term win
+    out = {}
+    for yr in student.get("years", []):
+        for c in yr.get("courses", []):
+            code = _clean_code(c.get("code"))
+            if code:
+                out[(yr.get("year"), yr.get("term", ""), code)] = c
+    return out
+
+
+def _same_value(a, b) -> bool:
+    # Summary counts are exported as "20" in one run and "20.00" in another
+    if a == b:
+        return True
+    try:
+        return float(str(a).rstrip(";")) == float(str(b).rstrip(";"))
+    except (TypeError, ValueError):
+        return False
+
+
+def _standings(student: dict) -> dict[tuple, str]:
+    return {(yr.get("year"), yr.get("term", "")): yr.get("standing", "") for yr in student.get("years", [])}
+
+
+def diff_student(old: dict, new: dict) -> dict:
+    """Course, standing and summary changes from one snapshot of a student to the next."""
+    old_attempts = _attempts(old)
+    new_attempts = _attempts(new)
+    new_fails, new_passes, changed_results = [], [], []
+    for key, c in new_attempts.items():
+        year, term, code = key
+        entry = {"year": year, "term": term, "code": code, "result": c.get("result", ""), "symbol": c.get("symbol", "")}
+        prev = old_attempts.get(key)
+        failed = _is_fail_course(c)
+        if prev is None:
+            (new_fails if failed else new_passes).append(entry)
+            continue
+        if (prev.get("result"), prev.get("symbol")) == (c.get("result"), c.get("symbol")):
+            continue
+        was_failed = _is_fail_course(prev)
+        if failed and not was_failed:
+            new_fails.append(entry)
+        elif was_failed and not failed:
+            new_passes.append(entry)
+        else:
+            changed_results.append({**entry, "old_result": prev.get("result", ""), "old_symbol": prev.get("symbol", "")})
+    removed = [
+        {"year": year, "term": term, "code": code}
+        for (year, term, code) in old_attempts.keys() - new_attempts.keys()
+    ]
+
+    old_standing = _standings(old)
+    standing_changes = []
+    for key, standing in _standings(new).items():
+        before = old_standing.get(key)
+        if before != standing and (before or standing):
+            standing_changes.append({"year": key[0], "term": key[1], "old": before or "", "new": standing})
+
+    old_summary = old.get("summary", {}) or {}
+    new_summary = new.get("summary", {}) or {}
+    summary_changes = {
+        k: (old_summary.get(k, ""), new_summary.get(k, ""))
+        for k in old_summary.keys() | new_summary.keys()
+        if not _same_value(old_summary.get(k, ""), new_summary.get(k, ""))
+    }
+    return {
+        "new_fails": new_fails,
+        "new_passes": new_passes,
+        "changed_results": changed_results,
+        "removed_attempts": removed,
+        "standing_changes": standing_changes,
+        "summary_changes": summary_changes,
+    }
+
+
+def diff_snapshots(old: dict, new: dict, cache: dict | None = None) -> dict:
+    """Diff two snapshots; only students with a changed fingerprint are compared.
+
+    ``cache`` maps (old hash, new hash) to a student diff and can be shared
+    across calls to avoid recomputing identical pairs.
+    """
+    cache = {} if cache is None else cache
+    old_hashes, new_hashes = old["hashes"], new["hashes"]
+    changed = {}
+    for key, new_hash in new_hashes.items():
+        old_hash = old_hashes.get(key)
+        if old_hash is None or old_hash == new_hash:
+            continue
+        pair = (old_hash, new_hash)
+        result = cache.get(pair)
+        if result is None:
+            result = cache[pair] = diff_student(old["students"][key], new["students"][key])
+        changed[key] = result
+    return {
+        "from": old["label"],
+        "to": new["label"],
+        "added": sorted(new_hashes.keys() - old_hashes.keys()),
+        "removed": sorted(old_hashes.keys() - new_hashes.keys()),
+        "unchanged": sum(1 for k, h in new_hashes.items() if old_hashes.get(k) == h),
+        "changed": changed,
+    }
+
+
+def merge_snapshots(snapshots: list[dict]) -> dict:
+    """Fold snapshots (oldest first) into a latest-record view plus per-step diffs."""
+    latest: dict[str, dict] = {}
+    first_seen: dict[str, str] = {}
+    last_seen: dict[str, str] = {}
+    steps = []
+    cache: dict = {}
+    for prev, snap in zip([None] + snapshots[:-1], snapshots):
+        for key, s in snap["students"].items():
+            latest[key] = s
+            first_seen.setdefault(key, snap["label"])
+            last_seen[key] = snap["label"]
+        if prev is not None:
+            steps.append(diff_snapshots(prev, snap, cache))
+    return {"students": latest, "first_seen": first_seen, "last_seen": last_seen, "diffs": steps}
+
+
+def carry_annotations(snapshots: list[dict], annotations: dict | None = None) -> dict[str, dict]:
+    """Latest non-empty annotation per student across snapshots (oldest first).
+
+    Codes/comments stored in the report rows are used first, then
+    ``annotations`` (campus ID -> {"code", "comment"}) overrides them.
+    """
+    carried: dict[str, dict] = {}
+    for snap in snapshots:
+        for key, s in snap["students"].items():
+            code = (s.get("annotation_code") or "").strip()
+            comment = (s.get("annotation_comment") or "").strip()
+            if code or comment:
+                carried[key] = {"code": code, "comment": comment}
+    for campus_id, ann in (annotations or {}).items():
+        if ann.get("code") or ann.get("comment"):
+            carried[campus_id.strip().upper()] = dict(ann)
+    return carried
+
+
+def diff_rows(diff: dict, students: dict[str, dict]) -> list[dict]:
+    """Flatten a snapshot diff into one display row per changed student."""
+    def fmt(items):
+        return ", ".join(f"{i['code']} ({i['result'] or i['symbol']})" for i in items)
+
+    rows = []
+    for key, d in diff["changed"].items():
+        if not any(d.values()):
+            continue
+        s = students.get(key, {})
+        rows.append({
+            "Campus ID": key,
+            "Name": s.get("name", ""),
+            "New fails": fmt(d["new_fails"]),
+            "New passes": fmt(d["new_passes"]),
+            "Changed results": ", ".join(
+                f"{c['code']} ({c['old_result'] or c['old_symbol']} -> {c['result'] or c['symbol']})" for c in d["changed_results"]
+            ),
+            "Removed attempts": ", ".join(f"{c['code']} ({c['year']}{c['term']})" for c in d["removed_attempts"]),
+            "Standing": ", ".join(f"{c['year']}{c['term']}: {c['old'] or '-'} -> {c['new'] or '-'}" for c in d["standing_changes"]),
+            "Summary": ", ".join(f"{k}: {a or '-'} -> {b or '-'}" for k, (a, b) in sorted(d["summary_changes"].items())),
+        })
+    return rows
@@ -0,0 +1,197 @@
+"""Background parsing of uploaded reports.
+
+Parsing a large report inside the Streamlit script freezes the page, and
+a rerun during the parse starts it again. Here each report hash is
+parsed at most once at a time on a worker thread: sessions that upload
+the same file while it is being parsed share the running job. Students
+are appended to the job as they are parsed, so the first ones can be
+browsed before the parse finishes. A job is cancelled once no session is
+waiting for it (e.g. every session that wanted it uploaded another file).
+"""
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from course_index import CourseIndex
+from ingest import iter_parsed_blocks
+from records import ParseDiagnostics
+
+DEFAULT_WORKERS = 2
+
+
+class ParseCancelled(Exception):
+    pass
+
+
+class ParseJob:
+    """Progress and partial results of parsing one report."""
+
+    def __init__(self, key: str, source, cache: dict | None = None, previous_diagnostics: ParseDiagnostics | None = None):
+        self.key = key
+        self.source = source
+        self.cache = cache
+        # Issues in the blocks reused from ``cache`` come from the diagnostics of its parse
+        self.diagnostics = ParseDiagnostics(previous_diagnostics)
+        self.total_rows = source.total_rows
+        self.rows = 0
+        self.students: list[dict] = []
+        self.block_hashes: list[str] = []
+        self.course_index = CourseIndex()
+        self.reused = 0
+        self.error: BaseException | None = None
+        self.done = threading.Event()
+        self._cancel = threading.Event()
+        self.waiters = 0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def _lines(self):
+        for line in self.source.lines(self.diagnostics):
+            if self._cancel.is_set():
+                raise ParseCancelled(self.key)
+            self.rows += 1
+            yield line
+
+    def run(self):
+        try:
+            for student, h, reused in iter_parsed_blocks(self._lines(), self.cache, self.diagnostics):
+                self.block_hashes.append(h)
+                self.course_index.add(len(self.students), student)
+                self.students.append(student)
+                self.reused += reused
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.cache = None
+            self.diagnostics.previous = None
+            self.done.set()
+
+    def result(self) -> dict:
+        """Loader result for the report store once the job has finished."""
+        if self.error is not None:
+            raise self.error
+        return {
+            "students": self.students,
+            "block_hashes": self.block_hashes,
+            "source": self.source,
+            "course_index": self.course_index,
+            "diagnostics": self.diagnostics,
+        }
+
+    def progress(self) -> dict:
+        return {
+            "rows": self.rows,
+            "total_rows": self.total_rows,
+            "students": len(self.students),
+            "reused": self.reused,
+            "issues": self.diagnostics.total,
+            "done": self.done.is_set(),
+            "error": None if self.error is None else str(self.error),
+        }
+
+
+class ParseHandle:
+    """A session's interest in a parse job; the job is cancelled when the last handle goes."""
+
+    def __init__(self, jobs: "ParseJobs", job: ParseJob):
+        self.job = job
+        self._finalizer = weakref.finalize(self, jobs._release, job)
+
+    # The same attributes as a report handle, so partial results can be browsed
+    @property
+    def key(self) -> str:
+        return self.job.key
+
+    @property
+    def students(self) -> list[dict]:
+        # A snapshot while parsing, so one script run sees a stable list
+        return self.job.students if self.done else self.job.students[:]
+
+    @property
+    def block_hashes(self) -> list[str]:
+        return self.job.block_hashes
+
+    @property
+    def source(self):
+        return self.job.source
+
+    @property
+    def course_index(self):
+        # Only complete once the parse is done
+        return self.job.course_index if self.done else None
+
+    @property
+    def diagnostics(self):
+        return self.job.diagnostics
+
+    @property
+    def done(self) -> bool:
+        return self.job.done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self.job.done.wait(timeout)
+
+    def progress(self) -> dict:
+        return self.job.progress()
+
+    def release(self):
+        self._finalizer()
+
+
+class ParseJobs:
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        self._lock = threading.Lock()
+        self._jobs: dict[str, ParseJob] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse")
+        self.started = 0
+        self.joined = 0
+        self.cancelled = 0
+
+    def start(self, source, cache: dict | None = None, previous_diagnostics=None) -> ParseHandle:
+        """Handle to the running parse of ``source.key``, starting one if there is none."""
+        key = source.key
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.cancelled or job.error is not None:
+                job = self._jobs[key] = ParseJob(key, source, cache, previous_diagnostics)
+                self._executor.submit(job.run)
+                self.started += 1
+            else:
+                self.joined += 1
+            job.waiters += 1
+            return ParseHandle(self, job)
+
+    def _release(self, job: ParseJob):
+        with self._lock:
+            job.waiters -= 1
+            if job.waiters > 0:
+                return
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+            if not job.done.is_set():
+                job._cancel.set()
+                self.cancelled += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": sum(1 for j in self._jobs.values() if not j.done.is_set()),
+                "started": self.started,
+                "joined": self.joined,
+                "cancelled": self.cancelled,
+            }
+
+
+_default_jobs = None
+_default_lock = threading.Lock()
+
+
+def default_jobs() -> ParseJobs:
+    """The parse workers shared by every session in this process."""
+    global _default_jobs
+    with _default_lock:
+        if _default_jobs is None:
+            _default_jobs = ParseJobs()
+        return _default_jobs
@@ -0,0 +1,164 @@
+"""Background prefetch of student view models.
+
+Reviewers page through a report almost strictly in order, so after each
+render the app queues the view models (insights, requirement status and
+table rows) of the next and previous few students on a small thread
+pool. A bounded LRU cache holds the results; when the page asks for a
+model whose build is already in flight it waits for that build instead
+of starting a second one. Queued builds for students the reviewer has
+moved away from are cancelled before they start. ``invalidate`` drops the
+models a change made stale (e.g. reloaded programme requirements) and
+discards builds that were in flight when it happened.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CAPACITY = 256
+DEFAULT_WORKERS = 2
+PREFETCH_AHEAD = 3
+PREFETCH_BEHIND = 2
+
+
+def neighbour_indices(index: int, count: int, ahead: int = PREFETCH_AHEAD, behind: int = PREFETCH_BEHIND) -> list[int]:
+    """Indices to prefetch around ``index``, nearest (and forward) first."""
+    out = []
+    for step in range(1, max(ahead, behind) + 1):
+        if step <= ahead and index + step < count:
+            out.append(index + step)
+        if step <= behind and index - step >= 0:
+            out.append(index - step)
+    return out
+
+
+class ViewModelCache:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, workers: int = DEFAULT_WORKERS):
+        self.capacity = capacity
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._models: OrderedDict = OrderedDict()
+        self._pending: dict = {}
+        self._executor = None
+        # Bumped by invalidate(); builds started before it are not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.invalidated = 0
+
+    def get(self, key, build):
+        """Cached model for ``key``; waits for an in-flight prefetch or calls ``build()``."""
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+            future, _ = self._pending.get(key, (None, None))
+        if future is not None and future.cancel():
+            with self._lock:
+                self._pending.pop(key, None)
+        elif future is not None:
+            try:
+                model = future.result()
+            except Exception:
+                model = None
+            if model is not None:
+                with self._lock:
+                    self.hits += 1
+                return model
+        with self._lock:
+            self.misses += 1
+            generation = self._generation
+        model = build()
+        with self._lock:
+            if generation == self._generation:
+                self._store(key, model)
+        return model
+
+    def prefetch(self, jobs, owner=None):
+        """Queue ``(key, build)`` jobs, cancelling ``owner``'s queued jobs not in this batch.
+
+        ``owner`` identifies the session, so one reviewer moving on does not
+        cancel another reviewer's prefetches.
+        """
+        jobs = list(jobs)
+        wanted = {key for key, _ in jobs}
+        with self._lock:
+            for key, (future, job_owner) in list(self._pending.items()):
+                if job_owner == owner and key not in wanted and future.cancel():
+                    del self._pending[key]
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+            for key, build in jobs:
+                if key in self._models or key in self._pending:
+                    continue
+                self._pending[key] = (self._executor.submit(self._run, key, build, self._generation), owner)
+
+    def _run(self, key, build, generation):
+        try:
+            model = build()
+        except Exception:
+            with self._lock:
+                self._pending.pop(key, None)
+            raise
+        with self._lock:
+            if generation != self._generation:
+                # Built from data invalidated meanwhile; its pending entry is already gone
+                return None
+            self._store(key, model)
+            self._pending.pop(key, None)
+            self.prefetched += 1
+        return model
+
+    def _store(self, key, model):
+        # Caller holds self._lock
+        self._models[key] = model
+        self._models.move_to_end(key)
+        while len(self._models) > self.capacity:
+            self._models.popitem(last=False)
+
+    def invalidate(self, stale) -> int:
+        """Drop cached models for which ``stale(key, model)`` is true; returns how many.
+
+        Queued and running builds may have read the old data, so they are
+        cancelled or discarded whatever their key.
+        """
+        with self._lock:
+            self._generation += 1
+            for future, _ in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            keys = [key for key, model in self._models.items() if stale(key, model)]
+            for key in keys:
+                del self._models[key]
+            self.invalidated += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "models": len(self._models),
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "prefetched": self.prefetched,
+                "invalidated": self.invalidated,
+            }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> ViewModelCache:
+    """The view-model cache shared by every session in this process."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ViewModelCache()
+        return _default_cache
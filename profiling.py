@@ -0,0 +1,141 @@
+"""Opt-in hot-path timers, counters and memory estimates.
+
+A disabled profiler hands out one shared no-op context manager, so the
+instrumentation left in the app costs a method call per phase when
+profiling is off. Enable it with ``RECORDSORTER_PROFILE=1`` or by opening
+the app with ``?debug=1``.
+
+Library code that cannot see the session (e.g. the body of a cached
+function, which only runs on a cache miss) uses the module-level
+``phase``/``count`` helpers; they resolve the profiler activated for the
+current script run.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+logger = logging.getLogger("recordsorter.profile")
+
+_NULL_PHASE = nullcontext()
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        entry = self.profiler.timings.setdefault(self.name, [0.0, 0])
+        entry[0] += elapsed
+        entry[1] += 1
+        return False
+
+
+class Profiler:
+    """Phase timings and counters for one script run of one session."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.timings: dict[str, list] = {}  # name -> [total seconds, calls]
+        self.counters: Counter = Counter()
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def reset(self):
+        self.timings = {}
+        self.counters = Counter()
+
+    def snapshot(self) -> dict:
+        return {
+            "timings_ms": {k: round(v[0] * 1000, 3) for k, v in self.timings.items()},
+            "calls": {k: v[1] for k, v in self.timings.items()},
+            "counters": dict(self.counters),
+        }
+
+
+DISABLED = Profiler(enabled=False)
+_current: ContextVar[Profiler] = ContextVar("recordsorter_profiler", default=DISABLED)
+
+
+def env_enabled() -> bool:
+    return os.environ.get("RECORDSORTER_PROFILE", "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+@contextmanager
+def activated(profiler: Profiler):
+    token = _current.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _current.reset(token)
+
+
+def current() -> Profiler:
+    return _current.get()
+
+
+def phase(name: str):
+    return _current.get().phase(name)
+
+
+def count(name: str, n: int = 1):
+    _current.get().count(name, n)
+
+
+def estimate_size(obj, _seen: set | None = None) -> int:
+    """Approximate deep size in bytes of nested dict/list/str structures (and ``__slots__`` objects)."""
+    seen = set() if _seen is None else _seen
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        oid = id(o)
+        if oid in seen:
+            continue
+        seen.add(oid)
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(type(o), "__slots__"):
+            stack.extend(getattr(o, name) for name in type(o).__slots__ if hasattr(o, name))
+    return total
+
+
+def _ensure_handler():
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def log_run(profiler: Profiler, **extra):
+    """Emit one structured JSON log line for the finished script run."""
+    if not profiler.enabled:
+        return
+    _ensure_handler()
+    record = {"event": "rerun", **profiler.snapshot(), **extra}
+    logger.info(json.dumps(record, default=str))
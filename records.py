@@ -0,0 +1,767 @@
+"""Parsing and per-student derivations for CB015/CB024 course results reports.
+
+Nothing in here depends on Streamlit so the same code can be shared by the
+app, batch tools and analytics.
+"""
+import codecs
+import os
+import re
+import csv
+import sys
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+import pandas as pd
+
+
+CAMPUS_ID_RE = re.compile(r"^[A-Za-z]{6}\d{3}$")
+
+
+def _is_header_line(line: str) -> bool:
+    s = line.strip()
+    if not s:
+        return True
+    if s.startswith((
+        "TEST",
+        "COURSE RESULTS",
+        "Career",
+        "Degree",
+        "Programme:",
+        "Attributes",
+        "Term,",
+        "Course,",
+    )):
+        return True
+    if set(s) <= set("-= "):
+        return True
+    return False
+
+
+# Course code -> title, shared by every parsed course entry in the process
+COURSE_TITLES: dict[str, str] = {}
+COURSE_FIELDS = ("code", "result", "symbol", "units_attempted", "units_earned", "title")
+
+
+class CourseResult(Mapping):
+    """One course attempt, read like the dict the parser used to build.
+
+    Strings are interned, and the title is looked up in ``COURSE_TITLES``
+    unless this entry's title differs from the catalogue's.
+    """
+
+    __slots__ = ("code", "result", "symbol", "units_attempted", "units_earned", "_title")
+
+    def __init__(self, code: str, result: str = "", symbol: str = "", units_attempted: str = "",
+                 units_earned: str = "", title: str = ""):
+        intern = sys.intern
+        self.code = intern(code)
+        self.result = intern(result)
+        self.symbol = intern(symbol)
+        self.units_attempted = intern(units_attempted)
+        self.units_earned = intern(units_earned)
+        known = COURSE_TITLES.setdefault(self.code, intern(title))
+        self._title = None if known == title else intern(title)
+
+    @property
+    def title(self) -> str:
+        return COURSE_TITLES.get(self.code, "") if self._title is None else self._title
+
+    def __getitem__(self, key):
+        if key in COURSE_FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(COURSE_FIELDS)
+
+    def __len__(self):
+        return len(COURSE_FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __reduce__(self):
+        # Carry the title, so entries unpickled in another process need no catalogue
+        return (CourseResult, tuple(getattr(self, f) for f in COURSE_FIELDS))
+
+
+def _parse_course_segment(seg: list[str]):
+    if not seg or not seg[0]:
+        return None
+    n = len(seg)
+    return CourseResult(
+        seg[0],
+        seg[1] if n > 1 else "",
+        seg[2] if n > 2 else "",
+        seg[3] if n > 3 else "",
+        seg[4] if n > 4 else "",
+        seg[5] if n > 5 else "",
+    )
+
+
+def _row_parts(row: list[str]) -> list[str]:
+    # Handle malformed rows where entire content is in one field starting with
+    # comma, possibly padded with empty fields
+    if row and row[0].startswith(',') and not any(row[1:]):
+        # Re-parse this single field as CSV
+        parts = list(csv.reader([row[0]]))[0]
+        return [p.strip() for p in parts]
+    return [p.strip() for p in row]
+
+
+# Data the parse lost, and rows it read by heuristic (normal in some export layouts)
+LOST_ISSUES = {
+    "decode_error": "Undecodable byte sequences",
+    "course_without_term": "Course rows before any term",
+    "empty_course_row": "Course rows without a course code",
+    "outside_student": "Rows outside any student",
+    "unrecognised_row": "Unrecognised rows",
+}
+HEURISTIC_ISSUES = {
+    "malformed_row": "Single-field rows re-parsed as CSV",
+    "split_name": "Unquoted names read across two columns",
+    "specialization": "Rows with several fields read as a specialisation",
+}
+PARSE_ISSUES = {**LOST_ISSUES, **HEURISTIC_ISSUES}
+SAMPLE_LIMIT = 5
+SAMPLE_CHARS = 160
+
+
+class ParseDiagnostics:
+    """Counts and capped samples of the rows a parse dropped or reinterpreted.
+
+    Filled in the same pass as the parse: the parser only reaches
+    ``record`` on the rows in question. Counts from each student block are
+    also kept by block fingerprint (``block``), so an incremental re-parse
+    that reuses a block can carry its counts over (``previous``).
+    """
+
+    def __init__(self, previous: "ParseDiagnostics | None" = None, sample_limit: int = SAMPLE_LIMIT):
+        self.counts: dict[str, int] = {}
+        self.samples: dict[str, list[dict]] = {}
+        self.sample_limit = sample_limit
+        self.block: str | None = None
+        self.blocks: dict[str, dict[str, int]] = {}
+        self.previous = previous
+
+    def record(self, kind: str, row, campus_id: str = ""):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        if self.block is not None:
+            block = self.blocks.setdefault(self.block, {})
+            block[kind] = block.get(kind, 0) + 1
+        samples = self.samples.setdefault(kind, [])
+        if len(samples) < self.sample_limit:
+            text = row if isinstance(row, str) else ",".join(row)
+            samples.append({"campus_id": campus_id, "row": text[:SAMPLE_CHARS], "block": self.block})
+
+    def reuse(self, block: str):
+        """Count a block reused from the previous parse as if it had been parsed again."""
+        previous = self.previous
+        counts = previous.blocks.get(block) if previous is not None else None
+        if not counts:
+            return
+        self.blocks[block] = dict(counts)
+        for kind, n in counts.items():
+            self.counts[kind] = self.counts.get(kind, 0) + n
+            samples = self.samples.setdefault(kind, [])
+            for sample in previous.samples.get(kind, ()):
+                if len(samples) >= self.sample_limit:
+                    break
+                if sample["block"] == block:
+                    samples.append(sample)
+
+    @property
+    def total(self) -> int:
+        """Issues that lost data (``LOST_ISSUES``)."""
+        return sum(n for kind, n in self.counts.items() if kind in LOST_ISSUES)
+
+    @property
+    def heuristic(self) -> int:
+        """Rows read by heuristic (``HEURISTIC_ISSUES``)."""
+        return sum(n for kind, n in self.counts.items() if kind not in LOST_ISSUES)
+
+    def summary(self, lost: bool | None = None) -> list[dict]:
+        """``{"kind", "label", "lost", "count", "samples"}`` for each issue seen, in ``PARSE_ISSUES`` order.
+
+        ``lost`` limits it to the issues that lost data (True) or to the heuristics (False).
+        """
+        order = {kind: i for i, kind in enumerate(PARSE_ISSUES)}
+        return [
+            {
+                "kind": kind,
+                "label": PARSE_ISSUES.get(kind, kind),
+                "lost": kind in LOST_ISSUES,
+                "count": n,
+                "samples": [{"campus_id": x["campus_id"], "row": x["row"]} for x in self.samples.get(kind, ())],
+            }
+            for kind, n in sorted(self.counts.items(), key=lambda kv: order.get(kv[0], len(order)))
+            if lost is None or (kind in LOST_ISSUES) == lost
+        ]
+
+
+# Decoding with errors=DECODE_ERRORS drops undecodable bytes like
+# errors="ignore", counting them in the diagnostics of the thread's parse
+DECODE_ERRORS = "recordsorter-ignore"
+_decoding = threading.local()
+
+
+def _drop_decode_error(e: UnicodeDecodeError):
+    diagnostics = getattr(_decoding, "diagnostics", None)
+    if diagnostics is not None:
+        # The rest of the line around the bytes, as far as this chunk of the file goes
+        data = bytes(e.object)
+        start = data.rfind(b"\n", 0, e.start) + 1
+        end = data.find(b"\n", e.end)
+        line = data[start:end if end != -1 else len(data)].rstrip(b"\r")
+        diagnostics.record("decode_error", line.decode("utf-8", errors="replace"))
+    return "", e.end
+
+
+codecs.register_error(DECODE_ERRORS, _drop_decode_error)
+
+
+@contextmanager
+def counting_decode_errors(diagnostics: ParseDiagnostics | None):
+    """Count what DECODE_ERRORS drops in this thread into ``diagnostics``."""
+    previous = getattr(_decoding, "diagnostics", None)
+    _decoding.diagnostics = diagnostics
+    try:
+        yield
+    finally:
+        _decoding.diagnostics = previous
+
+
+# Report layouts. Each column-header row maps to the data columns it
+# describes: (header label, fields of the data columns under it), in the
+# order the report prints them. None marks an unlabelled data column.
+STUDENT_COLUMNS = (
+    ("name", ("name",)),
+    ("campus id", ("campus_id",)),
+    ("emplid", ("emplid",)),
+    # Printed as "CB015,/,CB015BUS07,0"
+    ("prgm", ("prgm", None)),
+    ("plan", ("plan", None)),
+    ("level-start", ("level_start",)),
+    ("level-end", ("level_end",)),
+    ("finalist?", ("finalist",)),
+)
+TERM_COLUMNS = (
+    ("term", ("year", "term")),
+    ("programme", ("program", "degree")),
+    ("acad level", ("acad_level",)),
+    ("standng", ("standing",)),
+    ("majors/specialisations", ("plan", None, None, None, None)),
+    ("jt", ("jt",)),
+    ("je", ("je",)),
+    ("st", ("st",)),
+    ("se", ("se",)),
+    ("tt", ("tt",)),
+    ("te", ("te",)),
+    ("ce", ("ce",)),
+    ("wghtd", ("wghtd_gpa",)),
+    ("term", ("term_gpa",)),
+    ("cum", ("cum_gpa",)),
+)
+TERM_METRIC_FIELDS = ("jt", "je", "st", "se", "tt", "te", "ce", "wghtd_gpa", "term_gpa", "cum_gpa")
+# Annotation columns are absolute spreadsheet columns (M, and Q/R in older exports)
+ANNOTATION_CODE_COL = 12
+ANNOTATION_CODE_FALLBACK_COL = 16
+ANNOTATION_COMMENT_COL = 17
+
+# Compiled column plans, keyed by header fingerprint
+_COLUMN_PLANS: dict[tuple, dict] = {}
+
+
+def _header_labels(parts: list[str]) -> tuple:
+    labels = [p.strip().rstrip(";").strip().lower() for p in parts]
+    while labels and not labels[-1]:
+        labels.pop()
+    return tuple(labels)
+
+
+def _compile_columns(labels: tuple, known: tuple) -> dict:
+    """Data-column offset of every field, following the header's label order.
+
+    Unknown labels take one column. Known columns missing from the end of
+    the header (some exports truncate it) keep their usual place after the
+    last label.
+    """
+    offsets = {}
+    col = 0
+    pos = 0
+    for label in labels:
+        for i in range(pos, len(known)):
+            if known[i][0] == label:
+                pos = i + 1
+                for name in known[i][1]:
+                    if name:
+                        offsets[name] = col
+                    col += 1
+                break
+        else:
+            col += 1
+    for _, names in known[pos:]:
+        for name in names:
+            if name and name not in offsets:
+                offsets[name] = col
+            col += 1
+    return offsets
+
+
+def column_plan(kind: str, parts: list[str]) -> dict:
+    """Column plan for a ``"student"`` or ``"term"`` header row, compiled once per fingerprint."""
+    key = (kind, _header_labels(parts))
+    plan = _COLUMN_PLANS.get(key)
+    if plan is None:
+        known = STUDENT_COLUMNS if kind == "student" else TERM_COLUMNS
+        plan = {"fingerprint": "|".join(key[1]), "columns": _compile_columns(key[1], known)}
+        if kind == "term":
+            columns = plan["columns"]
+            plan["fields"] = tuple(
+                (name, columns[name], name in TERM_METRIC_FIELDS) for name in columns if name != "year"
+            )
+        _COLUMN_PLANS[key] = plan
+    return plan
+
+
+def new_layout() -> dict:
+    """Parsing state for one report: the standard CB015/CB024 layout until a header says otherwise."""
+    return {
+        "student": column_plan("student", [label for label, _ in STUDENT_COLUMNS]),
+        "term": column_plan("term", [label for label, _ in TERM_COLUMNS]),
+    }
+
+
+def layout_fingerprint(layout: dict) -> str:
+    return layout["student"]["fingerprint"] + "\n" + layout["term"]["fingerprint"]
+
+
+def _update_layout(layout: dict, parts: list[str]) -> bool:
+    """Switch ``layout`` to the plan of a column-header row; False if ``parts`` is not one."""
+    first = parts[0].lower() if parts else ""
+    if first == "term":
+        layout["term"] = column_plan("term", parts)
+        return True
+    if first in ("name", "campus id", "emplid"):
+        layout["student"] = column_plan("student", parts)
+        return True
+    return False
+
+
+def _student_row_shift(parts: list[str], layout: dict):
+    """Columns the name spills over on a student row, or None for any other row.
+
+    Quoted names ("Surname,Given") fill one column; unquoted ones are split
+    over two and push every later column right by one.
+    """
+    if not parts or not parts[0]:
+        return None
+    shift = 0 if "," in parts[0] else 1
+    idx = layout["student"]["columns"]["campus_id"] + shift
+    if idx < len(parts) and CAMPUS_ID_RE.match(parts[idx].upper()):
+        return shift
+    return None
+
+
+def _is_report_furniture(parts: list[str]) -> bool:
+    """Page headers, rules, the student index and other rows with no data in them."""
+    cells = [c for c in (p.rstrip(";").strip() for p in parts) if c]
+    if not cells or all(set(c) <= set("-=_ ") for c in cells):
+        return True
+    first = cells[0]
+    return first.startswith(("Report ID:", "Leave of Absence")) or " ....." in first or "(CONTINUED" in cells[-1]
+
+
+def _parse_from_iter(lines_iter, diagnostics: ParseDiagnostics | None = None):
+    # Use csv.reader to properly handle quoted fields with embedded commas
+    return _parse_rows(csv.reader(lines_iter), diagnostics=diagnostics)
+
+
+def _parse_rows(rows_iter, layout: dict | None = None, diagnostics: ParseDiagnostics | None = None):
+    """Parse CSV rows into students.
+
+    Fields are read at the offsets of ``layout`` (see ``new_layout``), which
+    column-header rows in the input update as they are met. Rows dropped or
+    read by heuristic are counted in ``diagnostics``.
+    """
+    students = []
+    current_student = None
+    current_year = None
+    layout = layout if layout is not None else new_layout()
+    parse_course_segment = _parse_course_segment
+    # Programme, plan, level and term strings repeat across the cohort; keep one copy of each
+    intern = sys.intern
+    record = diagnostics.record if diagnostics is not None else None
+
+    for row in rows_iter:
+        parts = _row_parts(row)
+        line = ",".join(row)
+        if record and row and row[0][:1] == "," and not any(row[1:]):
+            record("malformed_row", line, current_student["campus_id"] if current_student else "")
+
+        if _update_layout(layout, parts):
+            continue
+
+        # Skip non-data lines
+        if _is_header_line(line):
+            continue
+
+        shift = _student_row_shift(parts, layout)
+
+        if shift is not None:
+            if current_student:
+                students.append(current_student)
+            n = len(parts)
+            cols = layout["student"]["columns"]
+            name_idx = cols.get("name", 0)
+            name = ",".join(parts[name_idx:name_idx + shift + 1]).strip('"')
+            fields = {}
+            for field in ("campus_id", "emplid", "prgm", "plan", "level_start", "level_end", "finalist"):
+                idx = cols.get(field)
+                fields[field] = parts[idx + shift] if idx is not None and idx + shift < n else ""
+            for field in ("prgm", "plan", "level_start", "level_end", "finalist"):
+                fields[field] = intern(fields[field])
+            # Prefer annotation code in column M (index 12), fall back to previous Q (index 16)
+            ann_code = ""
+            ann_comment = ""
+            if n > ANNOTATION_CODE_COL and parts[ANNOTATION_CODE_COL]:
+                ann_code = parts[ANNOTATION_CODE_COL]
+            elif n > ANNOTATION_CODE_FALLBACK_COL:
+                ann_code = parts[ANNOTATION_CODE_FALLBACK_COL]
+            if n > ANNOTATION_COMMENT_COL:
+                ann_comment = parts[ANNOTATION_COMMENT_COL]
+
+            current_student = {
+                "name": name,
+                **fields,
+                "annotation_code": ann_code,
+                "annotation_comment": ann_comment,
+                "years": [],
+            }
+            current_year = None
+            if record and shift:
+                record("split_name", line, fields["campus_id"])
+            continue
+
+        year_idx = layout["term"]["columns"]["year"]
+        if len(parts) > year_idx and parts[year_idx].isdigit() and len(parts[year_idx]) == 4:
+            n = len(parts)
+            current_year = {"year": int(parts[year_idx])}
+            for field, idx, is_metric in layout["term"]["fields"]:
+                value = parts[idx] if idx < n else ""
+                # Metrics carry stray semicolons in CB024
+                current_year[field] = intern(value.rstrip(";") if is_metric else value)
+            current_year["courses"] = []
+            if current_student:
+                current_student["years"].append(current_year)
+            continue
+
+        if current_year and parts and parts[0] == "" and len(parts) >= 2 and parts[1]:
+            # Check if this is a specialization line (non-course, usually contains keywords or ends with semicolon)
+            potential_spec = parts[1].rstrip(';').strip()
+            # Heuristic: if parts[1] has no digits or looks like text (keywords), it's specialization
+            if len(parts) <= 3 or (potential_spec and not any(c.isdigit() for c in potential_spec[:10])):
+                if potential_spec and potential_spec not in ['']:
+                    if record and any(p.rstrip(";") for p in parts[2:]):
+                        record("specialization", line, current_student["campus_id"] if current_student else "")
+                    current_year["specialization"] = intern(potential_spec)
+                    # Append specialization to programme if available
+                    if current_year.get("program"):
+                        current_year["program"] = intern(f"{current_year['program']} - {potential_spec}")
+                continue
+
+        if current_year and parts and parts[0] == "":
+            seg1 = parts[1:7]
+            c1 = parse_course_segment(seg1)
+            if c1:
+                current_year["courses"].append(c1)
+            sep_index = -1
+            try:
+                sep_index = parts.index("", 7)
+            except ValueError:
+                sep_index = -1
+            if sep_index != -1:
+                seg2 = parts[sep_index + 1: sep_index + 7]
+                c2 = parse_course_segment(seg2)
+                if c2:
+                    current_year["courses"].append(c2)
+            elif record and not c1 and any(parts):
+                record("empty_course_row", line, current_student["campus_id"] if current_student else "")
+            continue
+
+        if line.startswith("Course Counts"):
+            summary = {}
+            labels = parts
+            i = 1
+            last_norm_label = ""
+            while i < len(labels):
+                label_raw = labels[i].strip()
+                label_norm = label_raw.lower().strip(":")
+                val = labels[i + 1].strip() if i + 1 < len(labels) else ""
+                key = None
+                if label_norm == "passed" and last_norm_label != "latest term: attempted":
+                    key = "total_passed"
+                elif label_norm == "for which units earned":
+                    key = "units_earned"
+                elif label_norm == "senior passed":
+                    key = "senior_passed"
+                elif label_norm == "junior passed":
+                    key = "junior_passed"
+                elif label_norm == "latest term: attempted":
+                    key = "latest_term_attempted"
+                elif label_norm == "passed" and last_norm_label == "latest term: attempted":
+                    key = "latest_term_passed"
+                if key and current_student is not None:
+                    summary[key] = intern(val)
+                last_norm_label = label_norm
+                i += 2
+
+            if current_student is not None and summary:
+                current_student["summary"] = summary
+            if current_student is not None:
+                students.append(current_student)
+            current_student = None
+            current_year = None
+            continue
+
+        if record and not _is_report_furniture(parts):
+            if current_student is None:
+                record("outside_student", line)
+            elif parts[0] == "":
+                record("course_without_term", line, current_student["campus_id"])
+            else:
+                record("unrecognised_row", line, current_student["campus_id"])
+
+    if current_student:
+        students.append(current_student)
+
+    return students
+
+
+def parse_report(file_path: str, diagnostics: ParseDiagnostics | None = None):
+    with open(file_path, "r", encoding="utf-8", errors=DECODE_ERRORS) as f, counting_decode_errors(diagnostics):
+        return _parse_from_iter(f, diagnostics)
+
+
+def parse_report_text(text: str, diagnostics: ParseDiagnostics | None = None):
+    return _parse_from_iter(text.splitlines(), diagnostics)
+
+
+def _normalize_year_label(val: str | int | float | None):
+    if val is None:
+        return None
+    text = str(val).strip()
+    if not text:
+        return None
+    m = re.search(r"year\s*(\d+)", text, re.IGNORECASE)
+    if m:
+        return f"Year {int(m.group(1))}"
+    if text.isdigit():
+        return f"Year {int(text)}"
+    return text
+
+
+def _normalize_acad_level(level: str | None):
+    if not level:
+        return None
+    level_text = level.lower()
+    mapping = {
+        "first": "Year 1",
+        "second": "Year 2",
+        "third": "Year 3",
+        "fourth": "Year 4",
+        "fifth": "Year 5",
+        "sixth": "Year 6",
+    }
+    for key, norm in mapping.items():
+        if key in level_text:
+            return norm
+    m = re.search(r"(\d+)", level_text)
+    if m:
+        return f"Year {int(m.group(1))}"
+    return None
+
+
+def _clean_code(code: str | None):
+    if code is None:
+        return None
+    text = str(code).strip()
+    if not text:
+        return None
+    if text.lower() in {"nan", "none"}:
+        return None
+    return text.upper()
+
+
+def _is_fail_course(course: dict) -> bool:
+    sym = str(course.get("symbol", ""))
+    if "F" in sym:
+        return True
+    res = str(course.get("result", "")).strip()
+    try:
+        if res:
+            return float(res) < 50
+    except ValueError:
+        pass
+    return False
+
+
+def _requirement_options(val) -> list[str]:
+    if val is None or (isinstance(val, float) and pd.isna(val)):
+        return []
+    codes = (_clean_code(c) for c in re.split(r"[\s,;/|]+", str(val)))
+    return [c for c in codes if c]
+
+
+def _choose_count(val, n_options: int) -> int:
+    try:
+        k = int(float(val))
+    except (TypeError, ValueError):
+        return 1
+    return min(max(k, 1), n_options)
+
+
+def read_programme_requirements(path: str):
+    if not os.path.exists(path):
+        return {}, {}
+    try:
+        df = pd.read_csv(path)
+        # Normalize column names to snake_case for flexible CSV headers
+        def _norm(col: str):
+            return str(col).strip().lower().replace(" ", "_").replace("-", "_")
+        df.columns = [_norm(c) for c in df.columns]
+    except Exception:
+        return {}, {}
+
+    index: dict[str, dict[str, list[dict]]] = {}
+    names: dict[str, str] = {}
+    for _, row in df.iterrows():
+        prog = str(
+            row.get("programme_code")
+            or row.get("program_code")
+            or row.get("programme")
+            or row.get("program")
+            or ""
+        ).strip()
+        if not prog:
+            continue
+        year_label = _normalize_year_label(row.get("year"))
+        course_code = _clean_code(row.get("course_code") or row.get("course"))
+        alt_course = _clean_code(row.get("alternative_course") or row.get("alternative"))
+        if not course_code:
+            continue
+        rec = {
+            "course_code": course_code,
+            "alternative_course": alt_course,
+            "programme_name": str(
+                row.get("programme_name")
+                or row.get("program_name")
+                or row.get("programme")
+                or row.get("program")
+                or ""
+            ).strip(),
+            "year_label": year_label,
+        }
+        # "Choose k from" groups: any ``choose`` of the listed ``options`` satisfy the requirement
+        options = _requirement_options(row.get("options"))
+        if options:
+            rec["options"] = options
+            rec["choose"] = _choose_count(row.get("choose"), len(options))
+        index.setdefault(prog, {}).setdefault(year_label, []).append(rec)
+        if prog not in names:
+            names[prog] = rec["programme_name"]
+    return index, names
+
+
+def compute_student_insights(student: dict):
+    """Derive extra summaries: program changes, repeated fails, actual year count, weakest year pass rate."""
+    years = student.get("years", [])
+
+    # Program change tracking
+    program_sequence = []
+    for yr in years:
+        prog = yr.get("program")
+        if prog:
+            program_sequence.append(prog)
+    program_changes = []
+    if program_sequence:
+        last = program_sequence[0]
+        for prog in program_sequence[1:]:
+            if prog != last:
+                program_changes.append(prog)
+            last = prog
+    program_change_count = len(program_changes)
+    # Build display string including initial program if changes exist
+    if program_sequence:
+        first_prog = program_sequence[0]
+    else:
+        first_prog = ""
+    program_change_list = [first_prog] + program_changes if program_change_count else [first_prog] if first_prog else []
+
+    # Fail detection helper
+    def is_fail(course: dict):
+        sym = str(course.get("symbol", ""))
+        if "F" in sym:
+            return True
+        res = str(course.get("result", "")).strip()
+        try:
+            if res:
+                return float(res) < 50
+        except ValueError:
+            pass
+        return False
+
+    # Repeated failed courses
+    fail_attempts = {}
+    for yr in years:
+        for c in yr.get("courses", []):
+            code = c.get("code")
+            if not code:
+                continue
+            if is_fail(c):
+                fail_attempts.setdefault(code, []).append(c)
+    repeated_fails = []
+    for code, attempts in fail_attempts.items():
+        if len(attempts) >= 2:
+            last = attempts[-1]
+            res = str(last.get("result", "")).strip()
+            repeated_fails.append(f"{code} ({res or last.get('symbol','')})")
+
+    # Actual years of study (calendar years with courses)
+    years_with_courses = set()
+    for yr in years:
+        if yr.get("courses"):
+            years_with_courses.add(yr.get("year"))
+    actual_year_number = len(years_with_courses)
+
+    # Weakest year by pass rate (group terms within same calendar year)
+    weakest = None  # (year, passed, attempted, rate)
+    year_stats = {}
+    for yr in years:
+        y = yr.get("year")
+        if y is None:
+            continue
+        for c in yr.get("courses", []):
+            if not c.get("code"):
+                continue
+            stats = year_stats.setdefault(y, {"attempted": 0, "passed": 0})
+            stats["attempted"] += 1
+            if not is_fail(c):
+                stats["passed"] += 1
+    for y, stats in year_stats.items():
+        attempted = stats["attempted"]
+        passed = stats["passed"]
+        if attempted <= 1:
+            continue  # skip trivial years
+        rate = passed / attempted if attempted else 1.0
+        if weakest is None or rate < weakest[3]:
+            weakest = (y, passed, attempted, rate)
+
+    insights = {
+        "program_changes": program_change_count,
+        "program_change_list": program_change_list,
+        "repeated_fails": repeated_fails,
+        "actual_year": actual_year_number,
+        "weakest_year": weakest,
+    }
+    return insights
@@ -0,0 +1,184 @@
+"""Printable per-student report packs, rendered in bulk.
+
+A pack holds what the student page shows: header details, Progress
+Insights, Summary, every level table and the outstanding courses. Packs
+are rendered in chunks on a process pool; each worker reads the
+programme requirements once in its initializer instead of receiving them
+with every task, and the students travel to the workers in chunks.
+
+    python cli.py packs CB015.csv --out packs/ --combined
+"""
+import html
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from records import read_programme_requirements, _clean_code, _is_fail_course
+from student_view import (
+    LEVEL_TABLE_COLUMNS,
+    build_view_model,
+    insight_lines,
+    level_caption,
+    level_metrics,
+    summary_rows,
+)
+
+DEFAULT_CHUNK = 50
+PACK_CSS = """
+body { font-family: system-ui, sans-serif; font-size: 10pt; margin: 1.5em; }
+h1 { font-size: 15pt; margin-bottom: 0.2em; }
+h2 { font-size: 12pt; margin: 1em 0 0.3em; }
+table { border-collapse: collapse; width: 100%; margin-bottom: 0.6em; }
+th, td { border: 1px solid #ccc; padding: 2px 5px; text-align: left; }
+th { background: #f2f2f2; }
+tr.fail td { background-color: #ffe5e5; color: #8b0000; }
+.caption { color: #666; }
+.cols { display: flex; gap: 2em; }
+.cols > div { flex: 1; }
+section.pack { page-break-after: always; }
+"""
+
+
+def _esc(value) -> str:
+    return html.escape("" if value is None else str(value))
+
+
+def _table(columns: list[str], rows: list[list], fail_rows=None) -> str:
+    head = "".join(f"<th>{_esc(c)}</th>" for c in columns)
+    body = []
+    for i, row in enumerate(rows):
+        cls = ' class="fail"' if fail_rows and fail_rows[i] else ""
+        body.append(f"<tr{cls}>" + "".join(f"<td>{_esc(v)}</td>" for v in row) + "</tr>")
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{''.join(body)}</tbody></table>"
+
+
+def render_student_html(student: dict, model: dict, requirement_names: dict) -> str:
+    """One student's pack as an HTML ``<section>``."""
+    out = [f'<section class="pack"><h1>{_esc(student.get("name"))}</h1>']
+    details = [
+        f"Campus ID: {student.get('campus_id', '')}",
+        f"EmplID: {student.get('emplid', '')}",
+        f"Program: {student.get('prgm', '')}",
+    ]
+    if student.get("plan"):
+        details.append(f"Plan: {student['plan']}")
+    if student.get("level_start") or student.get("level_end"):
+        details.append(f"Level-Start: {student.get('level_start', '')} | Level-End: {student.get('level_end', '')}")
+    if student.get("finalist"):
+        details.append(f"Finalist?: {student['finalist']}")
+    req_code = model["req_code"]
+    if req_code:
+        details.append(f"Using programme requirements: {requirement_names.get(req_code) or req_code}")
+    out.append("".join(f"<div>{_esc(d)}</div>" for d in details))
+
+    out.append('<div class="cols"><div><h2>Progress Insights</h2>')
+    out.append("".join(f"<div>{_esc(line)}</div>" for line in insight_lines(model["insights"])))
+    out.append("</div><div><h2>Summary</h2>")
+    rows = summary_rows(student.get("summary"))
+    out.append(_table(["Metric", "Value"], [[r["Metric"], r["Value"]] for r in rows]) if rows else '<div class="caption">No summary available.</div>')
+    out.append("</div></div>")
+
+    for label, level_years in model["level_groups"]:
+        out.append(f"<h2>{_esc(label)}</h2>")
+        caption = level_caption(level_years)
+        if caption:
+            out.append(f'<div class="caption">{_esc(caption)}</div>')
+        metrics = level_metrics(level_years[0])
+        if metrics:
+            out.append("<div>" + " | ".join(f"<b>{_esc(k)}:</b> {_esc(v)}" for k, v in metrics) + "</div>")
+        cols = model["levels"][label]
+        if cols["Course"]:
+            rows = [[cols[c][i] for c in LEVEL_TABLE_COLUMNS] for i in range(len(cols["Course"]))]
+            # Same rule as student_view.fail_mask
+            fails = ["F" in str(symbol) for symbol in cols["Symbol"]]
+            out.append(_table(LEVEL_TABLE_COLUMNS, rows, fails))
+        else:
+            out.append('<div class="caption">No courses listed for this level.</div>')
+
+    if model["prog_reqs"]:
+        out.append("<h2>Outstanding courses (programme-wide)</h2>")
+        rows = model["outstanding"].get("Most recent", [])
+        if rows:
+            columns = list(rows[0].keys())
+            out.append(_table(columns, [[r[c] for c in columns] for r in rows]))
+        else:
+            out.append("<div>All mapped programme requirements are completed.</div>")
+    out.append("</section>")
+    return "".join(out)
+
+
+def render_document(sections: list[str], title: str) -> str:
+    return (
+        f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{_esc(title)}</title>"
+        f"<style>{PACK_CSS}</style></head><body>{''.join(sections)}</body></html>"
+    )
+
+
+_requirements = None
+
+
+def _init_worker(requirements_path: str | None):
+    global _requirements
+    if requirements_path and os.path.exists(requirements_path):
+        _requirements = read_programme_requirements(requirements_path)
+    else:
+        _requirements = ({}, {})
+
+
+def _render_chunk(students: list[dict]) -> list[str]:
+    index, names = _requirements
+    return [render_student_html(s, build_view_model(s, index), names) for s in students]
+
+
+def render_packs(students: list[dict], requirements_path: str | None, workers: int | None = None,
+                 chunk_size: int = DEFAULT_CHUNK) -> list[str]:
+    """HTML sections for ``students``, in order.
+
+    ``workers=0`` (or a single chunk) renders in this process; otherwise a
+    process pool of ``workers`` (default: CPU count) is used.
+    """
+    chunks = [students[i:i + chunk_size] for i in range(0, len(students), chunk_size)]
+    if workers == 0 or len(chunks) <= 1:
+        _init_worker(requirements_path)
+        return [section for chunk in chunks for section in _render_chunk(chunk)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(requirements_path,)) as pool:
+        return [section for sections in pool.map(_render_chunk, chunks) for section in sections]
+
+
+def select_students(students: list[dict], campus_ids=None, programme: str | None = None,
+                    with_fails: bool = False) -> list[dict]:
+    """Filter a report to the students a pack run should cover."""
+    wanted = {c.strip().upper() for c in campus_ids} if campus_ids else None
+    out = []
+    for s in students:
+        if wanted is not None and (s.get("campus_id") or "").strip().upper() not in wanted:
+            continue
+        if programme and not any(
+            (v or "").startswith(programme) for v in (s.get("prgm"), s.get("plan"), *(y.get("plan") for y in s.get("years", [])))
+        ):
+            continue
+        if with_fails and not any(
+            _is_fail_course(c) for y in s.get("years", []) for c in y.get("courses", []) if _clean_code(c.get("code"))
+        ):
+            continue
+        out.append(s)
+    return out
+
+
+def write_packs(students: list[dict], sections: list[str], out_dir: str, combined: bool = False,
+                title: str = "Student report packs") -> list[str]:
+    """Write one HTML file per student (named by campus ID), or one combined document."""
+    os.makedirs(out_dir, exist_ok=True)
+    if combined:
+        path = os.path.join(out_dir, re.sub(r"[^\w.-]+", "_", title) + ".html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(render_document(sections, title))
+        return [path]
+    paths = []
+    for pos, (student, section) in enumerate(zip(students, sections)):
+        stem = re.sub(r"[^\w.-]+", "_", student.get("campus_id") or f"student_{pos + 1}")
+        path = os.path.join(out_dir, f"{stem}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(render_document([section], f"{student.get('campus_id', '')} {student.get('name', '')}".strip()))
+        paths.append(path)
+    return paths
@@ -0,0 +1,172 @@
+"""Process-wide, content-addressed store of parsed reports.
+
+Every browser session that uploads the same file gets a handle to one
+shared entry (keyed by the file's SHA-256) instead of its own parsed copy
+of the students and uploaded file. Entries are reference counted: a handle
+releases its reference when it is released explicitly or garbage
+collected with the session. Unreferenced entries stay cached in LRU order
+until the store exceeds its memory budget.
+"""
+import os
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+from profiling import estimate_size
+
+DEFAULT_BUDGET_MB = 512
+SIZE_SAMPLE = 64
+
+
+def approx_report_bytes(students: list[dict], source=None) -> int:
+    """Deep size of a sample of students scaled to the report, plus the uploaded file."""
+    total = sys.getsizeof(students) + (source.nbytes if source is not None else 0)
+    if students:
+        step = max(1, len(students) // SIZE_SAMPLE)
+        sample = students[::step]
+        total += estimate_size(sample) * len(students) // len(sample)
+    return total
+
+
+class ReportHandle:
+    """A session's reference to a shared report entry."""
+
+    def __init__(self, store: "ReportStore", key: str, entry: dict):
+        self.key = key
+        self._entry = entry
+        self._finalizer = weakref.finalize(self, store._release, key)
+
+    @property
+    def students(self) -> list[dict]:
+        return self._entry["students"]
+
+    @property
+    def block_hashes(self) -> list[str]:
+        return self._entry.get("block_hashes", [])
+
+    @property
+    def source(self):
+        return self._entry.get("source")
+
+    @property
+    def course_index(self):
+        return self._entry.get("course_index")
+
+    @property
+    def diagnostics(self):
+        return self._entry.get("diagnostics")
+
+    @property
+    def nbytes(self) -> int:
+        return self._entry["bytes"]
+
+    def release(self):
+        self._finalizer()
+
+
+class ReportStore:
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._loading: dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, key: str, loader) -> ReportHandle:
+        """Return a handle for ``key``, calling ``loader()`` once if it is not cached.
+
+        ``loader`` returns a dict with ``students`` and optionally
+        ``block_hashes``, ``source`` (the ingest.ReportSource it was parsed
+        from), ``course_index`` (a course_index.CourseIndex) and
+        ``diagnostics`` (a records.ParseDiagnostics). Concurrent
+        requests for the same key wait for a single load.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    return self._acquire(key, entry, hit=True)
+                key_lock = self._loading.setdefault(key, threading.Lock())
+            with key_lock:
+                with self._lock:
+                    if key in self._entries:
+                        continue
+                entry = dict(loader())
+                entry["bytes"] = approx_report_bytes(entry["students"], entry.get("source"))
+                if entry.get("course_index") is not None:
+                    entry["bytes"] += entry["course_index"].nbytes
+                entry["refs"] = 0
+                with self._lock:
+                    self._entries[key] = entry
+                    self._loading.pop(key, None)
+                    handle = self._acquire(key, entry, hit=False)
+                    self._evict()
+                    return handle
+
+    def get(self, key: str) -> ReportHandle | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            return self._acquire(key, entry, hit=True) if entry is not None else None
+
+    def keys(self) -> list[str]:
+        """Keys of the cached reports, least recently used first."""
+        with self._lock:
+            return list(self._entries)
+
+    def _acquire(self, key: str, entry: dict, hit: bool) -> ReportHandle:
+        # Caller holds self._lock
+        self._entries.move_to_end(key)
+        entry["refs"] += 1
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return ReportHandle(self, key, entry)
+
+    def _release(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["refs"] > 0:
+                entry["refs"] -= 1
+            self._evict()
+
+    def _evict(self):
+        # Caller holds self._lock; entries still referenced by a session are never evicted
+        total = sum(e["bytes"] for e in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.budget_bytes:
+                break
+            entry = self._entries[key]
+            if entry["refs"] == 0:
+                total -= entry["bytes"]
+                del self._entries[key]
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "reports": len(self._entries),
+                "bytes": sum(e["bytes"] for e in self._entries.values()),
+                "budget_bytes": self.budget_bytes,
+                "refs": {k: e["refs"] for k, e in self._entries.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def default_store() -> ReportStore:
+    """The store shared by every session in this process."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            budget_mb = float(os.environ.get("RECORDSORTER_STORE_MB", DEFAULT_BUDGET_MB))
+            _default_store = ReportStore(int(budget_mb * 2**20))
+        return _default_store
@@ -0,0 +1,106 @@
+"""Programme requirements that reload when the handbook CSV changes.
+
+The requirements file is checked by mtime and size on every access, and
+re-read only when they move and the content hash differs, so saving the
+file without changes costs nothing. A reload diffs the old and new entries
+per programme and tells subscribers which programme codes were added,
+removed or changed; caches of per-student results (see
+prefetch.ViewModelCache.invalidate) drop only the entries that read those
+programmes.
+"""
+import hashlib
+import json
+import os
+import threading
+
+import profiling
+from records import read_programme_requirements
+
+
+def _programme_hashes(index: dict, names: dict) -> dict[str, str]:
+    return {
+        prog: hashlib.blake2b(
+            json.dumps([names.get(prog, ""), years], sort_keys=True, default=str).encode("utf-8"), digest_size=16
+        ).hexdigest()
+        for prog, years in index.items()
+    }
+
+
+def diff_requirements(old_hashes: dict[str, str], new_hashes: dict[str, str]) -> dict[str, list[str]]:
+    """Programme codes added, removed or changed between two loads."""
+    return {
+        "added": sorted(new_hashes.keys() - old_hashes.keys()),
+        "removed": sorted(old_hashes.keys() - new_hashes.keys()),
+        "changed": sorted(k for k in new_hashes.keys() & old_hashes.keys() if new_hashes[k] != old_hashes[k]),
+    }
+
+
+class RequirementsSource:
+    """The current requirements parsed from ``path``, reloaded when the file changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stat = None
+        self._digest = None
+        self._listeners = []
+        self.snapshot = {"index": {}, "names": {}, "version": 0, "hashes": {}, "diff": None}
+        self.reloads = 0
+
+    def subscribe(self, callback):
+        """Call ``callback(diff)`` (see ``diff_requirements``) after each reload that changed a programme."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def get(self) -> dict:
+        """``{"index", "names", "version", "hashes", "diff"}`` for the file as it is now."""
+        try:
+            st = os.stat(self.path)
+            stat = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stat = None
+        with self._lock:
+            if stat == self._stat:
+                return self.snapshot
+            self._stat = stat
+            data = b""
+            if stat is not None:
+                with open(self.path, "rb") as f:
+                    data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            if digest == self._digest:
+                return self.snapshot
+            first_load = self._digest is None
+            self._digest = digest
+            profiling.count("cache.requirements.misses")
+            index, names = read_programme_requirements(self.path) if stat is not None else ({}, {})
+            hashes = _programme_hashes(index, names)
+            diff = diff_requirements(self.snapshot["hashes"], hashes)
+            self.snapshot = {
+                "index": index,
+                "names": names,
+                "version": self.snapshot["version"] + 1,
+                "hashes": hashes,
+                "diff": None if first_load else diff,
+            }
+            listeners = list(self._listeners)
+            if not first_load:
+                self.reloads += 1
+        if not first_load and any(diff.values()):
+            for callback in listeners:
+                callback(diff)
+        return self.snapshot
+
+
+_sources: dict[str, RequirementsSource] = {}
+_sources_lock = threading.Lock()
+
+
+def requirements_source(path: str) -> RequirementsSource:
+    """The source for ``path`` shared by every session in this process."""
+    path = os.path.abspath(path)
+    with _sources_lock:
+        source = _sources.get(path)
+        if source is None:
+            source = _sources[path] = RequirementsSource(path)
+        return source
@@ -0,0 +1,361 @@
+"""Row data for the per-student level tables and Outstanding view.
+
+Rows are built column-wise in plain Python (no per-row pandas work), and
+fail highlighting is a single vectorized mask, so the app only pays for
+DataFrame construction and styling of the table that is actually shown.
+"""
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from records import _normalize_acad_level, _clean_code, _is_fail_course, compute_student_insights
+
+LEVEL_TABLE_COLUMNS = ["Year", "Sem", "Course", "%/Grade", "Symbol", "Units Attempted", "Course Name", "Status"]
+FAIL_STYLE = "background-color: #ffe5e5; color: #8b0000"
+METRIC_FIELDS = [
+    ("JT", "jt"), ("JE", "je"), ("ST", "st"), ("SE", "se"), ("TT", "tt"), ("TE", "te"), ("CE", "ce"),
+    ("Wghtd GPA", "wghtd_gpa"), ("Term GPA", "term_gpa"), ("Cum GPA", "cum_gpa"),
+]
+TERM_ORDER = {"R": 1, "W": 2, "S": 3}
+SUMMARY_LABELS = {
+    "total_passed": "Passed",
+    "units_earned": "Units Earned",
+    "senior_passed": "Senior Passed",
+    "junior_passed": "Junior Passed",
+    "latest_term_attempted": "Latest Term: Attempted",
+    "latest_term_passed": "Latest Term: Passed",
+}
+
+
+def requirement_candidates(student: dict, requirements_index: dict) -> list[str]:
+    """Requirement mappings that may apply to a student, best match first.
+
+    An explicit plan code (student-level, then the most common year-level
+    plan) that exists in the requirements wins outright; otherwise every
+    requirement code starting with the programme code is a candidate.
+    """
+    plan_candidates = []
+    if student.get("plan"):
+        plan_candidates.append(student["plan"].strip())
+    plan_counter = Counter(y.get("plan") for y in student.get("years", []) if y.get("plan"))
+    if plan_counter:
+        plan_candidates.append(plan_counter.most_common(1)[0][0])
+    for cand in plan_candidates:
+        if cand and cand in requirements_index:
+            return [cand]
+    # Fallback: match by programme prefix (e.g., CB024*)
+    prgm_code = student.get("prgm", "")
+    if not prgm_code:
+        return []
+    return [code for code in requirements_index.keys() if code.startswith(prgm_code)]
+
+
+def requirement_deps(student: dict, candidates: list[str], req_code: str | None) -> dict:
+    """The parts of the requirements a student's view model was built from.
+
+    ``read`` is the mapping whose entries were used; ``keys`` and ``prefix``
+    are what ``requirement_candidates`` looked up, so adding or removing a
+    programme code matching them can change the candidates.
+    """
+    keys = {student.get("plan", "").strip()}
+    keys.update(y.get("plan") for y in student.get("years", []) if y.get("plan"))
+    keys.discard("")
+    explicit = len(candidates) == 1 and candidates[0] in keys
+    return {
+        "read": req_code,
+        "keys": keys,
+        "prefix": None if explicit else (student.get("prgm") or None),
+    }
+
+
+def uses_programmes(model: dict, diff: dict) -> bool:
+    """Whether a view model depends on any programme in a requirements diff."""
+    deps = model.get("requirement_deps")
+    if deps is None:
+        return True
+    if deps["read"] and any(deps["read"] in diff[k] for k in ("changed", "added", "removed")):
+        return True
+    for code in (*diff["added"], *diff["removed"]):
+        if code in deps["keys"] or (deps["prefix"] and code.startswith(deps["prefix"])):
+            return True
+    return False
+
+
+def insight_lines(insights: dict) -> list[str]:
+    """The Progress Insights lines shown for a student."""
+    prog_changes = insights.get("program_changes", 0)
+    change_list = insights.get("program_change_list", [])
+    prog_text = "N/A"
+    if change_list:
+        cleaned = [p for p in change_list if p]
+        prog_text = f"x{prog_changes} (" + ", ".join(cleaned) + ")" if prog_changes else cleaned[0]
+
+    repeated = insights.get("repeated_fails", [])
+    rep_text = "; ".join(repeated) if repeated else "None"
+    actual_year = insights.get("actual_year") or "N/A"
+
+    weakest = insights.get("weakest_year")
+    if weakest:
+        y, passed, attempted, rate = weakest
+        weakest_text = f"{y} ({passed}/{attempted} passed)"
+    else:
+        weakest_text = "N/A"
+    return [
+        f"Programme changes: {prog_text}",
+        f"Repeated failed courses: {rep_text}",
+        f"Actual year of study: {actual_year}",
+        f"Weakest year: {weakest_text}",
+    ]
+
+
+def summary_rows(summary: dict) -> list[dict]:
+    return [{"Metric": SUMMARY_LABELS.get(k, k), "Value": v} for k, v in (summary or {}).items()]
+
+
+def group_years_by_level(years: list[dict]):
+    """Sort terms most recent first and group them by academic level."""
+    years_sorted = sorted(years, key=lambda y: y.get("year", 0), reverse=True)
+    level_groups = []  # list of (label, [years]) preserving order
+    level_map = {}
+    for yr in years_sorted:
+        level_label = _normalize_acad_level(yr.get("acad_level")) or yr.get("acad_level") or f"Year {yr.get('year','')}"
+        if level_label not in level_map:
+            level_map[level_label] = []
+            level_groups.append((level_label, level_map[level_label]))
+        level_map[level_label].append(yr)
+    return years_sorted, level_groups
+
+
+def level_caption(level_years: list[dict]) -> str:
+    # Show distinct standing/specialisation/degree/program across the level
+    meta_bits = []
+    standings = {y.get("standing") for y in level_years if y.get("standing")}
+    specs = {y.get("specialization") for y in level_years if y.get("specialization") and " - " not in y.get("program", "")}
+    degrees = {y.get("degree") for y in level_years if y.get("degree")}
+    progs = {y.get("program") for y in level_years if y.get("program")}
+    if standings:
+        meta_bits.append(f"Standing: {', '.join(sorted(standings))}")
+    if specs:
+        meta_bits.append(f"Specialisation: {', '.join(sorted(specs))}")
+    if degrees:
+        meta_bits.append(f"Degree: {', '.join(sorted(degrees))}")
+    if progs:
+        meta_bits.append(f"Program: {', '.join(sorted(progs))}")
+    return " | ".join(meta_bits)
+
+
+def level_metrics(latest_year: dict) -> list[tuple[str, str]]:
+    return [(label, latest_year.get(key)) for label, key in METRIC_FIELDS if latest_year.get(key)]
+
+
+def requirement_codes(req: dict) -> list[str]:
+    """Every course code that counts towards a requirement."""
+    if req.get("options"):
+        return list(req["options"])
+    return [c for c in (_clean_code(req.get("course_code")), _clean_code(req.get("alternative_course"))) if c]
+
+
+def requirement_met(req: dict, codes: set) -> bool:
+    """Whether ``codes`` satisfy a requirement: its course, its alternative, or ``choose`` of its options."""
+    if req.get("options"):
+        return sum(code in codes for code in req["options"]) >= req.get("choose", 1)
+    code = _clean_code(req.get("course_code"))
+    alt = _clean_code(req.get("alternative_course"))
+    return code in codes or bool(alt and alt in codes)
+
+
+def requirement_label(req: dict) -> str:
+    if req.get("options"):
+        return f"{req.get('choose', 1)} of {', '.join(req['options'])}"
+    code = _clean_code(req.get("course_code"))
+    alt = _clean_code(req.get("alternative_course"))
+    return code if not alt else f"{code} (alt: {alt})"
+
+
+def required_codes(prog_reqs: dict) -> set:
+    """Programme-wide required codes (main, alternative and options) across all years."""
+    return {code for reqs in (prog_reqs or {}).values() for r in reqs for code in requirement_codes(r)}
+
+
+def passed_codes(years: list[dict]) -> set:
+    return {
+        code
+        for yr in years
+        for c in yr.get("courses", [])
+        if (code := _clean_code(c.get("code"))) and not _is_fail_course(c)
+    }
+
+
+def outstanding_requirements(student: dict, requirements_index: dict) -> list[tuple[str, str | None]]:
+    """``(code, alternative)`` of requirements not passed under the student's default mapping."""
+    candidates = requirement_candidates(student, requirements_index)
+    if not candidates:
+        return []
+    passed = passed_codes(student.get("years", []))
+    out = []
+    for reqs in requirements_index.get(candidates[0], {}).values():
+        for req in reqs:
+            if requirement_met(req, passed):
+                continue
+            if req.get("options"):
+                # A choose-k group: the options not yet passed, as "/"-separated alternatives
+                remaining = [c for c in req["options"] if c not in passed]
+                out.append((remaining[0], "/".join(remaining[1:]) or None))
+            else:
+                out.append((_clean_code(req.get("course_code")), _clean_code(req.get("alternative_course"))))
+    return out
+
+
+def level_table_rows(level_years: list[dict], level_reqs: list[dict], prog_required: set, passed_all: set) -> dict[str, list]:
+    """Column-oriented rows for one level: attempted courses, then unmet requirements."""
+    cols = {name: [] for name in LEVEL_TABLE_COLUMNS}
+    year_col, sem_col, course_col = cols["Year"], cols["Sem"], cols["Course"]
+    grade_col, symbol_col, units_col = cols["%/Grade"], cols["Symbol"], cols["Units Attempted"]
+    name_col, status_col = cols["Course Name"], cols["Status"]
+
+    for yr in level_years:
+        year = yr.get("year")
+        term_code = yr.get("term", "")
+        for c in yr.get("courses", []):
+            code = _clean_code(c.get("code")) or ""
+            if code in prog_required:
+                status = "Completed" if code in passed_all else "Outstanding"
+            else:
+                status = "Not Required"
+            year_col.append(year)
+            sem_col.append(term_code)
+            course_col.append(code)
+            grade_col.append(c.get("result", ""))
+            symbol_col.append(c.get("symbol", ""))
+            units_col.append(c.get("units_attempted", ""))
+            name_col.append(c.get("title", ""))
+            status_col.append(status)
+
+    # Outstanding requirements (not passed anywhere in the record)
+    for req in level_reqs:
+        if requirement_met(req, passed_all):
+            continue
+        year_col.append(None)
+        sem_col.append("")
+        course_col.append(requirement_label(req))
+        grade_col.append("")
+        symbol_col.append("")
+        units_col.append("")
+        name_col.append("")
+        status_col.append("Outstanding")
+    return cols
+
+
+def level_table_frame(cols: dict[str, list]) -> pd.DataFrame:
+    df = pd.DataFrame(cols, columns=LEVEL_TABLE_COLUMNS)
+    df["Year"] = df["Year"].astype("Int64")
+    return df
+
+
+def fail_mask(df: pd.DataFrame) -> np.ndarray:
+    return df["Symbol"].astype(str).str.contains("F", regex=False).to_numpy()
+
+
+def style_fail_rows(df: pd.DataFrame):
+    """Highlight failed rows with one vectorized style pass over the frame."""
+    mask = fail_mask(df)
+    if not mask.any():
+        return df
+    css = np.where(mask[:, None], FAIL_STYLE, "")
+    css = np.broadcast_to(css, df.shape)
+    return df.style.apply(lambda _: css, axis=None)
+
+
+def _passed_details(years_sorted: list[dict]) -> dict[str, list[tuple]]:
+    # (year, term order, grade) for every passed attempt, used to sort similar courses
+    details: dict[str, list[tuple]] = {}
+    for yr in years_sorted:
+        yv = yr.get("year")
+        year = int(yv) if isinstance(yv, (int, float)) else -1
+        t_ord = TERM_ORDER.get((yr.get("term") or "").strip().upper()[:1], 0)
+        for c in yr.get("courses", []):
+            code = _clean_code(c.get("code"))
+            if not code or _is_fail_course(c):
+                continue
+            res = c.get("result", "")
+            try:
+                grade = float(res) if str(res).strip() != "" else None
+            except ValueError:
+                grade = None
+            details.setdefault(code, []).append((year, t_ord, grade))
+    return details
+
+
+def outstanding_rows(prog_reqs: dict, years_sorted: list[dict], sort_mode: str = "Most recent") -> list[dict]:
+    """Programme-wide requirements never attempted, with similar passed courses."""
+    taken_all = {
+        code
+        for yr in years_sorted
+        for c in yr.get("courses", [])
+        if (code := _clean_code(c.get("code")))
+    }
+    details = _passed_details(years_sorted)
+    recency = {code: max((d[0], d[1]) for d in dets) for code, dets in details.items()}
+    best_grade = {
+        code: max((d[2] for d in dets if d[2] is not None), default=-1.0)
+        for code, dets in details.items()
+    }
+    if sort_mode == "Most recent":
+        def sort_key(code):
+            return (*recency[code], best_grade[code])
+    else:
+        def sort_key(code):
+            return (best_grade[code], *recency[code])
+
+    rows = []
+    for year_label, reqs in prog_reqs.items():
+        for req in reqs:
+            if requirement_met(req, taken_all):
+                continue
+            display = requirement_label(req)
+            # Similar courses: same subject and year level passed anywhere (e.g., ECO3xxx for ECO3020F)
+            similar_list = []
+            m = re.match(r"^([A-Z]+)(\d)", (requirement_codes(req) or [""])[0])
+            if m:
+                prefix = m.group(1) + m.group(2)
+                candidates = [c for c in details if c.startswith(prefix)]
+                similar_list = sorted(candidates, key=sort_key, reverse=True)
+            rows.append({
+                "Year": year_label or "",
+                "Required Course": display,
+                "Similar courses completed": ", ".join(similar_list),
+            })
+    return rows
+
+
+def build_view_model(student: dict, requirements_index: dict, req_code: str | None = None) -> dict:
+    """Everything the student page derives from a student, without Streamlit.
+
+    ``req_code`` defaults to the best requirement candidate, which is also
+    what the page selects until the user picks another mapping.
+    """
+    candidates = requirement_candidates(student, requirements_index)
+    if req_code is None and candidates:
+        req_code = candidates[0]
+    prog_reqs = requirements_index.get(req_code, {}) if req_code else {}
+    years = student.get("years", [])
+    years_sorted, level_groups = group_years_by_level(years)
+    prog_required = required_codes(prog_reqs)
+    passed_all = passed_codes(years)
+    return {
+        "insights": compute_student_insights(student),
+        "candidates": candidates,
+        "req_code": req_code,
+        "prog_reqs": prog_reqs,
+        "years_sorted": years_sorted,
+        "level_groups": level_groups,
+        "levels": {
+            label: level_table_rows(level_years, prog_reqs.get(label, []), prog_required, passed_all)
+            for label, level_years in level_groups
+        },
+        # Keyed by sort mode; the page fills in other modes on demand
+        "outstanding": {"Most recent": outstanding_rows(prog_reqs, years_sorted)} if prog_reqs else {},
+        "requirement_deps": requirement_deps(student, candidates, req_code),
+    }
@@ -0,0 +1,306 @@
+"""Synthetic CB015/CB024 course results reports for scaling tests.
+
+The output mimics the registrar exports: page headers with
+"(CONTINUED ...)" markers, quoted names and course titles with embedded
+commas, failed courses listed first with a blank separator row, trailing
+semicolons in CB024 files and course rows that arrive wrapped in a single
+quoted field. Students follow a programme plan from the bundled
+requirements CSV when it is available, so requirement checks see
+realistic data.
+
+    python synth_reports.py --students 10000 --format CB024 -o synth.csv
+"""
+import argparse
+import csv
+import io
+import os
+import random
+
+from records import read_programme_requirements
+
+REQUIREMENTS_CSV = os.path.join(os.path.dirname(__file__), "UCT_Commerce_Programme_Course_Requirements_2024_2025.csv")
+ROW_WIDTH = 21
+
+FORMATS = {
+    "CB015": {"degree": "QCB102  - Bachelor of Business Science", "name": "BBusSc 5 year programme", "years": 5},
+    "CB024": {"degree": "QCB002  - Bachelor of Business Science", "name": "BBusSc  4 year programme", "years": 4},
+}
+LEVELS = ["First Year", "Second Yr", "Third Year", "Fourth Yr", "Fifth Yr"]
+SPECIALISATIONS = ["Marketing", "Finance with Accounting", "Economics", "Analytics", "Information Systems", "Economics with Law"]
+SURNAMES = ["Behardien", "Metsing", "Molapo", "Sables", "Naidoo", "Dlamini", "van der Merwe", "Nkosi", "Pillay", "Smith", "Mokoena", "Adams"]
+FIRST_NAMES = [("Azraa", "Miss"), ("Lerato Faith", "Ms"), ("Letapata Peter", "Mr"), ("Dylan Victor", "Mr"), ("Thandi", "Ms"), ("Sipho", "Mr"), ("Aisha", "Miss"), ("Johan", "Mr")]
+FALLBACK_CATALOG = {
+    1: ["ACC1012S", "ACC1106F", "BUS1036S", "CML1001F", "ECO1010F", "ECO1011S", "INF1002F", "MAM1010F", "STA1000S", "DOC1103H"],
+    2: ["ACC2012W", "BUS2010F", "BUS2033F", "ECO2003F", "ECO2004S", "FTX2024S", "PHI2043S", "STA2020F"],
+    3: ["ACC3022W", "BUS3008W", "BUS3039F", "BUS3041F", "ECO3020F", "ECO3022S", "STA3022F", "FTX3044F"],
+    4: ["BUS4026W", "BUS4050W", "BUS4052H", "BUS4058F", "ECO4006F", "STA4010W"],
+}
+TITLES = {
+    "ECO1010F": "Microeconomics I",
+    "ECO1011S": "Macroeconomics",
+    "CML1001F": "Business Law I",
+    "ACC2018H": "Gov, Audit & Assurance I",
+    "ACC3022W": "Gov, Audit & Assurance II",
+    "STA4010W": "Op Res, Statistics & Data Sci",
+    "REL2047L": "Religion, Sexuality and Gender",
+}
+PASS_SYMBOLS = [(75, "1"), (70, "2+"), (60, "2-"), (50, "3")]
+
+
+def _load_catalog(requirements_path: str | None, fmt: str):
+    """Map plan code -> {year level: [course codes]} for plans of this format."""
+    plans = {}
+    if requirements_path:
+        index, _ = read_programme_requirements(requirements_path)
+        for plan, by_year in index.items():
+            if not plan.startswith(fmt):
+                continue
+            levels = {}
+            for label, reqs in by_year.items():
+                digits = "".join(ch for ch in str(label) if ch.isdigit())
+                if digits:
+                    levels[int(digits)] = [r["course_code"] for r in reqs]
+            if levels:
+                plans[plan] = levels
+    if not plans:
+        plans[f"{fmt}BUS07"] = FALLBACK_CATALOG
+    return plans
+
+
+def _title(code: str) -> str:
+    return TITLES.get(code, f"{code[:3].title()} Course {code[3:7]}")
+
+
+def _course(rng: random.Random, code: str, fail_rate: float) -> dict:
+    units = "36" if code.endswith("W") else "18"
+    if code.startswith("DOC"):
+        return {"code": code, "result": "PA", "symbol": "PA", "units_attempted": "5", "units_earned": "5", "title": _title(code)}
+    if rng.random() < fail_rate:
+        mark = rng.randint(25, 49)
+        symbol = "SF" if mark >= 45 and rng.random() < 0.5 else "F"
+        return {"code": code, "result": str(mark), "symbol": symbol, "units_attempted": "     ", "units_earned": units, "title": _title(code)}
+    mark = rng.randint(50, 92)
+    symbol = next(sym for floor, sym in PASS_SYMBOLS if mark >= floor)
+    return {"code": code, "result": str(mark), "symbol": symbol, "units_attempted": units, "units_earned": units, "title": _title(code)}
+
+
+def generate_students(n_students: int, fmt: str = "CB015", seed: int = 0, start_year: int = 2021,
+                      max_years: int | None = None, fail_rate: float = 0.12, repeat_rate: float = 0.7,
+                      requirements_path: str | None = REQUIREMENTS_CSV) -> list[dict]:
+    """Student records in the same shape as the parser output."""
+    rng = random.Random(seed)
+    spec = FORMATS[fmt]
+    max_years = max_years or spec["years"]
+    catalog = _load_catalog(requirements_path if requirements_path and os.path.exists(requirements_path) else None, fmt)
+    plan_codes = sorted(catalog)
+    students = []
+    for i in range(n_students):
+        surname = rng.choice(SURNAMES)
+        first, title = rng.choice(FIRST_NAMES)
+        block = i // 1000
+        suffix = "".join(chr(65 + (block // 26 ** k) % 26) for k in (2, 1, 0))
+        letters = surname.replace(" ", "")[:3].upper().ljust(3, "X") + suffix
+        plan = rng.choice(plan_codes)
+        levels = catalog[plan]
+        n_years = rng.randint(1, max_years)
+        spec_name = rng.choice(SPECIALISATIONS)
+        years = []
+        carry = []  # failed codes to repeat next year
+        level = 1
+        for offset in range(n_years):
+            codes = list(dict.fromkeys(carry + levels.get(level, levels[max(levels)])[:10]))
+            courses = [_course(rng, code, fail_rate) for code in codes]
+            failed = [c for c in courses if "F" in c["symbol"]]
+            carry = [c["code"] for c in failed if rng.random() < repeat_rate]
+            if len(failed) <= 2:
+                level = min(level + 1, max(levels))
+            years.append({
+                "year": start_year + offset,
+                "term": "R",
+                "program": f"{fmt} - {spec_name}",
+                "degree": spec["name"],
+                "acad_level": LEVELS[min(offset, len(LEVELS) - 1)],
+                "standing": "CONT" if len(failed) <= 2 else "FECR",
+                "plan": plan,
+                "specialization": spec_name,
+                "courses": courses,
+            })
+            if failed and rng.random() < 0.15:
+                # Supplementary/deferred exam term with a single rewrite
+                years.append({
+                    "year": start_year + offset,
+                    "term": rng.choice("SW"),
+                    "program": f"{fmt} - {spec_name}",
+                    "degree": spec["name"],
+                    "acad_level": LEVELS[min(offset, len(LEVELS) - 1)],
+                    "standing": "",
+                    "plan": plan,
+                    "specialization": spec_name,
+                    "courses": [_course(rng, failed[0]["code"], fail_rate)],
+                })
+        passed = sum(1 for y in years for c in y["courses"] if "F" not in c["symbol"])
+        students.append({
+            "name": f"{surname},{first} {title}",
+            "campus_id": f"{letters}{i % 1000:03d}",
+            "emplid": str(1700000 + i),
+            "prgm": fmt,
+            "plan": plan,
+            "level_start": LEVELS[min(n_years, len(LEVELS)) - 1],
+            "level_end": LEVELS[min(n_years, len(LEVELS)) - 1],
+            "finalist": "Finalist" if n_years >= spec["years"] - 1 else "",
+            "years": years,
+            "summary": {
+                "total_passed": str(passed),
+                "units_earned": str(passed),
+                "latest_term_attempted": str(len(years[-1]["courses"])),
+                "latest_term_passed": str(sum(1 for c in years[-1]["courses"] if "F" not in c["symbol"])),
+            },
+        })
+    return students
+
+
+class _Writer:
+    def __init__(self, fmt: str, rng: random.Random, malformed_rate: float):
+        self.semicolons = fmt == "CB024"
+        self.rng = rng
+        self.malformed_rate = malformed_rate
+        self.buf = io.StringIO()
+        self.csv = csv.writer(self.buf, lineterminator="\n")
+
+    def row(self, fields: list[str]):
+        fields = list(fields)
+        if self.semicolons:
+            last = max((i for i, f in enumerate(fields) if f), default=0)
+            fields[last] = f"{fields[last]};"
+        self.csv.writerow(fields + [""] * (ROW_WIDTH - len(fields)))
+
+    def course_row(self, fields: list[str]):
+        if self.rng.random() >= self.malformed_rate:
+            self.row(fields)
+            return
+        # Exporter glitch: the whole row lands in one quoted field, padded with empties
+        inner = io.StringIO()
+        csv.writer(inner, lineterminator="").writerow(fields)
+        text = inner.getvalue() + (";" if self.semicolons else "")
+        self.csv.writerow([text] + [""] * (ROW_WIDTH - 1))
+
+    def take(self) -> str:
+        text = self.buf.getvalue()
+        self.buf.seek(0)
+        self.buf.truncate()
+        return text
+
+
+def _page_header(w: _Writer, fmt: str, page: int):
+    spec = FORMATS[fmt]
+    w.row(["Report ID:", "UCTU0051", "University of Cape Town", f"Page No.  {page}"])
+    w.row(["COURSE RESULTS SCHEDULE", "Run Date", "2024-12-06"])
+    w.row(["Career   :", "UGRD", "-", "Undergraduate", "Commerce", "Batch", "5814380"])
+    w.row(["Degree   :", spec["degree"]])
+    w.row(["Programme:", f"{fmt} - {spec['name']}"])
+    w.row(["=" * 180])
+    w.row(["Name", "Campus ID", "EmplID", "Prgm", "Plan", "Level-Start", "Level-End", "Finalist?"])
+    w.row(["Attributes", "-----------Units-----------", "--------GPA--------"])
+    w.row(["Term", "Programme", "Acad Level", "Standng", "Majors/Specialisations", "JT", "JE", "ST", "SE", "TT", "TE", "CE", "Wghtd", "Term", "Cum"])
+    w.row(["Course", "%   Symbol", " E--Unts--T", "Course Name", "Course", "%   Symbol", " E--Unts--T", "Course Name"])
+    w.row(["=" * 180])
+
+
+def _course_fields(c: dict) -> list[str]:
+    return [c["code"], c["result"], c["symbol"], c["units_attempted"], c["units_earned"], c["title"]]
+
+
+def render_report(students: list[dict], fmt: str = "CB015", seed: int = 0, students_per_page: int = 3,
+                  malformed_rate: float = 0.01, continued_rate: float = 0.05):
+    """Yield the report text in chunks (one per student) so large files stream to disk."""
+    rng = random.Random(seed)
+    w = _Writer(fmt, rng, malformed_rate)
+    page = 1
+    _page_header(w, fmt, page)
+    for i, s in enumerate(students):
+        if i and i % students_per_page == 0:
+            page += 1
+            _page_header(w, fmt, page)
+        surname, rest = s["name"].split(",", 1)
+        tail = [s["prgm"], "/", s["plan"], "0", s["level_start"], s["level_end"], s["finalist"], "     1"]
+        if fmt == "CB024":
+            # CB024 exports leave the name unquoted, so it spans two columns
+            w.row([surname, rest, s["campus_id"], s["emplid"], *tail])
+        else:
+            w.row([s["name"], s["campus_id"], s["emplid"], *tail])
+        w.row(["-" * 20, "__ __ __ __"])
+        units_total = 0
+        for yr in s["years"]:
+            if rng.random() < continued_rate:
+                w.row(["=" * 180])
+                w.row([s["campus_id"], " (CONTINUED ...)"])
+            courses = yr["courses"]
+            units = sum(int(c["units_attempted"]) for c in courses if c["units_attempted"].strip().isdigit())
+            units_total += units
+            gpa = sum(int(c["result"]) for c in courses if c["result"].isdigit()) / max(1, len(courses))
+            w.row([
+                str(yr["year"]), yr["term"], fmt, yr["degree"], yr["acad_level"], yr["standing"], yr["plan"],
+                "", "", "", "", str(units), str(units), "0", "0", str(units), str(units), str(units_total),
+                f"{gpa:.2f}", f"{gpa:.2f}", f"{gpa:.2f}",
+            ])
+            w.row(["", yr["specialization"]])
+            failed = [c for c in courses if "F" in c["symbol"]]
+            passed = [c for c in courses if "F" not in c["symbol"]]
+            for block in (failed, passed):
+                for j in range(0, len(block), 2):
+                    fields = [""] + _course_fields(block[j])
+                    if j + 1 < len(block):
+                        fields += [""] + _course_fields(block[j + 1])
+                    w.course_row(fields)
+                if block is failed and failed:
+                    w.row([""])
+        summary = s["summary"]
+        w.row([
+            "Course Counts (Current Programme):", "Passed:", summary["total_passed"],
+            "for which units earned:", summary["units_earned"], "Senior passed:", "0", "Junior passed:", "0",
+            "Latest Term: Attempted:", summary["latest_term_attempted"], "Passed:", summary["latest_term_passed"],
+        ])
+        w.row(["-" * 180])
+        yield w.take()
+
+
+def write_report(path: str, n_students: int, fmt: str = "CB015", seed: int = 0, **kwargs) -> int:
+    """Write a synthetic report and return the number of lines written."""
+    render_kw = {k: kwargs.pop(k) for k in ("students_per_page", "malformed_rate", "continued_rate") if k in kwargs}
+    students = generate_students(n_students, fmt=fmt, seed=seed, **kwargs)
+    lines = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in render_report(students, fmt=fmt, seed=seed, **render_kw):
+            lines += chunk.count("\n")
+            f.write(chunk)
+    return lines
+
+
+def report_text(n_students: int, fmt: str = "CB015", seed: int = 0, **kwargs) -> str:
+    render_kw = {k: kwargs.pop(k) for k in ("students_per_page", "malformed_rate", "continued_rate") if k in kwargs}
+    students = generate_students(n_students, fmt=fmt, seed=seed, **kwargs)
+    return "".join(render_report(students, fmt=fmt, seed=seed, **render_kw))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic CB015/CB024 course results report.")
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--format", choices=sorted(FORMATS), default="CB015")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start-year", type=int, default=2021)
+    parser.add_argument("--max-years", type=int, default=None)
+    parser.add_argument("--fail-rate", type=float, default=0.12)
+    parser.add_argument("--repeat-rate", type=float, default=0.7)
+    parser.add_argument("--malformed-rate", type=float, default=0.01)
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args(argv)
+    lines = write_report(
+        args.output, args.students, fmt=args.format, seed=args.seed, start_year=args.start_year,
+        max_years=args.max_years, fail_rate=args.fail_rate, repeat_rate=args.repeat_rate,
+        malformed_rate=args.malformed_rate,
+    )
+    print(f"Wrote {args.students} students ({lines} lines) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
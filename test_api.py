@@ -0,0 +1,70 @@
+"""Missing-key and eviction paths of the report API must answer 404, not hang."""
+import os
+import threading
+
+import pytest
+
+from api import ApiError, ReportApi, load_report_file
+from report_store import ReportStore
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPORT = os.path.join(HERE, "CB015.csv")
+TIMEOUT = 10
+
+
+def _call(fn, *args):
+    # Runs fn in a thread so a deadlock fails the test instead of hanging the run
+    result = {}
+
+    def run():
+        try:
+            result["value"] = fn(*args)
+        except Exception as exc:
+            result["error"] = exc
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), f"{fn.__name__} did not return"
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+class EvictingStore:
+    """Serves each report once, then reports it gone, as if evicted after the route's existence check."""
+
+    def __init__(self, store):
+        self.store = store
+        self.served = set()
+
+    def get(self, key):
+        if key in self.served:
+            return None
+        self.served.add(key)
+        return self.store.get(key)
+
+    def keys(self):
+        return self.store.keys()
+
+
+def test_add_annotations_missing_key():
+    api = ReportApi(store=ReportStore(10**9))
+    with pytest.raises(ApiError) as err:
+        _call(api.add_annotations, "nope", {})
+    assert err.value.status == 404
+    status, _, _ = _call(api.handle, "/reports")
+    assert status == 200
+
+
+@pytest.mark.parametrize("resource", ["annotations", "students/{cid}/annotation"])
+def test_annotations_after_eviction(resource):
+    store = ReportStore(10**9)
+    handles = load_report_file(REPORT, store)
+    key = store.keys()[0]
+    cid = handles[0].students[0]["campus_id"]
+    api = ReportApi(store=EvictingStore(store))
+    status, _, _ = _call(api.handle, f"/reports/{key}/" + resource.format(cid=cid))
+    assert status == 404
+    status, _, _ = _call(api.handle, "/reports")
+    assert status == 200
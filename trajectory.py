@@ -0,0 +1,187 @@
+"""Term-by-term academic trajectories and early-warning metrics.
+
+Every student's terms are flattened into one numeric term array (GPA and
+credit columns as floats, sorted by student, year and term), and each
+metric is a grouped NumPy reduction over that array:
+
+- ``gpa_slope``: least-squares change in term GPA per term
+- ``credit_rate``: credits earned per year of study, and ``credit_ratio``
+  against the median rate of students in the same programme
+- ``poor_streak``: consecutive poor terms up to the latest one, and
+  ``max_poor_run`` over the whole record
+
+A poor term is one with a term GPA below ``POOR_GPA`` or fewer than
+``POOR_EARNED_SHARE`` of the attempted credits earned.
+"""
+import numpy as np
+import pandas as pd
+
+from student_view import TERM_ORDER
+
+POOR_GPA = 50.0
+POOR_EARNED_SHARE = 0.5
+TRAJECTORY_COLUMNS = [
+    "student", "campus_id", "name", "prgm", "terms", "latest_gpa", "gpa_slope",
+    "credit_rate", "credit_norm", "credit_ratio", "poor_streak", "max_poor_run", "gpa_series",
+]
+# Filter/sort keys offered by the app, with their display labels
+TRAJECTORY_SORT_KEYS = {
+    "poor_streak": "Poor terms in a row",
+    "gpa_slope": "GPA trend per term",
+    "credit_ratio": "Credit rate vs programme",
+    "latest_gpa": "Latest term GPA",
+    "max_poor_run": "Longest poor run",
+}
+
+
+def _numbers(values: list) -> np.ndarray:
+    # Report numbers carry stray semicolons ("1.00;") and blanks
+    return pd.to_numeric(pd.Series(values, dtype=object).astype(str).str.strip().str.rstrip(";"), errors="coerce").to_numpy(dtype=float)
+
+
+def term_array(students: list[dict]) -> dict[str, np.ndarray]:
+    """One row per term with enrolments, sorted by student, year and term."""
+    student, year, term, gpa, attempted, earned = [], [], [], [], [], []
+    for pos, s in enumerate(students):
+        for yr in s.get("years", []):
+            student.append(pos)
+            y = yr.get("year")
+            year.append(y if isinstance(y, int) else -1)
+            term.append(TERM_ORDER.get((yr.get("term") or "").strip().upper()[:1], 0))
+            gpa.append(yr.get("term_gpa", ""))
+            attempted.append(yr.get("tt", ""))
+            earned.append(yr.get("te", ""))
+    arr = {
+        "student": np.array(student, dtype=np.int64),
+        "year": np.array(year, dtype=np.int64),
+        "term": np.array(term, dtype=np.int64),
+        "gpa": _numbers(gpa),
+        "attempted": _numbers(attempted),
+        "earned": _numbers(earned),
+    }
+    # Terms without enrolments (e.g. "No Enrolments" summer terms) carry no signal
+    keep = (np.nan_to_num(arr["attempted"]) > 0) | ~np.isnan(arr["gpa"])
+    order = np.lexsort((arr["term"][keep], arr["year"][keep], arr["student"][keep]))
+    return {name: values[keep][order] for name, values in arr.items()}
+
+
+def _group_sum(student: np.ndarray, values: np.ndarray, n: int) -> np.ndarray:
+    return np.bincount(student, weights=values, minlength=n)
+
+
+def _gpa_slopes(terms: dict, n: int) -> np.ndarray:
+    has = ~np.isnan(terms["gpa"])
+    student, y = terms["student"][has], terms["gpa"][has]
+    # x is each GPA term's index within its student's record
+    starts = np.r_[0, np.flatnonzero(np.diff(student)) + 1]
+    counts = np.diff(np.r_[starts, len(student)])
+    x = np.arange(len(student)) - np.repeat(starts, counts)
+    k = _group_sum(student, np.ones(len(student)), n)
+    sx, sy = _group_sum(student, x, n), _group_sum(student, y, n)
+    sxy, sxx = _group_sum(student, x * y, n), _group_sum(student, x * x, n)
+    denom = k * sxx - sx * sx
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where((k >= 2) & (denom > 0), (k * sxy - sx * sy) / denom, np.nan)
+
+
+def _poor_runs(terms: dict, n: int) -> tuple[np.ndarray, np.ndarray]:
+    student = terms["student"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share = terms["earned"] / terms["attempted"]
+    poor = (terms["gpa"] < POOR_GPA) | (share < POOR_EARNED_SHARE)
+    if not len(student):
+        return np.zeros(n, dtype=int), np.zeros(n, dtype=int)
+    # Length of the poor run ending at each term: distance to the last good term
+    # or to the student's first term (which counts itself when poor)
+    first = np.r_[True, student[1:] != student[:-1]]
+    idx = np.arange(len(poor))
+    last_reset = np.maximum.accumulate(np.where(first | ~poor, idx, 0))
+    run = np.where(poor, idx - last_reset + poor[last_reset], 0)
+    max_run = np.zeros(n, dtype=int)
+    np.maximum.at(max_run, student, run)
+    last = np.r_[student[1:] != student[:-1], True]
+    streak = np.zeros(n, dtype=int)
+    streak[student[last]] = run[last]
+    return streak, max_run
+
+
+def compute_trajectories(students: list[dict]) -> pd.DataFrame:
+    """Trajectory metrics for every student, one row per student in report order."""
+    n = len(students)
+    terms = term_array(students)
+    student = terms["student"]
+
+    counts = np.bincount(student, minlength=n)
+    has_gpa = ~np.isnan(terms["gpa"])
+    latest_gpa = np.full(n, np.nan)
+    # Terms are sorted, so the last assignment per student wins
+    latest_gpa[student[has_gpa]] = terms["gpa"][has_gpa]
+
+    earned = _group_sum(student, np.nan_to_num(terms["earned"]), n)
+    study_years = np.zeros(n)
+    if len(student):
+        pairs = np.unique(np.stack([student, terms["year"]]), axis=1)
+        study_years = np.bincount(pairs[0], minlength=n).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        credit_rate = np.where(study_years > 0, earned / study_years, np.nan)
+
+    prgm = pd.Series([s.get("prgm", "") for s in students], dtype=object)
+    credit_norm = pd.Series(credit_rate).groupby(prgm).transform("median").to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        credit_ratio = np.where(credit_norm > 0, credit_rate / credit_norm, np.nan)
+
+    streak, max_run = _poor_runs(terms, n)
+    # GPA per term for the sparklines
+    gpa_series = [[] for _ in range(n)]
+    for pos, gpa in zip(student[has_gpa].tolist(), terms["gpa"][has_gpa].tolist()):
+        gpa_series[pos].append(gpa)
+
+    return pd.DataFrame({
+        "student": np.arange(n),
+        "campus_id": [s.get("campus_id", "") for s in students],
+        "name": [s.get("name", "") for s in students],
+        "prgm": prgm,
+        "terms": counts,
+        "latest_gpa": latest_gpa,
+        "gpa_slope": np.round(_gpa_slopes(terms, n), 2),
+        "credit_rate": np.round(credit_rate, 1),
+        "credit_norm": np.round(credit_norm, 1),
+        "credit_ratio": np.round(credit_ratio, 2),
+        "poor_streak": streak,
+        "max_poor_run": max_run,
+        "gpa_series": gpa_series,
+    }, columns=TRAJECTORY_COLUMNS)
+
+
+def trajectory_lines(row: dict) -> list[str]:
+    """The trajectory lines shown with a student's Progress Insights."""
+    def _fmt(value, spec):
+        return "N/A" if value is None or pd.isna(value) else format(value, spec)
+
+    ratio = row.get("credit_ratio")
+    return [
+        f"GPA trend: {_fmt(row.get('gpa_slope'), '+.2f')} per term (latest {_fmt(row.get('latest_gpa'), '.1f')})",
+        f"Credits per year: {_fmt(row.get('credit_rate'), '.0f')} "
+        f"({_fmt(None if ratio is None or pd.isna(ratio) else ratio * 100, '.0f')}% of programme median)",
+        f"Poor terms in a row: {row.get('poor_streak', 0)} (longest {row.get('max_poor_run', 0)})",
+    ]
+
+
+def has_trajectory_data(frame: pd.DataFrame) -> bool:
+    """Whether the report has any term GPAs or credits (CB015 exports without TT/TE have neither)."""
+    return bool(frame["latest_gpa"].notna().any() or frame["credit_rate"].notna().any())
+
+
+def filter_trajectories(frame: pd.DataFrame, min_poor_streak: int = 0, declining: bool = False,
+                        max_credit_ratio: float | None = None, sort_by: str = "poor_streak",
+                        ascending: bool = False) -> pd.DataFrame:
+    """Students matching the early-warning filters, ordered by ``sort_by``.
+
+    Students without a credit ratio are kept by the credit filter.
+    """
+    mask = frame["poor_streak"] >= min_poor_streak
+    if declining:
+        mask &= frame["gpa_slope"] < 0
+    if max_credit_ratio is not None:
+        mask &= frame["credit_ratio"].le(max_credit_ratio) | frame["credit_ratio"].isna()
+    return frame.loc[mask].sort_values(sort_by, ascending=ascending, kind="stable", na_position="last")
@@ -0,0 +1,194 @@
+"""Risk-ranked triage of the students in a report.
+
+Each student gets a risk score: a weighted sum of repeated failed courses,
+the shortfall of their weakest year's pass rate, outstanding programme
+requirements and whether they are still unannotated. The course features
+are computed in bulk from the cohort's course frame (see
+analytics.course_frame); only requirement matching is per student.
+
+``TriageQueue`` is a max-heap of the unreviewed students by score with
+lazy deletion: annotating a student, or a requirement reload changing a
+few students' scores, pushes or invalidates single entries instead of
+re-sorting the cohort, and the next most urgent student is an O(log n)
+peek.
+"""
+import heapq
+
+import numpy as np
+
+from analytics import course_frame
+from student_view import outstanding_requirements, requirement_candidates, requirement_deps, uses_programmes
+
+RISK_FEATURES = ("repeated_fails", "weak_year", "outstanding", "unannotated")
+RISK_WEIGHTS = {
+    # Per course failed two or more times
+    "repeated_fails": 3.0,
+    # Times the share of the weakest year's courses that were failed
+    "weak_year": 4.0,
+    # Per requirement still outstanding under the default mapping
+    "outstanding": 0.25,
+    "unannotated": 2.0,
+}
+
+
+def course_risk_features(students: list[dict]) -> dict[str, np.ndarray]:
+    """Repeated fails and weakest-year shortfall per student, from one grouped pass over the courses."""
+    n = len(students)
+    repeated = np.zeros(n)
+    weak = np.zeros(n)
+    courses = course_frame(students)
+    if courses.empty:
+        return {"repeated_fails": repeated, "weak_year": weak}
+
+    fails = courses.loc[courses["fail"], ["student", "code"]]
+    per_code = fails.groupby(["student", "code"], sort=False).size()
+    counts = (per_code >= 2).groupby(level="student").sum()
+    repeated[counts.index.to_numpy()] = counts.to_numpy()
+
+    # Same rule as compute_student_insights: years with a single course are skipped
+    dated = courses.loc[courses["year"].notna(), ["student", "year", "fail"]]
+    years = dated.groupby(["student", "year"], sort=False)["fail"].agg(["size", "sum"])
+    years = years[years["size"] > 1]
+    shortfall = (years["sum"] / years["size"]).groupby(level="student").max()
+    weak[shortfall.index.to_numpy()] = shortfall.to_numpy()
+    return {"repeated_fails": repeated, "weak_year": weak}
+
+
+def outstanding_counts(students: list[dict], requirements_index: dict, positions=None) -> np.ndarray:
+    """Outstanding requirements per student (or per position in ``positions``)."""
+    positions = range(len(students)) if positions is None else positions
+    return np.array([len(outstanding_requirements(students[i], requirements_index)) for i in positions], dtype=float)
+
+
+def risk_scores(features: dict[str, np.ndarray], weights: dict[str, float]) -> np.ndarray:
+    return sum(weights.get(name, 0.0) * features[name] for name in RISK_FEATURES)
+
+
+class TriageQueue:
+    """Unreviewed students by descending score; updates push, stale entries are skipped."""
+
+    def __init__(self, scores, reviewed=()):
+        self._scores = [float(s) for s in scores]
+        self._reviewed = set(reviewed)
+        self._versions = [0] * len(self._scores)
+        self._heap = []
+        self._rebuild()
+
+    def _rebuild(self):
+        self._heap = [(-s, pos, self._versions[pos]) for pos, s in enumerate(self._scores) if pos not in self._reviewed]
+        heapq.heapify(self._heap)
+
+    def _push(self, pos: int):
+        self._versions[pos] += 1
+        if pos not in self._reviewed:
+            heapq.heappush(self._heap, (-self._scores[pos], pos, self._versions[pos]))
+        # Stale entries are dropped as they surface; rebuild if they pile up
+        if len(self._heap) > 2 * (len(self._scores) - len(self._reviewed)) + 64:
+            self._rebuild()
+
+    def _live(self, entry) -> bool:
+        _, pos, version = entry
+        return version == self._versions[pos] and pos not in self._reviewed
+
+    def score(self, pos: int) -> float:
+        return self._scores[pos]
+
+    def update(self, pos: int, score: float):
+        if score != self._scores[pos]:
+            self._scores[pos] = float(score)
+            self._push(pos)
+
+    def set_reviewed(self, pos: int, reviewed: bool = True):
+        if reviewed == (pos in self._reviewed):
+            return
+        if reviewed:
+            self._reviewed.add(pos)
+            self._versions[pos] += 1
+        else:
+            self._reviewed.discard(pos)
+            self._push(pos)
+
+    def is_reviewed(self, pos: int) -> bool:
+        return pos in self._reviewed
+
+    @property
+    def unreviewed(self) -> int:
+        return len(self._scores) - len(self._reviewed)
+
+    def peek(self, skip: int | None = None) -> int | None:
+        """The most urgent unreviewed student other than ``skip``, or ``None``."""
+        heap = self._heap
+        while heap and not self._live(heap[0]):
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        if heap[0][1] != skip:
+            return heap[0][1]
+        top = heapq.heappop(heap)
+        while heap and not self._live(heap[0]):
+            heapq.heappop(heap)
+        nxt = heap[0][1] if heap else None
+        heapq.heappush(heap, top)
+        return nxt
+
+
+class Triage:
+    """Risk features, scores and the triage queue for one report and session."""
+
+    def __init__(self, students: list[dict], requirements_index: dict, annotated=(), weights: dict | None = None):
+        self.weights = dict(RISK_WEIGHTS if weights is None else weights)
+        self.positions = {s.get("campus_id", ""): pos for pos, s in enumerate(students)}
+        reviewed = {self.positions[c] for c in annotated if c in self.positions}
+        self.features = course_risk_features(students)
+        self.features["outstanding"] = outstanding_counts(students, requirements_index)
+        self.features["unannotated"] = np.ones(len(students))
+        self.features["unannotated"][list(reviewed)] = 0.0
+        self._deps = [self._requirement_deps(s, requirements_index) for s in students]
+        self.queue = TriageQueue(risk_scores(self.features, self.weights), reviewed)
+
+    @staticmethod
+    def _requirement_deps(student: dict, requirements_index: dict) -> dict:
+        candidates = requirement_candidates(student, requirements_index)
+        return requirement_deps(student, candidates, candidates[0] if candidates else None)
+
+    def _score(self, pos: int) -> float:
+        return float(sum(self.weights.get(name, 0.0) * self.features[name][pos] for name in RISK_FEATURES))
+
+    def ranked(self) -> list[int]:
+        """Every student, most urgent first (ties in report order)."""
+        return np.argsort(-risk_scores(self.features, self.weights), kind="stable").tolist()
+
+    def set_weights(self, weights: dict):
+        """Rescore the cohort in bulk under new weights."""
+        self.weights = dict(weights)
+        reviewed = [pos for pos in range(len(self._deps)) if self.queue.is_reviewed(pos)]
+        self.queue = TriageQueue(risk_scores(self.features, self.weights), reviewed)
+
+    def annotated(self) -> list[str]:
+        return [campus_id for campus_id, pos in self.positions.items() if self.queue.is_reviewed(pos)]
+
+    def set_annotated(self, campus_id: str, annotated: bool = True) -> bool:
+        """Annotated students are reviewed: they leave the queue and lose the unannotated weight.
+
+        Returns whether the student's reviewed state changed.
+        """
+        pos = self.positions.get(campus_id)
+        if pos is None or self.queue.is_reviewed(pos) == annotated:
+            return False
+        self.features["unannotated"][pos] = 0.0 if annotated else 1.0
+        self.queue.update(pos, self._score(pos))
+        self.queue.set_reviewed(pos, annotated)
+        return True
+
+    def requirements_changed(self, students: list[dict], requirements_index: dict, diff: dict) -> list[int]:
+        """Rescore only the students whose requirement mapping read a programme in ``diff``."""
+        affected = [pos for pos, deps in enumerate(self._deps) if uses_programmes({"requirement_deps": deps}, diff)]
+        counts = outstanding_counts(students, requirements_index, affected)
+        for pos, count in zip(affected, counts):
+            self.features["outstanding"][pos] = count
+            self._deps[pos] = self._requirement_deps(students[pos], requirements_index)
+            self.queue.update(pos, self._score(pos))
+        return affected
+
+    def next_urgent(self, skip: int | None = None) -> int | None:
+        return self.queue.peek(skip)